@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Project, Object, GeotechnicalModel, Layer, CptTest, CptData
+from .models import Project, Object, GeotechnicalModel, Layer, CptTest, CptData, PackedSounding, PyramidLevel, DerivedSeries, QueryReport
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
@@ -31,8 +31,8 @@ class LayerAdmin(admin.ModelAdmin):
 
 @admin.register(CptTest)
 class CptTestAdmin(admin.ModelAdmin):
-    list_display = ('name', 'model', 'created_at')
-    list_filter = ('model',)
+    list_display = ('name', 'model', 'storage', 'created_at')
+    list_filter = ('model', 'storage')
     search_fields = ('name',)
     ordering = ('-created_at',)
 
@@ -45,3 +45,28 @@ class CptDataAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('cpt_test')
+
+@admin.register(PackedSounding)
+class PackedSoundingAdmin(admin.ModelAdmin):
+    list_display = ('cpt_test', 'dtype', 'sample_count')
+    search_fields = ('cpt_test__name',)
+    exclude = ('depth', 'qc', 'fs', 'u2')
+
+@admin.register(PyramidLevel)
+class PyramidLevelAdmin(admin.ModelAdmin):
+    list_display = ('cpt_test', 'bin_size', 'sample_count', 'source_count')
+    search_fields = ('cpt_test__name',)
+    exclude = ('depth', 'qc', 'fs', 'u2')
+
+@admin.register(DerivedSeries)
+class DerivedSeriesAdmin(admin.ModelAdmin):
+    list_display = ('cpt_test', 'input_hash', 'created_at')
+    search_fields = ('cpt_test__name', 'input_hash')
+    exclude = ('payload',)
+
+@admin.register(QueryReport)
+class QueryReportAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'view', 'method', 'count', 'duration_ms', 'created_at')
+    list_filter = ('kind', 'view')
+    search_fields = ('sql', 'source')
+    ordering = ('-created_at',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GeotechConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'geotech'
+
+    def ready(self):
+        from .authentication import connect_signals
+        connect_signals()
@@ -0,0 +1,86 @@
+"""
+Token authentication with a cached token -> user lookup.
+
+DRF's TokenAuthentication joins ``authtoken_token`` with ``auth_user`` on
+every request. CachedTokenAuthentication keeps the resolved token and
+user in the ``GEOTECH_AUTH_CACHE`` cache alias (a bounded LocMemCache with
+a TTL by default), keyed by a hash of the token so raw tokens never become
+cache keys.
+
+Entries are dropped when a token is deleted (rotation deletes the old
+token, and deleting a user cascades to it) and when a user is saved, which
+covers deactivation and password changes; see the receivers below,
+connected in GeotechConfig.ready(). Queryset ``update()`` sends no
+signals, so a bulk ``.update(is_active=False)`` would leave the users
+authenticated until the TTL expires: deactivate in bulk with
+deactivate_users, or call forget_user_tokens after the update. With a
+per-process cache other worker processes see these changes once the TTL
+expires; point the alias at a shared backend to make invalidation
+immediate everywhere.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def _cache():
+    return caches[getattr(settings, 'GEOTECH_AUTH_CACHE', 'default')]
+
+
+def _token_key(key):
+    return f'geotech:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache_key = _token_key(key)
+        token = _cache().get(cache_key)
+        if token is None:
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed('User inactive or deleted.')
+            _cache().set(cache_key, token)
+        return (token.user, token)
+
+
+def forget_token(key):
+    _cache().delete(_token_key(key))
+
+
+def forget_user_tokens(*user_ids):
+    keys = Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True)
+    _cache().delete_many([_token_key(key) for key in keys])
+
+
+def deactivate_users(users):
+    """
+    Deactivate a User queryset with one UPDATE and drop the users' cached
+    tokens, which the UPDATE alone would not. Returns the number updated.
+    """
+    user_ids = list(users.values_list('pk', flat=True))
+    updated = User.objects.filter(pk__in=user_ids).update(is_active=False)
+    forget_user_tokens(*user_ids)
+    return updated
+
+
+def token_deleted(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        forget_user_tokens(instance.pk)
+
+
+def connect_signals():
+    post_delete.connect(token_deleted, sender=Token, dispatch_uid='geotech.token_deleted')
+    post_save.connect(user_saved, sender=User, dispatch_uid='geotech.user_saved')
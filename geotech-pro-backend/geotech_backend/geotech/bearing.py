@@ -0,0 +1,187 @@
+"""
+Shallow-foundation bearing capacity over a model's layer stack.
+
+    qu = c Nc sc dc ic + q Nq sq dq iq + 0.5 gamma B Ngamma sgamma dgamma igamma
+
+with the bearing capacity factors and the shape, depth and inclination
+factors of Terzaghi (1943), Meyerhof (1963) or Hansen (1970). Soil
+parameters are thickness-weighted averages over the zone of influence, from
+the foundation level down one footing width. The overburden ``q`` is the
+effective vertical stress at foundation level. Groundwater within that
+zone reduces the unit weight in the ``Ngamma`` term linearly from total
+to submerged.
+
+Terzaghi's method has no inclination factors, so Meyerhof's are used with
+it. Hansen's inclination factors are written with tan(theta) = H / V and
+without the adhesion term, which is conservative. At phi = 0 Hansen's own
+ic needs the adhesion and base area, so Meyerhof's (1 - theta / 90)^2 is
+used instead.
+
+A sweep evaluates the full grid of footing widths x embedment depths x
+load inclinations in one broadcast pass. Results have shape
+``(len(widths), len(depths), len(inclinations))``.
+
+Depths in m, unit weights in kN/m3, cohesion and pressures in kPa, angles
+in degrees.
+"""
+import math
+
+import numpy as np
+
+from .stress import WATER_UNIT_WEIGHT, depth_average, layer_properties, vertical_stresses
+
+METHODS = ('terzaghi', 'meyerhof', 'hansen')
+FOOTINGS = ('strip', 'square', 'rectangular')
+SOIL_FIELDS = ['unit_weight', 'cohesion', 'friction_angle']
+DEFAULT_FACTOR_OF_SAFETY = 3.0
+MAX_SWEEP_CASES = 1_000_000
+
+# Below this friction angle (radians) the phi = 0 limits are used
+_PHI_EPSILON = 1e-6
+
+
+def bearing_factors(phi, method='meyerhof'):
+    """``(Nc, Nq, Ngamma)`` for friction angles ``phi`` in radians."""
+    phi = np.asarray(phi, dtype=np.float64)
+    tan_phi = np.tan(phi)
+    frictional = phi > _PHI_EPSILON
+    safe_tan = np.where(frictional, tan_phi, 1.0)
+
+    if method == 'terzaghi':
+        a = np.exp((0.75 * math.pi - phi / 2) * tan_phi)
+        nq = a ** 2 / (2 * np.cos(math.pi / 4 + phi / 2) ** 2)
+        nc = np.where(frictional, (nq - 1) / safe_tan, 1.5 * math.pi + 1)
+        # Coduto's fit to Terzaghi's tabulated values
+        ngamma = 2 * (nq + 1) * tan_phi / (1 + 0.4 * np.sin(4 * phi))
+        return nc, nq, np.maximum(ngamma, 0)
+
+    nq = np.exp(math.pi * tan_phi) * np.tan(math.pi / 4 + phi / 2) ** 2
+    nc = np.where(frictional, (nq - 1) / safe_tan, math.pi + 2)
+    if method == 'meyerhof':
+        ngamma = (nq - 1) * np.tan(1.4 * phi)
+    else:
+        ngamma = 1.5 * (nq - 1) * tan_phi
+    # Nq - 1 rounds to a tiny negative number at phi = 0
+    return nc, nq, np.maximum(ngamma, 0)
+
+
+def _meyerhof_factors(phi, width, depth, length, theta, nc, nq):
+    kp = np.tan(math.pi / 4 + phi / 2) ** 2
+    frictional = phi > math.radians(10)
+    ratio = width / length
+    s_c = 1 + 0.2 * kp * ratio
+    s_q = np.where(frictional, 1 + 0.1 * kp * ratio, 1.0)
+    d_c = 1 + 0.2 * np.sqrt(kp) * depth / width
+    d_q = np.where(frictional, 1 + 0.1 * np.sqrt(kp) * depth / width, 1.0)
+    i_c = (1 - theta / (math.pi / 2)) ** 2
+    safe_phi = np.where(phi > _PHI_EPSILON, phi, 1.0)
+    i_gamma = np.where(phi > _PHI_EPSILON, np.clip(1 - theta / safe_phi, 0, None) ** 2, 1.0)
+    return (s_c, s_q, s_q), (d_c, d_q, d_q), (i_c, i_c, i_gamma)
+
+
+def _hansen_factors(phi, width, depth, length, theta, nc, nq):
+    tan_phi = np.tan(phi)
+    frictional = phi > _PHI_EPSILON
+    ratio = width / length
+    s_c = 1 + nq / nc * ratio
+    s_q = 1 + ratio * np.sin(phi)
+    s_gamma = np.maximum(1 - 0.4 * ratio, 0.6)
+    k = np.where(depth <= width, depth / width, np.arctan(depth / width))
+    d_c = 1 + 0.4 * k
+    d_q = 1 + 2 * tan_phi * (1 - np.sin(phi)) ** 2 * k
+    tan_theta = np.tan(theta)
+    i_q = np.clip(1 - 0.5 * tan_theta, 0, None) ** 5
+    i_gamma = np.clip(1 - 0.7 * tan_theta, 0, None) ** 5
+    safe_nq = np.where(frictional, nq - 1, 1.0)
+    i_c = np.where(frictional, i_q - (1 - i_q) / safe_nq, (1 - theta / (math.pi / 2)) ** 2)
+    return (s_c, s_q, s_gamma), (d_c, d_q, 1.0), (i_c, i_q, i_gamma)
+
+
+def _terzaghi_factors(phi, width, depth, length, theta, nc, nq):
+    ratio = width / length
+    _, _, inclination = _meyerhof_factors(phi, width, depth, length, theta, nc, nq)
+    return (1 + 0.3 * ratio, 1.0, 1 - 0.2 * ratio), (1.0, 1.0, 1.0), inclination
+
+
+FACTORS = {
+    'terzaghi': _terzaghi_factors,
+    'meyerhof': _meyerhof_factors,
+    'hansen': _hansen_factors,
+}
+
+
+def bearing_capacity(bottoms, soil, water_depth, widths, depths, inclinations=(0.0,), footing='strip',
+                     length=None, method='meyerhof', factor_of_safety=DEFAULT_FACTOR_OF_SAFETY):
+    """
+    Ultimate and allowable bearing pressure for every combination of
+    ``widths``, ``depths`` and ``inclinations`` (degrees from vertical).
+    ``soil`` maps SOIL_FIELDS to per-layer arrays. Rectangular footings
+    take their ``length`` (at least the width).
+    """
+    widths = np.asarray(widths, dtype=np.float64)[:, None, None]
+    depths = np.asarray(depths, dtype=np.float64)[None, :, None]
+    theta = np.radians(np.asarray(inclinations, dtype=np.float64))[None, None, :]
+    footing_length = {
+        'strip': np.inf,
+        'square': widths,
+        'rectangular': np.maximum(length or 0.0, widths),
+    }[footing]
+
+    # Averages over the zone of influence, one per (width, depth)
+    base = depths + 0 * widths
+    average = {field: depth_average(base, base + widths, bottoms, soil[field]) for field in SOIL_FIELDS}
+    phi = np.radians(average['friction_angle'])
+    cohesion = average['cohesion']
+    unit_weight = average['unit_weight']
+
+    _, _, q = vertical_stresses(depths, bottoms, soil['unit_weight'], water_depth)
+    submerged = np.maximum(unit_weight - WATER_UNIT_WEIGHT, 0)
+    dry_fraction = np.clip((water_depth - base) / widths, 0, 1)
+    gamma = submerged + dry_fraction * (unit_weight - submerged)
+
+    nc, nq, ngamma = bearing_factors(phi, method)
+    shape, depth, inclination = FACTORS[method](phi, widths, depths, footing_length, theta, nc, nq)
+    qu = (cohesion * nc * shape[0] * depth[0] * inclination[0]
+          + q * nq * shape[1] * depth[1] * inclination[1]
+          + 0.5 * gamma * widths * ngamma * shape[2] * depth[2] * inclination[2])
+    qu = np.broadcast_to(qu, (widths.shape[0], depths.shape[1], theta.shape[2]))
+    return {
+        'qu': qu,
+        'q_allow': qu / factor_of_safety,
+        'Nc': nc[:, :, 0], 'Nq': nq[:, :, 0], 'Ngamma': ngamma[:, :, 0],
+    }
+
+
+def model_bearing_capacity(model, water_depth=None, **options):
+    """``bearing_capacity`` over ``model``'s layers, groundwater at ``model.npv`` unless given."""
+    bottoms, soil = layer_properties(model, SOIL_FIELDS)
+    if not len(bottoms):
+        raise ValueError('The model has no layers.')
+    return bearing_capacity(bottoms, soil, model.npv if water_depth is None else water_depth, **options)
+
+
+def parse_grid(value, name, minimum=None, inclusive=True, max_count=None):
+    """
+    A 1-D float array from a list of numbers or ``{'start', 'stop', 'count'}``.
+    Raises ValueError with a message naming ``name``.
+    """
+    if isinstance(value, dict):
+        try:
+            start, stop, count = float(value['start']), float(value['stop']), int(value['count'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'{name} must be a list of numbers or {{"start", "stop", "count"}}.')
+        if max_count is not None and count > max_count:
+            raise ValueError(f'{name} can have at most {max_count:,} values.')
+        values = np.linspace(start, stop, max(count, 0))
+    else:
+        try:
+            values = np.array(value if isinstance(value, (list, tuple)) else [value], dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f'{name} must be a list of numbers or {{"start", "stop", "count"}}.')
+    if max_count is not None and len(values) > max_count:
+        raise ValueError(f'{name} can have at most {max_count:,} values.')
+    if values.ndim != 1 or not len(values) or not np.all(np.isfinite(values)):
+        raise ValueError(f'{name} must contain at least one finite number.')
+    if minimum is not None and np.any(values < minimum if inclusive else values <= minimum):
+        raise ValueError(f'{name} must be {">=" if inclusive else ">"} {minimum}.')
+    return values
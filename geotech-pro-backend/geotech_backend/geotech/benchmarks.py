@@ -0,0 +1,406 @@
+"""
+Micro-benchmarks for the geotech backend, run through
+``python manage.py benchmark <name>``.
+
+Benchmarks write to the configured database, so point them at a scratch
+copy. Every benchmark creates its own throwaway user and removes it (and
+everything cascading from it) when it finishes.
+"""
+import math
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .ingest import parse_samples, bulk_create_samples
+from .models import Project, GeotechnicalModel, Layer, CptTest, CptData
+from .serializers import CptDataSerializer, CptTestSerializer, GeotechnicalModelSerializer, LayerSerializer
+from .storage import read_channels, write_samples
+from .authentication import CachedTokenAuthentication
+from .endpoint_suite import bench_endpoints
+from .interpretation import (ATMOSPHERIC_PRESSURE, DEFAULT_AREA_RATIO, STRESS_EXPONENT_TOLERANCE,
+                             STRESS_EXPONENT_MAX_ITERATIONS, SBT_IC_BOUNDS, SBT_ZONES, interpret)
+from .stress import WATER_UNIT_WEIGHT, vertical_stresses
+from .consolidation import discretize, load_at, solve_consolidation, time_grid
+from .slope import SlopeSection, available_workers, search as slope_search
+
+
+def synthetic_samples(count, step=0.01):
+    """
+    A smooth, deterministic profile with ``count`` samples: qc in MPa, fs and
+    u2 in kPa, alternating sandier and more clayey bands.
+    """
+    samples = []
+    for i in range(count):
+        depth = (i + 1) * step
+        band = math.sin(depth * 1.7) ** 2
+        qc = 2.0 + 0.15 * depth + 6.0 * band
+        samples.append({
+            'depth': round(depth, 4),
+            'qc': round(qc, 4),
+            'fs': round(qc * (40.0 - 30.0 * band), 3),
+            'u2': round(max(depth - 1.5, 0) * 9.81 * (1.0 + 2.0 * (1 - band)), 3),
+        })
+    return samples
+
+
+@contextmanager
+def scratch_model():
+    """Yield a throwaway GeotechnicalModel; delete its user afterwards."""
+    user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}')
+    try:
+        project = Project(user=user, name='Benchmark')
+        project.save()
+        yield GeotechnicalModel.objects.create(project=project, user=user, name='Benchmark')
+    finally:
+        CptData.objects.filter(cpt_test__model__user=user).delete()
+        user.delete()
+
+
+def _rate(rows, seconds):
+    return rows / seconds if seconds > 0 else float('inf')
+
+
+def legacy_ingest(model, payload):
+    """The pre-bulk path: nested per-row validation, one autocommit INSERT per sample."""
+    serializer = CptDataSerializer(data=payload, many=True)
+    serializer.is_valid(raise_exception=True)
+    cpt_test = CptTest.objects.create(model=model, name='legacy')
+    for item in serializer.validated_data:
+        CptData.objects.create(cpt_test=cpt_test, **item)
+
+
+def bulk_ingest(model, payload):
+    samples = parse_samples(payload)
+    with transaction.atomic():
+        cpt_test = CptTest.objects.create(model=model, name='bulk')
+        bulk_create_samples(cpt_test, samples)
+
+
+def bench_ingest(sizes, legacy_limit=100_000, **options):
+    """
+    Rows/second of the legacy per-row ingest against the bulk path.
+    Legacy runs above ``legacy_limit`` samples are skipped: at one fsync per
+    row they take hours.
+    """
+    results = []
+    for size in sizes:
+        payload = synthetic_samples(size)
+        row = {'samples': size}
+        paths = [('bulk', bulk_ingest)]
+        if size <= legacy_limit:
+            paths.insert(0, ('legacy', legacy_ingest))
+        for label, ingest in paths:
+            with scratch_model() as model:
+                started = time.perf_counter()
+                ingest(model, payload)
+                row[label] = _rate(size, time.perf_counter() - started)
+        results.append(row)
+    return results
+
+
+def bench_storage(sizes, **options):
+    """
+    Payload size and read latency of one sounding kept as CptData rows
+    versus packed float64/float32 arrays. ``*_bytes`` counts column payload
+    only (rows carry an id and a foreign key besides the four floats, plus
+    page and index overhead not counted here). ``*_arrays_ms`` is decoding
+    into NumPy channels, ``*_api_ms`` the full nested ``data`` representation.
+    """
+    results = []
+    for size in sizes:
+        samples = parse_samples(synthetic_samples(size))
+        row = {'samples': size, 'rows_bytes': size * 5 * 8}
+        with scratch_model() as model:
+            for label, storage, dtype in [('rows', CptTest.STORAGE_ROWS, 'f8'),
+                                          ('f8', CptTest.STORAGE_PACKED, 'f8'),
+                                          ('f4', CptTest.STORAGE_PACKED, 'f4')]:
+                with transaction.atomic():
+                    cpt_test = CptTest.objects.create(model=model, name=label, storage=storage)
+                    write_samples(cpt_test, samples, dtype)
+                if storage == CptTest.STORAGE_PACKED:
+                    row[f'{label}_bytes'] = size * 4 * int(dtype[1])
+
+                cpt_test = CptTest.objects.get(id=cpt_test.id)
+                started = time.perf_counter()
+                read_channels(cpt_test)
+                row[f'{label}_arrays_ms'] = (time.perf_counter() - started) * 1000
+
+                cpt_test = CptTest.objects.get(id=cpt_test.id)
+                started = time.perf_counter()
+                CptTestSerializer(cpt_test).data
+                row[f'{label}_api_ms'] = (time.perf_counter() - started) * 1000
+        results.append(row)
+    return results
+
+
+def legacy_model_read(model_id):
+    """
+    The pre-prefetch read path: two exists() checks, one ``data`` query per
+    CPT test and a nested CptDataSerializer (an OrderedDict) per sample.
+    """
+    model = GeotechnicalModel.objects.get(id=model_id)
+    model.layers.exists()
+    model.cpt_tests.exists()
+    return {
+        'layers': LayerSerializer(model.layers.all(), many=True).data,
+        'cpt_tests': [
+            {'id': cpt_test.id, 'name': cpt_test.name,
+             'data': CptDataSerializer(cpt_test.data.order_by('depth', 'id'), many=True).data}
+            for cpt_test in model.cpt_tests.all()
+        ],
+    }
+
+
+def model_read(model_id):
+    return GeotechnicalModelSerializer(GeotechnicalModel.objects.with_read_data().get(id=model_id)).data
+
+
+def bench_model_read(sizes, cpt_counts=(1, 10), legacy_limit=100_000, **options):
+    """
+    Latency and query count of serializing one model (as GetLayersView
+    does) with ``cpt_counts`` row-stored CPT tests of ``sizes`` samples
+    each, legacy read path against the prefetching one. The legacy path is
+    skipped above ``legacy_limit`` samples in total.
+    """
+    results = []
+    for cpt_count in cpt_counts:
+        for size in sizes:
+            samples = parse_samples(synthetic_samples(size))
+            row = {'cpt_tests': cpt_count, 'samples': size}
+            with scratch_model() as model:
+                with transaction.atomic():
+                    Layer.objects.bulk_create(Layer(model=model, name=f'L{i}', position=i) for i in range(5))
+                    for i in range(cpt_count):
+                        write_samples(CptTest.objects.create(model=model, name=f'CPT {i}'), samples)
+                paths = [('prefetch', model_read)]
+                if cpt_count * size <= legacy_limit:
+                    paths.insert(0, ('legacy', legacy_model_read))
+                for label, read in paths:
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        read(model.id)
+                        row[f'{label}_ms'] = (time.perf_counter() - started) * 1000
+                    row[f'{label}_queries'] = len(queries.captured_queries)
+            results.append(row)
+    return results
+
+
+class _AuthenticatedPing(APIView):
+    def get(self, request):
+        return Response({'user': request.user.id})
+
+
+def bench_auth(sizes, **options):
+    """
+    Authenticated requests/second through a trivial DRF view with DRF's
+    TokenAuthentication against CachedTokenAuthentication, ``sizes``
+    requests each, plus the queries per request once warm.
+    """
+    factory = RequestFactory()
+    results = []
+    with scratch_model() as model:
+        token = Token.objects.create(user=model.user)
+        for size in sizes:
+            row = {'requests': size}
+            for label, authentication in [('token', TokenAuthentication), ('cached', CachedTokenAuthentication)]:
+                view = _AuthenticatedPing.as_view(authentication_classes=[authentication])
+                requests = [factory.get('/', HTTP_AUTHORIZATION=f'Token {token.key}') for _ in range(size + 100)]
+                started = time.perf_counter()
+                for request in requests[:size]:
+                    view(request)
+                row[label] = _rate(size, time.perf_counter() - started)
+                # Query logging is capped, so count over a short warm run
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    for request in requests[size:]:
+                        view(request)
+                row[f'{label}_queries'] = len(queries.captured_queries) / 100
+            results.append(row)
+    return results
+
+
+def reference_interpretation(depth, qc, fs, u2, bottoms, unit_weights, water_depth,
+                             area_ratio=DEFAULT_AREA_RATIO):
+    """
+    Pure-Python, one-sample-at-a-time version of interpretation.interpret,
+    kept as the correctness and speed baseline for the vectorized engine.
+    Returns ``(Qtn, Ic, sbtn_zone)`` lists.
+    """
+    pa = ATMOSPHERIC_PRESSURE
+    results = ([], [], [])
+    for z, qc_i, fs_i, u2_i in zip(depth, qc, fs, u2):
+        sigma_v0, top = 0.0, 0.0
+        for k, (bottom, gamma) in enumerate(zip(bottoms, unit_weights)):
+            if z < bottom or k == len(bottoms) - 1:
+                sigma_v0 += gamma * (max(z, 0) - top)
+                break
+            sigma_v0 += gamma * (bottom - top)
+            top = bottom
+        u0 = WATER_UNIT_WEIGHT * max(z - water_depth, 0)
+        eff = sigma_v0 - u0
+        qt = qc_i * 1000.0 + u2_i * (1.0 - area_ratio)
+        net = qt - sigma_v0
+        if net <= 0 or eff <= 0 or fs_i <= 0 or qt <= 0:
+            results[0].append(math.nan)
+            results[1].append(math.nan)
+            results[2].append(0)
+            continue
+        fr = fs_i / net * 100.0
+        n = 1.0
+        for _ in range(STRESS_EXPONENT_MAX_ITERATIONS + 1):
+            qtn = (net / pa) * (pa / eff) ** n
+            ic = math.sqrt((3.47 - math.log10(qtn)) ** 2 + (math.log10(fr) + 1.22) ** 2)
+            n_next = min(0.381 * ic + 0.05 * (eff / pa) - 0.15, 1.0)
+            if abs(n_next - n) <= STRESS_EXPONENT_TOLERANCE:
+                n = n_next
+                qtn = (net / pa) * (pa / eff) ** n
+                ic = math.sqrt((3.47 - math.log10(qtn)) ** 2 + (math.log10(fr) + 1.22) ** 2)
+                break
+            n = n_next
+        zone = int(SBT_ZONES[-1])
+        for bound, candidate in zip(SBT_IC_BOUNDS, SBT_ZONES):
+            if ic <= bound:
+                zone = int(candidate)
+                break
+        results[0].append(qtn)
+        results[1].append(ic)
+        results[2].append(zone)
+    return results
+
+
+def bench_interpretation(sizes, legacy_limit=100_000, **options):
+    """
+    Samples/second of the vectorized interpretation engine (stresses
+    included) against reference_interpretation, on a four-layer stack.
+    """
+    bottoms = np.array([1.5, 6.0, 14.0, 30.0])
+    unit_weights = np.array([17.0, 18.5, 19.5, 20.5])
+    results = []
+    for size in sizes:
+        samples = synthetic_samples(size, step=40.0 / size)
+        depth, qc, fs, u2 = (np.array([s[c] for s in samples]) for c in ('depth', 'qc', 'fs', 'u2'))
+        row = {'samples': size}
+
+        started = time.perf_counter()
+        sigma_v0, u0, _ = vertical_stresses(depth, bottoms, unit_weights, 2.0)
+        interpret(depth, qc, fs, u2, sigma_v0, u0)
+        row['numpy'] = _rate(size, time.perf_counter() - started)
+
+        if size <= legacy_limit:
+            lists = [a.tolist() for a in (depth, qc, fs, u2)]
+            started = time.perf_counter()
+            reference_interpretation(*lists, bottoms.tolist(), unit_weights.tolist(), 2.0)
+            row['python'] = _rate(size, time.perf_counter() - started)
+            row['speedup'] = row['numpy'] / row['python']
+        results.append(row)
+    return results
+
+
+def reference_consolidation(capacity, conductance, drained, times, loads):
+    """
+    Settlement by backward Euler with a tridiagonal (Thomas) solve per time
+    step, vectorized over load cases only. The same discrete equations as
+    consolidation.solve_consolidation, solved the direct way.
+    """
+    free = np.flatnonzero(~drained)
+    c = capacity[free]
+    kd = np.zeros(len(capacity))
+    kd[:-1] += conductance
+    kd[1:] += conductance
+    diagonal_k, coupling = kd[free], conductance[free[:-1]]
+    total = capacity.sum()
+    u = np.tile(loads[0], (len(free), 1))
+    settlement = np.empty_like(loads)
+    settlement[0] = total * loads[0] - c @ u
+    for n in range(len(times) - 1):
+        dt = times[n + 1] - times[n]
+        rhs = c[:, None] * (u + (loads[n + 1] - loads[n]))
+        diagonal = c + dt * diagonal_k
+        off = -dt * coupling
+        upper = np.empty(len(free) - 1)
+        upper[0] = off[0] / diagonal[0]
+        rhs[0] /= diagonal[0]
+        for i in range(1, len(free)):
+            pivot = diagonal[i] - off[i - 1] * upper[i - 1]
+            if i < len(free) - 1:
+                upper[i] = off[i] / pivot
+            rhs[i] = (rhs[i] - off[i - 1] * rhs[i - 1]) / pivot
+        for i in range(len(free) - 2, -1, -1):
+            rhs[i] -= upper[i] * rhs[i + 1]
+        u = rhs
+        settlement[n + 1] = total * loads[n + 1] - c @ u
+    return settlement
+
+
+def bench_consolidation(steps=1000, nodes=500, load_cases=100, **options):
+    """
+    Wall time of ``load_cases`` consolidation runs of ``steps`` implicit
+    steps on ``nodes`` nodes through a 30 m layered column, batched
+    modal solve against reference_consolidation.
+    """
+    bottoms = np.array([4.0, 12.0, 15.0, 24.0, 30.0])
+    compressibility = np.array([0.0005, 0.00005, 0.002, 0.0003, 0.00005])
+    permeability = np.array([1e-9, 1e-5, 1e-8, 2e-9, np.nan])
+    z, capacity, conductance, drained = discretize(bottoms, compressibility, permeability, nodes)
+    times = time_grid(10 * 365.0, steps)
+    # Fills of 20-120 kPa placed over 1-100 days
+    histories = [[(0.0, 0.0), (1.0 + 99.0 * i / load_cases, 20.0 + 100.0 * i / load_cases)]
+                 for i in range(load_cases)]
+    loads = load_at(times, histories)
+    row = {'steps': len(times) - 1, 'nodes': nodes, 'load_cases': load_cases}
+
+    started = time.perf_counter()
+    settlement, _ = solve_consolidation(capacity, conductance, drained, times, loads)
+    row['implicit_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    reference = reference_consolidation(capacity, conductance, drained, times, loads)
+    row['reference_ms'] = (time.perf_counter() - started) * 1000
+    row['speedup'] = row['reference_ms'] / row['implicit_ms']
+    row['max_diff_mm'] = float(np.max(np.abs(settlement - reference))) * 1000
+    return [row]
+
+
+def bench_slope(workers=None, **options):
+    """
+    Circles/second of the Bishop slope search on a layered 10 m slope,
+    in-process and over process pools of ``workers`` sizes (the first
+    pooled run includes spawning the workers).
+    """
+    bottoms = np.array([3.0, 8.0, 30.0])
+    soil = {'unit_weight': np.array([18.0, 19.0, 20.0]), 'cohesion': np.array([5.0, 12.0, 25.0]),
+            'friction_angle': np.array([30.0, 24.0, 28.0])}
+    section = SlopeSection(10.0, 30.0, bottoms, soil, water_depth=3.0)
+    results = []
+    for grid in ((20, 20, 10), (40, 40, 25)):
+        for count in workers or sorted({1, available_workers()}):
+            result = slope_search(section, grid=grid, workers=count)
+            results.append({
+                'grid': 'x'.join(map(str, grid)), 'workers': count, 'circles': result['circles'],
+                'seconds': result['seconds'], 'circles_per_s': result['circles_per_second'],
+                'min_fs': result['factor_of_safety'],
+            })
+    return results
+
+
+BENCHMARKS = {
+    'ingest': bench_ingest,
+    'storage': bench_storage,
+    'interpretation': bench_interpretation,
+    'model_read': bench_model_read,
+    'auth': bench_auth,
+    'endpoints': bench_endpoints,
+    'consolidation': bench_consolidation,
+    'slope': bench_slope,
+}
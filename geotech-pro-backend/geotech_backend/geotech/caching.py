@@ -0,0 +1,138 @@
+"""
+Versioned cache of serialized model payloads.
+
+Every write to a model, its layers or its CPT samples bumps
+``GeotechnicalModel.version``. The rendered GetLayersView payload is cached
+under ``(model id, version, variant)`` (the variant names the negotiated
+format and content coding, e.g. ``columnar.gz``), so a write never has to find and purge
+stale payloads: they are simply never asked for again and age out of the
+LRU. A full GET reads the current version (one indexed query) before
+looking up the payload.
+
+When a tier is shared between worker processes (any backend but
+LocMemCache and DummyCache), the version and owner are also cached there
+for ``GEOTECH_MODEL_VERSION_TIMEOUT`` seconds, which lets a conditional
+GET with a matching ``ETag`` be answered with 304 without touching the
+database; writes drop the entry once they commit, which every process then
+sees. A per-process cache cannot be told about writes made by other
+workers, so without a shared tier versions are always read from the
+database and a stale 304 is never served.
+
+Stress profiles (``stress.StressProfile``) are cached the same way, under
+the ``stress`` variant.
+
+Payloads are looked up in each cache alias of ``GEOTECH_MODEL_CACHES`` in
+turn (a per-process LRU first, then optionally a shared tier); a hit in a
+later tier is copied into the earlier ones.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F
+
+from .models import GeotechnicalModel
+from .stress import StressProfile
+
+ModelVersion = namedtuple('ModelVersion', ['user_id', 'project_id', 'version'])
+
+
+def _tiers():
+    return [caches[alias] for alias in getattr(settings, 'GEOTECH_MODEL_CACHES', ['default'])]
+
+
+def _shared_tiers():
+    return [cache for cache in _tiers() if not isinstance(cache, (LocMemCache, DummyCache))]
+
+
+def shared_version_cache():
+    """Whether model versions are cached, i.e. a tier is shared between processes."""
+    return bool(_shared_tiers())
+
+
+def _version_key(model_id):
+    return f'geotech:model:{model_id}:version'
+
+
+def _payload_key(model_id, version, variant):
+    return f'geotech:model:{model_id}:v{version}:{variant}'
+
+
+def _get(key, tiers=None, **kwargs):
+    tiers = _tiers() if tiers is None else tiers
+    for i, cache in enumerate(tiers):
+        value = cache.get(key)
+        if value is not None:
+            for earlier in tiers[:i]:
+                earlier.set(key, value, **kwargs)
+            return value
+    return None
+
+
+def _set(key, value, tiers=None, **kwargs):
+    for cache in _tiers() if tiers is None else tiers:
+        cache.set(key, value, **kwargs)
+
+
+def model_version(model_id, cached=True):
+    """
+    ``ModelVersion`` of a model, or None if it does not exist. With
+    ``cached=False``, or without a shared cache tier, it is read from the
+    database (and re-cached in the shared tiers).
+    """
+    timeout = getattr(settings, 'GEOTECH_MODEL_VERSION_TIMEOUT', 30)
+    tiers = _shared_tiers()
+    if cached and tiers:
+        value = _get(_version_key(model_id), tiers=tiers, timeout=timeout)
+        if value is not None:
+            return ModelVersion(*value)
+    row = GeotechnicalModel.objects.filter(id=model_id).values_list('user_id', 'project_id', 'version').first()
+    if row is None:
+        return None
+    _set(_version_key(model_id), tuple(row), tiers=tiers, timeout=timeout)
+    return ModelVersion(*row)
+
+
+def model_etag(model_id, version, variant):
+    return f'"model-{model_id}-v{version}-{variant}"'
+
+
+def bump_model_version(model_id):
+    """
+    Record a write to a model. The cached version is dropped once the
+    transaction commits, so no reader can cache the old content under the
+    new version.
+    """
+    GeotechnicalModel.objects.filter(id=model_id).update(version=F('version') + 1)
+    transaction.on_commit(lambda: forget_model_version(model_id))
+
+
+def forget_model_version(model_id):
+    for cache in _tiers():
+        cache.delete(_version_key(model_id))
+
+
+def cached_payload(model_id, version, variant):
+    return _get(_payload_key(model_id, version, variant))
+
+
+def store_payload(model_id, version, variant, payload):
+    _set(_payload_key(model_id, version, variant), payload)
+
+
+def cached_stress_profile(model_id, version):
+    """
+    ``StressProfile`` of a model at ``version``, built from the database on
+    a miss. A profile read after a concurrent write is returned but not
+    stored, since it no longer matches ``version``.
+    """
+    profile = cached_payload(model_id, version, 'stress')
+    if profile is None:
+        model = GeotechnicalModel.objects.only('id', 'npv', 'npv_max', 'version').get(id=model_id)
+        profile = StressProfile.from_model(model)
+        if model.version == version:
+            store_payload(model_id, version, 'stress', profile)
+    return profile
@@ -0,0 +1,39 @@
+"""
+gzip content-coding negotiation.
+
+Django's GZipMiddleware (and a plain substring test) treat any
+``Accept-Encoding`` mentioning gzip as acceptance, including ``gzip;q=0``,
+which explicitly refuses it. ``accepts_gzip`` honours q-values and the
+``*`` wildcard; ``GZipMiddleware`` is Django's with that check in front.
+"""
+from django.middleware import gzip
+from django.utils.cache import patch_vary_headers
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an ``Accept-Encoding`` header allows gzip: listed (or covered by
+    ``*``) with a non-zero q-value.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
+
+
+class GZipMiddleware(gzip.GZipMiddleware):
+    def process_response(self, request, response):
+        if not accepts_gzip(request.headers.get('Accept-Encoding', '')):
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+        return super().process_response(request, response)
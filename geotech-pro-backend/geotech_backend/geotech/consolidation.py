@@ -0,0 +1,203 @@
+"""
+One-dimensional (Terzaghi) consolidation of a model's layer stack.
+
+    mv du/dt = d/dz (k / gamma_w du/dz) + mv dq/dt
+
+``u`` is the excess pore pressure and ``q`` a surface load applied over a
+wide area, so the stress increase is the same at every depth. The column
+runs from the surface to the bottom of the last layer and is discretized
+into evenly spaced nodes. Each node's capacity is ``mv`` times its share of
+the column and each interval between nodes conducts with the harmonic mean
+permeability across it, so layer boundaries need not coincide with nodes.
+The surface drains; the base drains too (``double``) or is impermeable
+(``top``). The whole column is treated as saturated.
+
+Time stepping is implicit (backward Euler) on a geometric time grid, so
+steps can grow with time and a horizon of decades costs no more than a
+few days. The finite-difference operator is the same at every step and for
+every load case: it is diagonalized once, after which each implicit step is
+an elementwise update of all load cases together, whatever the step size.
+``benchmarks.reference_consolidation`` solves the same equations with a
+tridiagonal solve per step.
+
+``Layer.compressibility`` is mv in 1/kPa and ``Layer.permeability`` k in
+m/s. Times are in days, loads in kPa, settlements in m.
+"""
+import numpy as np
+
+from .stress import WATER_UNIT_WEIGHT, depth_average, layer_properties
+
+SECONDS_PER_DAY = 86400.0
+DRAINAGE = ('double', 'top')
+DEFAULT_NODES = 101
+DEFAULT_STEPS = 200
+DEFAULT_DURATION = 3650.0
+MAX_NODES = 1000
+MAX_STEPS = 5000
+MAX_LOAD_CASES = 1000
+MAX_HISTORY_POINTS = 100
+
+# Layers without a permeability are taken to drain freely (clean sand)
+FREE_DRAINING_PERMEABILITY = 1e-4
+# Incompressible layers get this fraction of the stack's largest mv (1/kPa),
+# enough to keep the system well conditioned while adding at most 0.1 %
+MIN_COMPRESSIBILITY_RATIO = 1e-3
+MIN_COMPRESSIBILITY = 1e-9
+MIN_PERMEABILITY = 1e-15
+# The first time step is this fraction of the duration
+FIRST_STEP = 1e-5
+
+
+def discretize(bottoms, compressibility, permeability, nodes, depth=None, drainage='double'):
+    """
+    ``(z, capacity, conductance, drained)`` for ``nodes`` nodes down to
+    ``depth`` (the bottom of the stack by default): node capacities
+    mv * length in m/kPa, the conductance k / (gamma_w dz) of each of the
+    ``nodes - 1`` intervals in m/(kPa day), and a mask of drained nodes.
+    """
+    height = float(bottoms[-1] if depth is None else depth)
+    if height <= 0:
+        raise ValueError('The consolidating column must have a positive depth.')
+    z = np.linspace(0.0, height, nodes)
+    dz = height / (nodes - 1)
+
+    mv = np.nan_to_num(compressibility, nan=0.0)
+    mv = np.maximum(mv, max(MIN_COMPRESSIBILITY_RATIO * mv.max(), MIN_COMPRESSIBILITY))
+    k = np.where(np.isnan(permeability), FREE_DRAINING_PERMEABILITY, permeability)
+    k = np.maximum(k, MIN_PERMEABILITY)
+
+    low, high = np.maximum(z - dz / 2, 0), np.minimum(z + dz / 2, height)
+    capacity = depth_average(low, high, bottoms, mv) * (high - low)
+    resistance = depth_average(z[:-1], z[1:], bottoms, 1 / k)
+    conductance = SECONDS_PER_DAY / (resistance * WATER_UNIT_WEIGHT * dz)
+
+    drained = np.zeros(nodes, dtype=bool)
+    drained[0] = True
+    drained[-1] = drainage == 'double'
+    return z, capacity, conductance, drained
+
+
+def time_grid(duration, steps, breakpoints=()):
+    """
+    ``steps`` geometrically growing steps from 0 to ``duration``, plus any
+    load ``breakpoints`` inside it so ramps and holds start on a step.
+    """
+    grid = np.geomspace(duration * FIRST_STEP, duration, steps)
+    breakpoints = np.asarray(breakpoints, dtype=np.float64)
+    return np.unique(np.concatenate(([0.0], grid, breakpoints[(breakpoints > 0) & (breakpoints < duration)])))
+
+
+def load_at(times, histories):
+    """
+    ``(len(times), len(histories))`` loads. Each history is a list of
+    ``(time, load)`` points, linear in between and held after the last;
+    it starts from zero load unless its first point is at time 0.
+    """
+    loads = np.empty((len(times), len(histories)))
+    for i, history in enumerate(histories):
+        t, q = np.asarray(history, dtype=np.float64).T
+        if t[0] > 0:
+            t, q = np.concatenate(([0.0], t)), np.concatenate(([0.0], q))
+        loads[:, i] = np.interp(times, t, q)
+    return loads
+
+
+def solve_consolidation(capacity, conductance, drained, times, loads, profile_steps=()):
+    """
+    Settlement ``(len(times), cases)`` in m under ``loads`` (load per time
+    per case), and the excess pore pressure ``(len(profile_steps), nodes,
+    cases)`` at the requested step indices. The load at ``times[0]`` is
+    applied undrained.
+    """
+    free = ~drained
+    c = capacity[free]
+    kd = np.zeros(len(capacity))
+    kd[:-1] += conductance
+    kd[1:] += conductance
+    operator = np.diag(kd) - np.diag(conductance, 1) - np.diag(conductance, -1)
+    root = np.sqrt(c)
+    # C^-1/2 K C^-1/2 is symmetric: backward Euler becomes a per-mode division
+    eigenvalues, modes = np.linalg.eigh(operator[np.ix_(free, free)] / root[:, None] / root[None, :])
+    eigenvalues = np.maximum(eigenvalues, 0)
+    load_shape = modes.T @ root
+
+    total = capacity.sum()
+    y = np.outer(load_shape, loads[0])
+    settlement = np.empty_like(loads)
+    settlement[0] = total * loads[0] - load_shape @ y
+    profiles = np.zeros((len(profile_steps), len(capacity), loads.shape[1]))
+
+    def store_profiles(step):
+        for i, wanted in enumerate(profile_steps):
+            if wanted == step:
+                profiles[i, free] = (modes @ y) / root[:, None]
+
+    store_profiles(0)
+    increments = np.diff(loads, axis=0)
+    decay = 1 / (1 + np.diff(times)[:, None] * eigenvalues[None, :])
+    for n in range(len(times) - 1):
+        y += load_shape[:, None] * increments[n]
+        y *= decay[n][:, None]
+        settlement[n + 1] = total * loads[n + 1] - load_shape @ y
+        store_profiles(n + 1)
+    return settlement, profiles
+
+
+def parse_load_cases(value):
+    """
+    ``(names, histories)`` from a list of ``{'name', 'history'}`` load
+    cases, each history a list of at most MAX_HISTORY_POINTS ``[time, load]``
+    points with non-decreasing times from 0. Raises ValueError.
+    """
+    if not isinstance(value, list) or not value:
+        raise ValueError('load_cases must be a non-empty list.')
+    if len(value) > MAX_LOAD_CASES:
+        raise ValueError(f'At most {MAX_LOAD_CASES} load cases per request.')
+    names, histories = [], []
+    for i, case in enumerate(value):
+        try:
+            history = np.array(case['history'], dtype=np.float64)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Load case {i + 1} needs a history of [time, load] points.')
+        if history.ndim != 2 or history.shape[1] != 2 or not len(history) or not np.all(np.isfinite(history)):
+            raise ValueError(f'Load case {i + 1} needs a history of [time, load] points.')
+        if len(history) > MAX_HISTORY_POINTS:
+            raise ValueError(f'Load case {i + 1}: at most {MAX_HISTORY_POINTS} history points.')
+        if history[0, 0] < 0 or np.any(np.diff(history[:, 0]) < 0):
+            raise ValueError(f'Load case {i + 1}: times must start at 0 or later and not decrease.')
+        names.append(str(case.get('name') or f'Case {i + 1}'))
+        histories.append(history.tolist())
+    return names, histories
+
+
+def model_consolidation(model, histories, duration=DEFAULT_DURATION, steps=DEFAULT_STEPS, nodes=DEFAULT_NODES,
+                        drainage='double', depth=None, profile_times=()):
+    """
+    Time-settlement curves of ``model`` under each load history. Returns
+    a dict with the time grid, node depths, settlements per case
+    (``(cases, times)``), the final primary settlement per case and, for
+    each of ``profile_times``, the excess pore pressure isochrones.
+    """
+    bottoms, soil = layer_properties(model, ['compressibility', 'permeability'])
+    if not len(bottoms):
+        raise ValueError('The model has no layers.')
+    z, capacity, conductance, drained = discretize(
+        bottoms, soil['compressibility'], soil['permeability'], nodes, depth, drainage,
+    )
+    breakpoints = [t for history in histories for t, _ in history] + list(profile_times)
+    times = time_grid(duration, steps, breakpoints)
+    # Every distinct breakpoint adds a step on top of ``steps``
+    if len(times) - 1 > MAX_STEPS:
+        raise ValueError(f'The steps and load history breakpoints come to {len(times) - 1} time steps; '
+                         f'at most {MAX_STEPS} are allowed.')
+    loads = load_at(times, histories)
+    profile_steps = [int(np.argmin(np.abs(times - t))) for t in profile_times]
+    settlement, profiles = solve_consolidation(capacity, conductance, drained, times, loads, profile_steps)
+    return {
+        'times': times,
+        'z': z,
+        'settlement': settlement.T,
+        'final_settlement': capacity.sum() * loads[-1],
+        'profile_times': times[profile_steps],
+        'profiles': profiles.transpose(2, 0, 1),
+    }
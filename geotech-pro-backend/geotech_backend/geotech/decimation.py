@@ -0,0 +1,116 @@
+"""
+Level-of-detail reads for CPT soundings.
+
+A plot a few hundred pixels tall cannot show more than a few thousand
+points, so long soundings are decimated with a min/max envelope: the depth
+range is cut into bins of ``bin_size`` consecutive samples and each bin
+keeps only the samples holding the minimum and maximum of qc, fs and u2.
+Peaks and thin layers survive, and every kept point is a real sample.
+
+The envelopes are precomputed at save time as a pyramid (bins of 16, 64,
+256, ... samples) stored as ``PyramidLevel`` rows, so a zoomed-out read
+loads one small level instead of the whole sounding.
+"""
+import numpy as np
+
+from .ingest import CPT_CHANNELS
+from .models import PyramidLevel
+
+ENVELOPE_CHANNELS = ('qc', 'fs', 'u2')
+POINTS_PER_BIN = 2 * len(ENVELOPE_CHANNELS)
+# One envelope bin plus the end samples: the smallest budget decimate can keep to
+MIN_MAX_POINTS = POINTS_PER_BIN + 2
+
+PYRAMID_BASE_BIN = 16
+PYRAMID_FACTOR = 4
+# Levels coarser than this many bins are not worth storing
+PYRAMID_MIN_BINS = 256
+
+DEFAULT_MAX_POINTS = 2000
+
+
+def envelope_indices(channels, bin_size):
+    """Sorted indices of the samples kept by a min/max envelope over ``bin_size`` bins."""
+    n = len(channels['depth'])
+    if n == 0 or bin_size <= 1:
+        return np.arange(n)
+    bins = -(-n // bin_size)
+    offsets = np.arange(bins) * bin_size
+    picked = [np.array([0, n - 1])]
+    for channel in ENVELOPE_CHANNELS:
+        padded = np.full(bins * bin_size, np.nan)
+        padded[:n] = channels[channel]
+        padded = padded.reshape(bins, bin_size)
+        picked.append(offsets + np.nanargmin(padded, axis=1))
+        picked.append(offsets + np.nanargmax(padded, axis=1))
+    return np.unique(np.concatenate(picked))
+
+
+def decimate(channels, max_points):
+    """
+    ``channels`` reduced to at most ``max_points`` samples; budgets below
+    MIN_MAX_POINTS still keep one bin's envelope.
+    """
+    n = len(channels['depth'])
+    if n <= max_points:
+        return channels, 1
+    bins = max((max_points - 2) // POINTS_PER_BIN, 1)
+    bin_size = -(-n // bins)
+    keep = envelope_indices(channels, bin_size)
+    return {channel: channels[channel][keep] for channel in CPT_CHANNELS}, bin_size
+
+
+def pyramid_bin_sizes(count):
+    bin_size = PYRAMID_BASE_BIN
+    while count // bin_size >= PYRAMID_MIN_BINS:
+        yield bin_size
+        bin_size *= PYRAMID_FACTOR
+
+
+def build_pyramid(cpt_test, channels):
+    """
+    Replace ``cpt_test``'s pyramid with one built from ``channels`` (in
+    depth order). Short soundings get no levels. Returns the new levels.
+    """
+    PyramidLevel.objects.filter(cpt_test=cpt_test).delete()
+    count = len(channels['depth'])
+    levels = []
+    for bin_size in pyramid_bin_sizes(count):
+        keep = envelope_indices(channels, bin_size)
+        levels.append(PyramidLevel(
+            cpt_test=cpt_test,
+            bin_size=bin_size,
+            sample_count=len(keep),
+            source_count=count,
+            samples_digest=cpt_test.samples_digest,
+            **{
+                channel: np.ascontiguousarray(channels[channel][keep], dtype='<f8').tobytes()
+                for channel in CPT_CHANNELS
+            },
+        ))
+    return PyramidLevel.objects.bulk_create(levels)
+
+
+def unpack_level(level):
+    return {channel: np.frombuffer(getattr(level, channel), dtype='<f8') for channel in CPT_CHANNELS}
+
+
+def depth_slice(channels, depth_from=None, depth_to=None):
+    """Samples with ``depth_from <= depth <= depth_to``, by binary search on the sorted depths."""
+    depth = channels['depth']
+    start = 0 if depth_from is None else np.searchsorted(depth, depth_from, side='left')
+    stop = len(depth) if depth_to is None else np.searchsorted(depth, depth_to, side='right')
+    return {channel: channels[channel][start:stop] for channel in CPT_CHANNELS}
+
+
+def choose_level(levels, window_count, max_points):
+    """
+    The finest ``(bin_size, sample_count, source_count)`` level expected to
+    fit ``max_points`` over a window of ``window_count`` raw samples, or the
+    coarsest one if none does.
+    """
+    for level in levels:
+        bin_size, sample_count, source_count = level
+        if window_count * sample_count / max(source_count, 1) <= max_points:
+            return level
+    return levels[-1]
@@ -0,0 +1,92 @@
+"""
+Persisted cache of derived CPT series.
+
+An interpretation depends only on a sounding's samples, the model's layer
+stack, its groundwater levels and the interpretation settings. All of those
+are folded into ``DerivedSeries.input_hash``: the samples through
+``CptTest.samples_digest`` (recorded on every write), the rest directly. A
+cache hit is then one indexed read on ``(cpt_test, input_hash)`` and any
+change to an input simply misses. Soundings are looked up in batches, so a
+model or a whole project costs the same few queries as one sounding. Writes
+that change inputs also delete the stale rows so the table does not grow
+without bound.
+"""
+import hashlib
+import io
+
+import numpy as np
+
+from .interpretation import INTERPRETATION_VERSION, OUTPUT_FIELDS, interpret_channels
+from .models import DerivedSeries
+from .storage import ensure_samples_digest, read_channels_batch
+from .stress import layer_stack
+
+
+def input_hash(cpt_test, model, bottoms, unit_weights, area_ratio, groundwater='npv'):
+    hasher = hashlib.sha256()
+    hasher.update(f'v{INTERPRETATION_VERSION}:{ensure_samples_digest(cpt_test)}:{groundwater}:'.encode())
+    hasher.update(np.array([model.npv, model.npv_max, area_ratio], dtype='<f8').tobytes())
+    hasher.update(np.asarray(bottoms, dtype='<f8').tobytes())
+    hasher.update(np.asarray(unit_weights, dtype='<f8').tobytes())
+    return hasher.hexdigest()
+
+
+def encode_result(result):
+    buffer = io.BytesIO()
+    np.savez(buffer, **{field: result[field] for field in OUTPUT_FIELDS})
+    return buffer.getvalue()
+
+
+def decode_result(payload):
+    with np.load(io.BytesIO(bytes(payload)), allow_pickle=False) as arrays:
+        return {field: arrays[field] for field in OUTPUT_FIELDS}
+
+
+def interpret_cached_batch(entries, area_ratio, groundwater='npv'):
+    """
+    Interpretations of many ``(cpt_test, model, bottoms, unit_weights)``
+    entries with the groundwater at ``model.npv`` or ``model.npv_max``,
+    each computed at most once per input version. The stored series are
+    fetched in one query; the misses' samples are read with at most two
+    more and their series stored with one bulk insert, whatever the
+    number of soundings.
+    """
+    keys = [input_hash(cpt_test, model, bottoms, unit_weights, area_ratio, groundwater)
+            for cpt_test, model, bottoms, unit_weights in entries]
+    stored = {
+        (cpt_test_id, key): payload
+        for cpt_test_id, key, payload in DerivedSeries.objects.filter(
+            cpt_test__in=[entry[0] for entry in entries], input_hash__in=keys,
+        ).values_list('cpt_test_id', 'input_hash', 'payload')
+    } if entries else {}
+
+    results = [None] * len(entries)
+    missing = []
+    for i, ((cpt_test, *_), key) in enumerate(zip(entries, keys)):
+        payload = stored.get((cpt_test.id, key))
+        if payload is None:
+            missing.append(i)
+        else:
+            results[i] = decode_result(payload)
+
+    computed = []
+    for i, channels in zip(missing, read_channels_batch([entries[i][0] for i in missing])):
+        cpt_test, model, bottoms, unit_weights = entries[i]
+        results[i] = interpret_channels(channels, bottoms, unit_weights, getattr(model, groundwater), area_ratio)
+        computed.append(DerivedSeries(cpt_test=cpt_test, input_hash=keys[i], payload=encode_result(results[i])))
+    # A concurrent request may have stored the same series first
+    DerivedSeries.objects.bulk_create(computed, ignore_conflicts=True)
+    return results
+
+
+def interpret_model_cached(model, cpt_tests, area_ratio, groundwater='npv'):
+    """``(cpt_test, result)`` pairs for CPT tests of one model, through interpret_cached_batch."""
+    bottoms, unit_weights = layer_stack(model)
+    cpt_tests = list(cpt_tests)
+    entries = [(cpt_test, model, bottoms, unit_weights) for cpt_test in cpt_tests]
+    return list(zip(cpt_tests, interpret_cached_batch(entries, area_ratio, groundwater)))
+
+
+def invalidate_model(model):
+    """Drop derived series for every CPT test of ``model``, after a layer or groundwater change."""
+    DerivedSeries.objects.filter(cpt_test__model=model).delete()
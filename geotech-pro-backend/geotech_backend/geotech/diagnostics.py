@@ -0,0 +1,142 @@
+"""
+Opt-in query diagnostics.
+
+With ``GEOTECH_QUERY_DIAGNOSTICS`` on, PerformanceMiddleware passes every
+query of a request through a QueryDiagnostics collector:
+
+* a query slower than ``GEOTECH_SLOW_QUERY_MS`` is reported with the
+  database's plan for it (``EXPLAIN QUERY PLAN`` on SQLite);
+* a query shape (the SQL with parameter lists collapsed, so
+  ``IN (%s, %s)`` and ``IN (%s, %s, %s)`` match) issued
+  ``GEOTECH_REPEATED_QUERY_THRESHOLD`` or more times in one request is
+  reported as a likely N+1.
+
+Reports name the view and the innermost geotech functions on the stack
+when the query was issued (a serializer method, a storage helper, the view
+method ...). They are logged on the ``geotech.queries`` logger and stored
+as QueryReport rows, which ``manage.py query_report`` summarizes. Plans are
+taken after the response is built, outside the request's timings.
+
+The collector walks the stack on every query, so keep the mode off unless
+investigating.
+"""
+import logging
+import os
+import re
+import sys
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from .models import QueryReport
+
+logger = logging.getLogger('geotech.queries')
+
+# Frames from these modules are never the "source" of a query
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIPPED_FILES = {os.path.join(_APP_DIR, name) for name in ('diagnostics.py', 'instrumentation.py')}
+SOURCE_DEPTH = 3
+MAX_SLOW_PER_REQUEST = 20
+
+_PARAM_RUN = re.compile(r'%s(?:, %s)+')
+_ROW_RUN = re.compile(r'(\(%s(?:, \.\.\.)?\))(?:, \1)+')
+_CONTROL = ('SAVEPOINT', 'RELEASE', 'ROLLBACK', 'BEGIN', 'COMMIT')
+
+
+def query_shape(sql):
+    """``sql`` with runs of placeholders (IN lists, multi-row VALUES) collapsed."""
+    return _ROW_RUN.sub(r'\1, ...', _PARAM_RUN.sub('%s, ...', sql))
+
+
+def query_source(depth=SOURCE_DEPTH):
+    """
+    The innermost ``depth`` geotech frames on the stack, innermost first,
+    as ``'storage.prefetch_samples:120 < serializers.Serializer.method:88'``.
+    """
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < depth:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and filename not in _SKIPPED_FILES:
+            module = os.path.splitext(os.path.relpath(filename, _APP_DIR))[0].replace(os.sep, '.')
+            frames.append(f'{module}.{frame.f_code.co_qualname}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ' < '.join(frames)
+
+
+def explain(sql, params):
+    """The database's plan for a SELECT, one line per plan row, or ''."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except DatabaseError as e:
+        return f'EXPLAIN failed: {e}'
+
+
+class QueryDiagnostics:
+    """Execute wrapper collecting slow and repeated queries for one request."""
+    def __init__(self, slow_ms, repeat_threshold):
+        self.slow_ms = slow_ms
+        self.repeat_threshold = repeat_threshold
+        self.shapes = {}
+        self.slow = []
+
+    @classmethod
+    def from_settings(cls):
+        """A collector if ``GEOTECH_QUERY_DIAGNOSTICS`` is on, else None."""
+        if not getattr(settings, 'GEOTECH_QUERY_DIAGNOSTICS', False):
+            return None
+        return cls(getattr(settings, 'GEOTECH_SLOW_QUERY_MS', 100),
+                   getattr(settings, 'GEOTECH_REPEATED_QUERY_THRESHOLD', 5))
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, params, many, (time.perf_counter() - started) * 1000, query_source())
+
+    def record(self, sql, params, many, duration_ms, source):
+        if sql.lstrip().upper().startswith(_CONTROL):
+            return
+        shape = query_shape(sql)
+        seen = self.shapes.setdefault(shape, {'count': 0, 'duration_ms': 0.0, 'source': source})
+        seen['count'] += 1
+        seen['duration_ms'] += duration_ms
+        if duration_ms >= self.slow_ms and not many and len(self.slow) < MAX_SLOW_PER_REQUEST:
+            self.slow.append((sql, params, duration_ms, source))
+
+    def reports(self, view, method, path):
+        """Unsaved QueryReport rows for what was collected; runs EXPLAIN for slow queries."""
+        found = [
+            QueryReport(kind='slow', view=view, method=method, path=path, source=source,
+                        sql=query_shape(sql), duration_ms=duration_ms, plan=explain(sql, params))
+            for sql, params, duration_ms, source in self.slow
+        ]
+        found += [
+            QueryReport(kind='repeated', view=view, method=method, path=path, source=seen['source'],
+                        sql=shape, count=seen['count'], duration_ms=seen['duration_ms'])
+            for shape, seen in self.shapes.items() if seen['count'] >= self.repeat_threshold
+        ]
+        return found
+
+    def report(self, view, method, path):
+        """Log and store the reports of one request."""
+        found = self.reports(view, method, path)
+        for item in found:
+            if item.kind == 'slow':
+                logger.warning('Slow query in %s (%.1f ms) from %s: %s\n%s',
+                               view, item.duration_ms, item.source, item.sql, item.plan)
+            else:
+                logger.warning('Query repeated %d times in %s (%.1f ms) from %s: %s',
+                               item.count, view, item.duration_ms, item.source, item.sql)
+        if found:
+            try:
+                QueryReport.objects.bulk_create(found)
+            except DatabaseError:
+                logger.exception('Could not store query reports for %s', view)
+        return found
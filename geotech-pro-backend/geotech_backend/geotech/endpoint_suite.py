@@ -0,0 +1,286 @@
+"""
+Endpoint benchmark and query-budget suite.
+
+Every route in urls.py gets at least one EndpointCase, driven through the
+full middleware and DRF stack against a synthetic dataset (see
+synthetic.py) of one of the ENDPOINT_TIERS. Each case is measured two
+ways, every run rolled back so writes can be repeated:
+
+* cold: caches cleared (payloads and token lookups), queries counted and
+  peak Python memory traced with tracemalloc;
+* warm: the median wall time of ``TIMED_RUNS`` untraced runs.
+
+``perf_baseline.json`` holds the query budget of every endpoint on every
+tier and the warm timings it was recorded with. Budgets are per tier
+because some counts legitimately follow the data (bulk inserts are split
+into parameter-limited batches, interpretation works per CPT test); a
+count that grows when it should not is exactly what they catch.
+``EndpointBudgetTest`` in tests.py enforces the small tier's budgets on
+every test run; with ``GEOTECH_BENCHMARK_TIERS=small,medium,large`` it
+runs those tiers instead and also fails on warm timings over
+``TIMING_TOLERANCE`` x the baseline. ``manage.py benchmark endpoints
+--baseline`` re-records it; review the diff like any other change.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import statistics
+import time
+import tracemalloc
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import Project, GeotechnicalModel, CptTest
+from .synthetic import DatasetSpec, delete_dataset, generate_dataset, layer_stack, synthetic_profile, username
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baseline.json')
+BENCHMARK_PASSWORD = 'benchmark-password'
+TIMED_RUNS = 3
+TIMING_TOLERANCE = 3.0
+
+ENDPOINT_TIERS = {
+    'small': DatasetSpec(users=1, projects=3, objects=1, models=2, layers=4, cpt_tests=2, samples=500,
+                         depth=20.0, storage=CptTest.STORAGE_ROWS, seed=0, prefix='endpoints-small'),
+    'medium': DatasetSpec(users=1, projects=25, objects=2, models=2, layers=8, cpt_tests=4, samples=2000,
+                          depth=30.0, storage=CptTest.STORAGE_ROWS, seed=0, prefix='endpoints-medium'),
+    'large': DatasetSpec(users=1, projects=100, objects=1, models=2, layers=12, cpt_tests=4, samples=10000,
+                         depth=40.0, storage=CptTest.STORAGE_ROWS, seed=0, prefix='endpoints-large'),
+}
+
+EndpointCase = namedtuple('EndpointCase', ['name', 'route', 'method', 'path', 'data', 'options', 'status'])
+Fixture = namedtuple('Fixture', ['spec', 'user', 'token', 'project', 'model', 'cpt_test'])
+
+
+def build_fixture(spec):
+    """Generate ``spec``'s dataset and pick the objects the cases address."""
+    generate_dataset(spec)
+    user = User.objects.get(username=username(spec, 0))
+    user.set_password(BENCHMARK_PASSWORD)
+    # Staff so the admin-only metrics endpoint is measured too
+    user.is_staff = True
+    user.save()
+    project = Project.objects.get(user=user, name='Project 1')
+    model = GeotechnicalModel.objects.filter(project=project).order_by('id').first()
+    return Fixture(spec, user, Token.objects.create(user=user), project, model,
+                   model.cpt_tests.order_by('id').first())
+
+
+def _sounding(spec, count, depth_from, depth_to):
+    """``count`` synthetic samples between two depths, as API dicts."""
+    rng = np.random.default_rng([spec.seed, count])
+    profile = synthetic_profile(rng, layer_stack(rng, spec.layers, depth_to), count, depth_to, 2.0)
+    profile = profile[profile[:, 0] > depth_from]
+    return [dict(zip(('depth', 'qc', 'fs', 'u2'), sample)) for sample in profile.tolist()]
+
+
+def _csv_upload(samples):
+    def upload():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['depth', 'qc', 'fs', 'u2'])
+        writer.writerows([sample['depth'], sample['qc'], sample['fs'], sample['u2']] for sample in samples)
+        return {'file': SimpleUploadedFile('sounding.csv', buffer.getvalue().encode())}
+    return upload
+
+
+def endpoint_cases(fixture):
+    """One case per route (several for routes with more than one method)."""
+    spec, model, cpt_test = fixture.spec, fixture.model, fixture.cpt_test
+    project_id = fixture.project.id
+    samples = f'/geotech/projects/{project_id}/cpt-tests/{cpt_test.id}/samples/'
+    layers = [
+        {**layer, 'name': f'{layer["name"]} (revised)'}
+        for layer in model.layers.values('id', 'name', 'depth', 'unit_weight', 'cohesion', 'friction_angle',
+                                         'compressibility', 'permeability')
+    ]
+    cpt_tests = [{'id': test.id, 'name': test.name} for test in model.cpt_tests.order_by('id')]
+    cpt_tests[0]['data'] = _sounding(spec, spec.samples, 0.0, spec.depth)
+    json_ = {'format': 'json'}
+    return [
+        EndpointCase('csrf', 'csrf', 'get', '/geotech/csrf/', None, {}, 200),
+        EndpointCase('login', 'login', 'post', '/geotech/login/',
+                     {'username': fixture.user.username, 'password': BENCHMARK_PASSWORD}, json_, 200),
+        EndpointCase('register', 'register', 'post', '/geotech/register/',
+                     {'email': 'new-user@example.com', 'password': BENCHMARK_PASSWORD, 'fullName': 'New User'},
+                     json_, 201),
+        EndpointCase('metrics', 'metrics', 'get', '/geotech/metrics/', None, {}, 200),
+        EndpointCase('project_list', 'project_list', 'get', '/geotech/projects/', None, {}, 200),
+        EndpointCase('project_list_page', 'project_list', 'get', '/geotech/projects/', {'limit': 20}, {}, 200),
+        EndpointCase('project_create', 'project_list', 'post', '/geotech/projects/',
+                     {'name': 'New project', 'description': 'Created by the endpoint suite'}, json_, 201),
+        EndpointCase('project_detail', 'project_detail', 'get', f'/geotech/projects/{project_id}/', None, {}, 200),
+        EndpointCase('project_update', 'project_detail', 'put', f'/geotech/projects/{project_id}/',
+                     {'description': 'Revised'}, json_, 200),
+        EndpointCase('project_delete', 'project_detail', 'delete', f'/geotech/projects/{project_id}/',
+                     None, {}, 204),
+        EndpointCase('project_stats', 'project_stats', 'get', f'/geotech/projects/{project_id}/stats/',
+                     None, {}, 200),
+        EndpointCase('stats', 'stats', 'get', '/geotech/stats/', None, {}, 200),
+        EndpointCase('get_layers', 'get_layers', 'get', f'/geotech/get_layers/{model.id}/', None, {}, 200),
+        EndpointCase('get_layers_columnar', 'get_layers', 'get', f'/geotech/get_layers/{model.id}/',
+                     {'format': 'columnar'}, {}, 200),
+        EndpointCase('model_detail', 'model_detail', 'post', f'/geotech/model_detail/{model.id}/',
+                     {'name': model.name, 'project': project_id, 'npv': model.npv + 0.5, 'npv_max': model.npv_max},
+                     json_, 200),
+        EndpointCase('save_layers', 'save_layers', 'post', f'/geotech/save_layers/{model.id}/',
+                     {'layers': layers}, json_, 200),
+        EndpointCase('save_cpt', 'save_cpt', 'post', f'/geotech/save_cpt/{model.id}/',
+                     {'cpt_tests': cpt_tests}, json_, 200),
+        EndpointCase('cpt_import', 'cpt_import', 'post', f'/geotech/projects/{project_id}/cpt-tests/{cpt_test.id}/import/',
+                     _csv_upload(_sounding(spec, spec.samples, 0.0, spec.depth)), {'format': 'multipart'}, 200),
+        EndpointCase('cpt_samples', 'cpt_samples', 'get', samples, {'max_points': 500}, {}, 200),
+        EndpointCase('cpt_samples_append', 'cpt_samples', 'post', samples,
+                     {'data': _sounding(spec, 400, spec.depth, spec.depth + 2.0)}, json_, 200),
+        EndpointCase('cpt_samples_replace', 'cpt_samples', 'put', samples,
+                     {'depth_from': 5.0, 'depth_to': 6.0, 'data': _sounding(spec, 400, 5.0, 6.0)[:-1]}, json_, 200),
+        EndpointCase('cpt_export', 'cpt_export', 'get',
+                     f'/geotech/projects/{project_id}/cpt-tests/{cpt_test.id}/export/', None, {}, 200),
+        EndpointCase('export_layers', 'export_layers', 'get', f'/geotech/export_layers/{model.id}/', None, {}, 200),
+        EndpointCase('export_model', 'export_model', 'get', f'/geotech/export_model/{model.id}/', None, {}, 200),
+        EndpointCase('cpt_interpretation', 'cpt_interpretation', 'get',
+                     f'/geotech/cpt_interpretation/{model.id}/', None, {}, 200),
+        EndpointCase('bearing_capacity', 'bearing_capacity', 'post', f'/geotech/bearing_capacity/{model.id}/',
+                     {'widths': {'start': 0.5, 'stop': 5.0, 'count': 10},
+                      'depths': {'start': 0.0, 'stop': 3.0, 'count': 10},
+                      'inclinations': [0, 5, 10, 15, 20], 'footing': 'square'}, json_, 200),
+        EndpointCase('stress_profile', 'stress_profile', 'post', f'/geotech/stress_profile/{model.id}/',
+                     {'depths': {'start': 0.0, 'stop': spec.depth, 'count': 10_000}}, json_, 200),
+        EndpointCase('consolidation', 'consolidation', 'post', f'/geotech/consolidation/{model.id}/',
+                     {'load_cases': [{'history': [[0, 0], [30, 20 * i]]} for i in range(1, 11)]}, json_, 200),
+        EndpointCase('slope_stability', 'slope_stability', 'post', f'/geotech/slope_stability/{model.id}/',
+                     {'height': 8.0, 'angle': 30.0, 'grid': [12, 12, 8], 'refinements': 1}, json_, 200),
+        EndpointCase('liquefaction', 'liquefaction', 'post', f'/geotech/projects/{project_id}/liquefaction/',
+                     {'pga': [0.1, 0.2, 0.3], 'magnitude': [6.5, 7.5]}, json_, 200),
+    ]
+
+
+@contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def quiet_request_log():
+    request_log = logging.getLogger('geotech.requests')
+    disabled, request_log.disabled = request_log.disabled, True
+    try:
+        yield
+    finally:
+        request_log.disabled = disabled
+
+
+def clear_caches():
+    for alias in {*getattr(settings, 'GEOTECH_MODEL_CACHES', ['default']), getattr(settings, 'GEOTECH_AUTH_CACHE', 'default')}:
+        caches[alias].clear()
+
+
+def send(client, case):
+    """Issue ``case`` and read the whole body, streamed or not."""
+    data = case.data() if callable(case.data) else case.data
+    response = getattr(client, case.method)(case.path, data, **case.options)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def _recorder(queries):
+    # Independent of DEBUG and of the bounded connection.queries log
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+    return record
+
+
+def measure(client, case, timed_runs=TIMED_RUNS):
+    clear_caches()
+    queries = []
+    tracemalloc.start()
+    try:
+        with rolled_back(), connection.execute_wrapper(_recorder(queries)):
+            response = send(client, case)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    durations = []
+    for _ in range(timed_runs):
+        with rolled_back():
+            started = time.perf_counter()
+            send(client, case)
+            durations.append(time.perf_counter() - started)
+    return {
+        'endpoint': case.name,
+        'status': response.status_code,
+        'queries': len(queries),
+        'ms': statistics.median(durations) * 1000 if durations else None,
+        'peak_kb': peak / 1024,
+        'sql': queries,
+    }
+
+
+def run_endpoint_suite(fixture, timed_runs=TIMED_RUNS):
+    # A host ALLOWED_HOSTS accepts outside the test runner too
+    client = APIClient(SERVER_NAME='localhost')
+    client.credentials(HTTP_AUTHORIZATION=f'Token {fixture.token.key}')
+    with quiet_request_log():
+        return [measure(client, case, timed_runs) for case in endpoint_cases(fixture)]
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_baseline(results_by_tier, path=BASELINE_PATH):
+    """Record measured counts as budgets and warm timings, per tier."""
+    baseline = {
+        'budgets': {
+            tier: {result['endpoint']: result['queries'] for result in results}
+            for tier, results in results_by_tier.items()
+        },
+        'timings_ms': {
+            tier: {result['endpoint']: round(result['ms'], 2) for result in results}
+            for tier, results in results_by_tier.items()
+        },
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return baseline
+
+
+def bench_endpoints(tiers=('small', 'medium'), baseline=False, **options):
+    """
+    Wall time, query count and peak memory of every endpoint per tier. The
+    datasets are generated under fresh prefixes and deleted afterwards.
+    With ``baseline=True`` the results are written to perf_baseline.json.
+    """
+    results_by_tier = {}
+    rows = []
+    for tier in tiers:
+        spec = ENDPOINT_TIERS[tier]._replace(prefix=f'endpoints-{uuid.uuid4().hex[:8]}')
+        try:
+            results_by_tier[tier] = run_endpoint_suite(build_fixture(spec))
+        finally:
+            delete_dataset(spec.prefix)
+        rows += [
+            {'tier': tier, **{key: value for key, value in result.items() if key != 'sql'}}
+            for result in results_by_tier[tier]
+        ]
+    if baseline:
+        write_baseline(results_by_tier)
+    return rows
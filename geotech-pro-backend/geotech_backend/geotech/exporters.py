@@ -0,0 +1,198 @@
+"""
+Streaming exports of CPT tests, layer tables and whole geotechnical models.
+
+Every exporter is a generator: samples are pulled from the database with
+``iterator(chunk_size=...)`` (a server-side cursor where the backend has
+one) and encoded one chunk at a time, so memory stays flat and the first
+bytes go out before the last row is read.
+
+Formats:
+
+``csv``
+    One table per export. Model exports are sectioned: a ``# layers`` table,
+    a blank line, then a ``# cpt_data`` table with a ``cpt_test_id`` column.
+``jsonl``
+    One JSON object per line. Model exports tag each line with ``type``
+    (``model``, ``layer``, ``cpt_test`` or ``sample``).
+``bin``
+    Little-endian framed binary. The stream starts with ``b'GTPB'`` and a
+    uint8 version, followed by sections, each introduced by a one-byte tag:
+
+    * ``L`` layers, as frames of ``uint32 n`` then ``n`` records of
+      ``6 x float64`` (depth, unit_weight, cohesion, friction_angle,
+      compressibility, permeability or NaN), ``uint16`` name length and
+      UTF-8 name;
+    * ``C`` a CPT test: ``int64`` id, ``uint16`` name length, UTF-8 name,
+      then frames of ``uint32 n`` and ``n x 4 float64`` interleaved
+      depth, qc, fs, u2;
+    * ``E`` end of stream.
+
+    Every framed section ends with an empty frame (``n == 0``).
+"""
+import csv
+import io
+import json
+import struct
+
+import numpy as np
+
+from .ingest import CPT_CHANNELS
+from .models import CptTest, CptData
+from .storage import read_channels
+
+EXPORT_CHUNK_SIZE = 2000
+
+BINARY_MAGIC = b'GTPB'
+BINARY_VERSION = 1
+
+LAYER_FIELDS = ['id', 'name', 'depth', 'unit_weight', 'cohesion', 'friction_angle',
+                'compressibility', 'permeability', 'cpt_data']
+LAYER_NUMERIC_FIELDS = ['depth', 'unit_weight', 'cohesion', 'friction_angle',
+                        'compressibility', 'permeability']
+
+
+def iter_sample_chunks(cpt_test, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of ``(depth, qc, fs, u2)`` tuples for a sounding in either storage mode."""
+    if cpt_test.storage == CptTest.STORAGE_PACKED:
+        channels = read_channels(cpt_test)
+        count = len(channels['depth'])
+        for start in range(0, count, chunk_size):
+            columns = [channels[channel][start:start + chunk_size].tolist() for channel in CPT_CHANNELS]
+            yield list(zip(*columns))
+        return
+
+    rows = (CptData.objects.filter(cpt_test=cpt_test)
+            .order_by('depth', 'id')
+            .values_list(*CPT_CHANNELS)
+            .iterator(chunk_size=chunk_size))
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_layers(model):
+    return model.layers.order_by('position', 'id').values_list(*LAYER_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _csv_rows(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
+
+
+def _json_line(record):
+    return json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def _binary_name(name):
+    encoded = name.encode('utf-8')[:0xFFFF]
+    return struct.pack('<H', len(encoded)) + encoded
+
+
+def _binary_samples(chunks):
+    for chunk in chunks:
+        yield struct.pack('<I', len(chunk)) + np.asarray(chunk, dtype='<f8').tobytes()
+    yield struct.pack('<I', 0)
+
+
+# CPT tests
+
+def cpt_test_csv(cpt_test):
+    yield _csv_rows([CPT_CHANNELS])
+    for chunk in iter_sample_chunks(cpt_test):
+        yield _csv_rows(chunk)
+
+
+def cpt_test_jsonl(cpt_test):
+    for chunk in iter_sample_chunks(cpt_test):
+        yield ''.join(_json_line(dict(zip(CPT_CHANNELS, row))) for row in chunk)
+
+
+def _cpt_test_binary_section(cpt_test):
+    yield b'C' + struct.pack('<q', cpt_test.id) + _binary_name(cpt_test.name)
+    yield from _binary_samples(iter_sample_chunks(cpt_test))
+
+
+def cpt_test_binary(cpt_test):
+    yield BINARY_MAGIC + struct.pack('<B', BINARY_VERSION)
+    yield from _cpt_test_binary_section(cpt_test)
+    yield b'E'
+
+
+# Layer tables
+
+def layers_csv(model):
+    yield _csv_rows([LAYER_FIELDS])
+    yield _csv_rows(_iter_layers(model))
+
+
+def layers_jsonl(model, tagged=False):
+    for row in _iter_layers(model):
+        record = dict(zip(LAYER_FIELDS, row))
+        if tagged:
+            record = {'type': 'layer', **record}
+        yield _json_line(record)
+
+
+def _layers_binary_section(model):
+    yield b'L'
+    records = []
+    for row in _iter_layers(model):
+        values = dict(zip(LAYER_FIELDS, row))
+        numbers = [np.nan if values[field] is None else values[field] for field in LAYER_NUMERIC_FIELDS]
+        records.append(struct.pack('<6d', *numbers) + _binary_name(values['name'] or ''))
+    if records:
+        yield struct.pack('<I', len(records)) + b''.join(records)
+    yield struct.pack('<I', 0)
+
+
+def layers_binary(model):
+    yield BINARY_MAGIC + struct.pack('<B', BINARY_VERSION)
+    yield from _layers_binary_section(model)
+    yield b'E'
+
+
+# Whole models
+
+def model_csv(model):
+    yield '# layers\n'
+    yield from layers_csv(model)
+    yield '\n# cpt_data\n'
+    yield _csv_rows([('cpt_test_id', 'cpt_test') + CPT_CHANNELS])
+    for cpt_test in model.cpt_tests.order_by('id'):
+        prefix = (cpt_test.id, cpt_test.name)
+        for chunk in iter_sample_chunks(cpt_test):
+            yield _csv_rows(prefix + row for row in chunk)
+
+
+def model_jsonl(model):
+    yield _json_line({'type': 'model', 'id': model.id, 'name': model.name,
+                      'npv': model.npv, 'npv_max': model.npv_max})
+    yield from layers_jsonl(model, tagged=True)
+    for cpt_test in model.cpt_tests.order_by('id'):
+        yield _json_line({'type': 'cpt_test', 'id': cpt_test.id, 'name': cpt_test.name})
+        for chunk in iter_sample_chunks(cpt_test):
+            yield ''.join(
+                _json_line({'type': 'sample', 'cpt_test': cpt_test.id, **dict(zip(CPT_CHANNELS, row))})
+                for row in chunk
+            )
+
+
+def model_binary(model):
+    yield BINARY_MAGIC + struct.pack('<B', BINARY_VERSION)
+    yield from _layers_binary_section(model)
+    for cpt_test in model.cpt_tests.order_by('id'):
+        yield from _cpt_test_binary_section(cpt_test)
+    yield b'E'
+
+
+EXPORTERS = {
+    'cpt_test': {'csv': cpt_test_csv, 'jsonl': cpt_test_jsonl, 'bin': cpt_test_binary},
+    'layers': {'csv': layers_csv, 'jsonl': layers_jsonl, 'bin': layers_binary},
+    'model': {'csv': model_csv, 'jsonl': model_jsonl, 'bin': model_binary},
+}
@@ -0,0 +1,191 @@
+"""
+Streaming CPT file import.
+
+Uploaded CSV and XLSX logger files are read one row at a time and written to
+the database in fixed-size batches, so memory use depends on the batch size
+and not on the file size. Django already spools large uploads to a temporary
+file, so nothing here ever holds the whole file in RAM.
+
+Packed soundings are the exception: each channel is a single BLOB, so their
+samples are buffered (32 bytes a sample) until the end of the file. Packed
+imports are therefore capped at MAX_PACKED_IMPORT_SAMPLES; larger files
+belong in row storage.
+"""
+import csv
+import io
+import math
+from array import array
+
+import numpy as np
+
+from .ingest import CPT_CHANNELS, bulk_create_samples, chunked
+from .models import CptTest, PackedSounding
+from .decimation import build_pyramid
+from .storage import (NUMPY_DTYPES, clear_samples, ensure_samples_digest, samples_hasher,
+                      update_samples_digest, set_samples_digest)
+
+IMPORT_BATCH_SIZE = 5000
+# 64 MB of float64 buffers
+MAX_PACKED_IMPORT_SAMPLES = 2_000_000
+
+CSV_DELIMITERS = ',;\t'
+
+
+class CptImportError(ValueError):
+    """A problem with the uploaded file; ``line`` is 1-based when known."""
+    def __init__(self, message, line=None):
+        self.line = line
+        super().__init__(f'Line {line}: {message}' if line else message)
+
+
+def _column_map(header):
+    names = [str(name).strip().lower() if name is not None else '' for name in header]
+    missing = [channel for channel in CPT_CHANNELS if channel not in names]
+    if missing:
+        raise CptImportError(f'Missing columns: {", ".join(missing)}', line=1)
+    return [names.index(channel) for channel in CPT_CHANNELS]
+
+
+def _to_float(value, decimal_comma):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    value = str(value).strip()
+    if decimal_comma:
+        value = value.replace(',', '.')
+    return float(value)
+
+
+def parse_rows(rows, decimal_comma=False):
+    """
+    Turn an iterator of raw rows (header first) into ``(depth, qc, fs, u2)``
+    tuples. Blank rows are skipped; anything non-numeric raises
+    ``CptImportError`` with its line number.
+    """
+    rows = iter(rows)
+    try:
+        columns = _column_map(next(rows))
+    except StopIteration:
+        raise CptImportError('The file is empty.')
+
+    for line, row in enumerate(rows, start=2):
+        if not row or all(value is None or str(value).strip() == '' for value in row):
+            continue
+        try:
+            sample = tuple(_to_float(row[i], decimal_comma) for i in columns)
+        except IndexError:
+            raise CptImportError('Not enough columns.', line=line)
+        except (TypeError, ValueError):
+            raise CptImportError('Values must be numbers.', line=line)
+        if not all(math.isfinite(value) for value in sample):
+            raise CptImportError('Values must be finite numbers.', line=line)
+        yield sample
+
+
+def iter_csv_samples(binary_file):
+    """
+    Samples from a CSV upload. Handles ``,``, ``;`` and tab delimiters and a
+    UTF-8 BOM; files that are not UTF-8 or not valid CSV raise CptImportError.
+    """
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    reader = None
+    try:
+        first_line = text.readline()
+        delimiter = max(CSV_DELIMITERS, key=first_line.count)
+        # Loggers writing ';' as the field separator use ',' as the decimal mark
+        decimal_comma = delimiter == ';'
+        reader = csv.reader(text, delimiter=delimiter)
+        header = next(csv.reader([first_line], delimiter=delimiter), [])
+        yield from parse_rows(_prepend(header, reader), decimal_comma=decimal_comma)
+    except UnicodeDecodeError:
+        raise CptImportError('The file must be UTF-8 encoded text.')
+    except csv.Error as e:
+        raise CptImportError(f'Malformed CSV: {e}', line=reader.line_num + 1 if reader else 1)
+    finally:
+        text.detach()
+
+
+def iter_xlsx_samples(binary_file):
+    """Samples from the first worksheet of an XLSX upload, read with openpyxl's streaming reader."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise CptImportError('XLSX import requires the openpyxl package.')
+    try:
+        workbook = load_workbook(binary_file, read_only=True, data_only=True)
+    except Exception as e:
+        raise CptImportError(f'Could not read XLSX file: {e}')
+    try:
+        yield from parse_rows(workbook.worksheets[0].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+def iter_upload_samples(upload):
+    """Pick the reader for an ``UploadedFile`` from its name."""
+    if upload.name.lower().endswith(('.xlsx', '.xlsm')):
+        return iter_xlsx_samples(upload)
+    return iter_csv_samples(upload)
+
+
+def import_samples(cpt_test, samples, batch_size=IMPORT_BATCH_SIZE, dtype='f8',
+                   max_packed_samples=MAX_PACKED_IMPORT_SAMPLES):
+    """
+    Replace a CptTest's samples with ``samples`` (any iterable), consuming it
+    ``batch_size`` rows at a time. Row-backed tests get one bulk insert per
+    batch; packed tests accumulate into flat float buffers that are sorted by
+    depth and packed once at the end, along with their decimation pyramid,
+    and refuse files of more than ``max_packed_samples`` samples; row-backed
+    tests build theirs on the first level-of-detail read. Row-backed files
+    in depth order are hashed as they stream; others are hashed from a
+    depth-ordered read once written. Callers hold the transaction. Returns
+    the row count.
+    """
+    clear_samples(cpt_test)
+    hasher = samples_hasher(cpt_test, dtype)
+    if cpt_test.storage != CptTest.STORAGE_PACKED:
+        count, bottom, ordered = 0, -math.inf, True
+        for batch in chunked(samples, batch_size):
+            depths = np.array([sample[0] for sample in batch])
+            ordered = ordered and depths[0] >= bottom and bool(np.all(np.diff(depths) >= 0))
+            bottom = depths[-1]
+            if ordered:
+                update_samples_digest(hasher, batch)
+            count += bulk_create_samples(cpt_test, batch)
+        if ordered:
+            set_samples_digest(cpt_test, hasher)
+        else:
+            cpt_test.samples_digest = ''
+            ensure_samples_digest(cpt_test)
+        return count
+
+    buffers = [array('d') for _ in CPT_CHANNELS]
+    for batch in chunked(samples, batch_size):
+        if len(buffers[0]) + len(batch) > max_packed_samples:
+            raise CptImportError(f'Packed soundings can import at most {max_packed_samples:,} samples; '
+                                 'use row storage for larger files.')
+        for buffer, column in zip(buffers, zip(*batch)):
+            buffer.extend(column)
+    count = len(buffers[0])
+    channels = {channel: np.frombuffer(buffer, dtype=np.float64) for channel, buffer in zip(CPT_CHANNELS, buffers)}
+    # Ordered on the stored depths, as pack_samples and update_samples_digest order them
+    order = np.argsort(channels['depth'].astype(NUMPY_DTYPES[dtype]), kind='stable')
+    channels = {channel: values[order] for channel, values in channels.items()}
+    update_samples_digest(hasher, np.column_stack([channels[channel] for channel in CPT_CHANNELS]), dtype)
+    set_samples_digest(cpt_test, hasher)
+    build_pyramid(cpt_test, channels)
+    channels = {channel: values.astype(NUMPY_DTYPES[dtype]) for channel, values in channels.items()}
+    PackedSounding.objects.update_or_create(
+        cpt_test=cpt_test,
+        defaults={
+            'dtype': dtype,
+            'sample_count': count,
+            'max_depth': float(channels['depth'][-1]) if count else None,
+            **{channel: values.tobytes() for channel, values in channels.items()},
+        },
+    )
+    return count
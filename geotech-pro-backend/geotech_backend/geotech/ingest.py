@@ -0,0 +1,84 @@
+"""
+Bulk write helpers for CPT soundings.
+
+A sounding is thousands of ``CptData`` rows, so everything here works on
+whole sample lists: validation is one pass over plain tuples and inserts go
+through chunked ``bulk_create`` instead of one ``INSERT`` per sample.
+"""
+import math
+from itertools import islice
+
+from rest_framework import serializers
+
+from .models import CptData
+
+CPT_CHANNELS = ('depth', 'qc', 'fs', 'u2')
+
+# Rows handed to bulk_create per call. Django splits each call further to
+# respect the backend's query parameter limit; this only bounds how many
+# unsaved model instances are alive at once.
+INSERT_CHUNK_SIZE = 5000
+
+
+def parse_samples(raw):
+    """
+    Validate a list of ``{'depth', 'qc', 'fs', 'u2'}`` dicts in one pass.
+
+    Returns a list of ``(depth, qc, fs, u2)`` float tuples. Missing channels
+    default to 0 like the model fields; ``id`` keys sent back by the client
+    are ignored. Raises ``ValidationError`` keyed by sample index.
+    """
+    if not isinstance(raw, (list, tuple)):
+        raise serializers.ValidationError('Expected a list of CPT samples.')
+
+    samples = []
+    errors = {}
+    for index, item in enumerate(raw):
+        if not isinstance(item, dict):
+            errors[index] = ['Expected an object with depth, qc, fs and u2.']
+            continue
+        row = []
+        for channel in CPT_CHANNELS:
+            value = item.get(channel, 0)
+            try:
+                if isinstance(value, bool):
+                    raise TypeError
+                value = float(value)
+            except (TypeError, ValueError):
+                errors.setdefault(index, []).append(f'"{channel}" must be a number.')
+                continue
+            if not math.isfinite(value):
+                errors.setdefault(index, []).append(f'"{channel}" must be a finite number.')
+                continue
+            row.append(value)
+        if index not in errors:
+            samples.append(tuple(row))
+
+    if errors:
+        raise serializers.ValidationError(errors)
+    return samples
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_create_samples(cpt_test, samples, chunk_size=INSERT_CHUNK_SIZE):
+    """
+    Insert ``(depth, qc, fs, u2)`` tuples for ``cpt_test`` with chunked
+    ``bulk_create``. Callers are expected to hold a transaction so the whole
+    sounding is committed once. Returns the number of rows written.
+    """
+    written = 0
+    for chunk in chunked(samples, chunk_size):
+        CptData.objects.bulk_create(
+            [CptData(cpt_test=cpt_test, depth=d, qc=qc, fs=fs, u2=u2) for d, qc, fs, u2 in chunk],
+            batch_size=chunk_size,
+        )
+        written += len(chunk)
+    return written
@@ -0,0 +1,197 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware times every request and breaks it down into
+database time (every query, through ``connection.execute_wrapper``),
+serializer time and rendering time; the latter two are recorded by
+``timing()`` blocks in serializers.py and renderers.py. The breakdown is
+sent back as a ``Server-Timing`` header, logged as a structured record on
+the ``geotech.requests`` logger, and folded into per-view latency
+histograms that ``metrics_text()`` exposes in the Prometheus text format.
+
+Histograms live in process memory: with several worker processes each
+one reports its own, and Prometheus sums them per endpoint. Streaming
+responses are logged and observed once their last chunk is sent, queries
+issued while streaming included; their ``Server-Timing`` header leaves
+before the body and so covers the view alone.
+
+When ``GEOTECH_QUERY_DIAGNOSTICS`` is on the middleware also runs the
+slow/repeated query collector from diagnostics.py.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import connection
+
+from .diagnostics import QueryDiagnostics
+
+logger = logging.getLogger('geotech.requests')
+
+# Upper bounds in seconds, Prometheus' default buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('geotech_request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.durations = {}
+        self.queries = 0
+        self._active = set()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self, total):
+        parts = [f'db;dur={self.durations.get("db", 0.0) * 1000:.1f};desc="{self.queries} queries"']
+        parts += [f'{name};dur={self.durations[name] * 1000:.1f}'
+                  for name in ('serialize', 'render') if name in self.durations]
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+@contextmanager
+def timing(name):
+    """
+    Add the time spent in the block to the current request's ``name``
+    total. Nested blocks of the same name count once, so recursive
+    serializers are not double counted. A no-op outside a request.
+    """
+    timings = _current.get()
+    if timings is None or name in timings._active:
+        yield
+        return
+    timings._active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._active.discard(name)
+        timings.add(name, time.perf_counter() - started)
+
+
+def _time_query(execute, sql, params, many, context, timings=None):
+    timings = timings or _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.queries += 1
+            timings.add('db', time.perf_counter() - started)
+
+
+class LatencyHistograms:
+    """Cumulative latency histograms and query totals keyed by ``(view, method)``."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, view, method, seconds, queries):
+        with self._lock:
+            series = self._series.setdefault((view, method), {
+                'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0, 'queries': 0,
+            })
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['buckets'][i] += 1
+            series['count'] += 1
+            series['sum'] += seconds
+            series['queries'] += queries
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def text(self):
+        lines = [
+            '# HELP geotech_request_duration_seconds Request latency per view.',
+            '# TYPE geotech_request_duration_seconds histogram',
+        ]
+        query_lines = [
+            '# HELP geotech_db_queries_total Database queries issued per view.',
+            '# TYPE geotech_db_queries_total counter',
+        ]
+        with self._lock:
+            for (view, method), series in sorted(self._series.items()):
+                labels = f'view="{view}",method="{method}"'
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'geotech_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'geotech_request_duration_seconds_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f'geotech_request_duration_seconds_sum{{{labels}}} {series["sum"]:.6f}')
+                lines.append(f'geotech_request_duration_seconds_count{{{labels}}} {series["count"]}')
+                query_lines.append(f'geotech_db_queries_total{{{labels}}} {series["queries"]}')
+        return '\n'.join(lines + query_lines) + '\n'
+
+
+histograms = LatencyHistograms()
+
+
+def metrics_text():
+    return histograms.text()
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        diagnostics = QueryDiagnostics.from_settings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with self.query_wrappers(timings, diagnostics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        response['Server-Timing'] = timings.server_timing(time.perf_counter() - started)
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = self.stream(request, response, response.streaming_content, timings,
+                                                     diagnostics, started)
+        else:
+            self.record(request, response, timings, diagnostics, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def query_wrappers(timings, diagnostics):
+        wrappers = ExitStack()
+        wrappers.enter_context(connection.execute_wrapper(partial(_time_query, timings=timings)))
+        if diagnostics is not None:
+            wrappers.enter_context(connection.execute_wrapper(diagnostics))
+        return wrappers
+
+    def stream(self, request, response, content, timings, diagnostics, started):
+        """``content``, recorded once the last chunk is sent (or the client goes away)."""
+        try:
+            with self.query_wrappers(timings, diagnostics):
+                yield from content
+        finally:
+            self.record(request, response, timings, diagnostics, time.perf_counter() - started)
+
+    def record(self, request, response, timings, diagnostics, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unresolved'
+        histograms.observe(view, request.method, total, timings.queries)
+        logger.info(
+            '%s %s %s %.1fms (%d queries, %.1fms db)',
+            request.method, request.path, response.status_code, total * 1000,
+            timings.queries, timings.durations.get('db', 0.0) * 1000,
+            extra={'timings': {
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 3),
+                'db_queries': timings.queries,
+                **{f'{name}_ms': round(seconds * 1000, 3) for name, seconds in timings.durations.items()},
+            }},
+        )
+        if diagnostics is not None:
+            diagnostics.report(view, request.method, request.path)
@@ -0,0 +1,133 @@
+"""
+Vectorized CPT interpretation after Robertson (2009, 2010).
+
+Every function works on whole soundings as NumPy arrays; there is no
+per-sample Python loop. Input units follow the CPT tables in the frontend:
+depth in m, qc in MPa, fs and u2 in kPa. Derived stresses are in kPa.
+
+Samples where a normalized quantity is undefined (for instance qt below the
+total stress near the surface, or fs = 0) come out as NaN and their soil
+behaviour type zone as 0.
+"""
+import math
+
+import numpy as np
+
+from .stress import vertical_stresses
+
+# Bump when a formula changes so persisted derived series are recomputed
+INTERPRETATION_VERSION = 1
+
+ATMOSPHERIC_PRESSURE = 101.325
+DEFAULT_AREA_RATIO = 0.8
+
+STRESS_EXPONENT_TOLERANCE = 1e-3
+STRESS_EXPONENT_MAX_ITERATIONS = 50
+
+# Upper Ic bound of SBT zones 7 (gravelly sand) to 3 (clay); anything above
+# the last bound is zone 2 (organic soil). Zones 1, 8 and 9 are not
+# delineated by Ic alone and are not assigned.
+SBT_IC_BOUNDS = np.array([1.31, 2.05, 2.60, 2.95, 3.60])
+SBT_ZONES = np.array([7, 6, 5, 4, 3, 2])
+SBT_ZONE_NAMES = {
+    0: 'Undefined',
+    2: 'Organic soils - clay',
+    3: 'Clays - silty clay to clay',
+    4: 'Silt mixtures - clayey silt to silty clay',
+    5: 'Sand mixtures - silty sand to sandy silt',
+    6: 'Sands - clean sand to silty sand',
+    7: 'Gravelly sand to dense sand',
+}
+
+OUTPUT_FIELDS = ['depth', 'qt', 'Rf', 'sigma_v0', 'u0', 'sigma_v0_eff', 'Qt1', 'Fr', 'Bq',
+                 'n', 'Qtn', 'Ic', 'Isbt', 'sbt_zone', 'sbtn_zone']
+
+
+def behaviour_index(q, f):
+    """Ic-style index from a normalized resistance and friction ratio (both > 0)."""
+    return np.sqrt((3.47 - np.log10(q)) ** 2 + (np.log10(f) + 1.22) ** 2)
+
+
+def sbt_zone(index):
+    zones = SBT_ZONES[np.searchsorted(SBT_IC_BOUNDS, np.nan_to_num(index, nan=0.0), side='left')]
+    return np.where(np.isfinite(index), zones, 0)
+
+
+def interpret(depth, qc, fs, u2, sigma_v0, u0, area_ratio=DEFAULT_AREA_RATIO):
+    """
+    Interpret one sounding. Returns a dict of arrays keyed by OUTPUT_FIELDS.
+
+    The stress exponent ``n`` is solved per sample by fixed-point iteration,
+    n = 0.381 Ic + 0.05 (sigma'v0 / pa) - 0.15 capped at 1, starting from
+    n = 1. All samples iterate together; converged ones are masked out.
+    """
+    pa = ATMOSPHERIC_PRESSURE
+    depth = np.asarray(depth, dtype=np.float64)
+    qc = np.asarray(qc, dtype=np.float64)
+    fs = np.asarray(fs, dtype=np.float64)
+    u2 = np.asarray(u2, dtype=np.float64)
+    sigma_v0_eff = sigma_v0 - u0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        qt = qc * 1000.0 + u2 * (1.0 - area_ratio)
+        net = qt - sigma_v0
+        valid = (net > 0) & (sigma_v0_eff > 0) & (fs > 0) & (qt > 0)
+        net = np.where(valid, net, np.nan)
+        eff = np.where(valid, sigma_v0_eff, np.nan)
+
+        Rf = np.where(qt > 0, fs / qt * 100.0, np.nan)
+        Fr = fs / net * 100.0
+        Qt1 = net / eff
+        Bq = (u2 - u0) / net
+        Isbt = np.where((qt > 0) & (fs > 0), behaviour_index(qt / pa, Rf), np.nan)
+
+        n = np.where(valid, 1.0, np.nan)
+        Qtn = (net / pa) * (pa / eff) ** n
+        Ic = behaviour_index(Qtn, Fr)
+        active = valid.copy()
+        for _ in range(STRESS_EXPONENT_MAX_ITERATIONS):
+            if not active.any():
+                break
+            n_next = np.minimum(0.381 * Ic[active] + 0.05 * (eff[active] / pa) - 0.15, 1.0)
+            changed = np.abs(n_next - n[active]) > STRESS_EXPONENT_TOLERANCE
+            n[active] = n_next
+            Qtn[active] = (net[active] / pa) * (pa / eff[active]) ** n_next
+            Ic[active] = behaviour_index(Qtn[active], Fr[active])
+            active_index = np.flatnonzero(active)
+            active[active_index[~changed]] = False
+
+    return {
+        'depth': depth,
+        'qt': qt,
+        'Rf': Rf,
+        'sigma_v0': sigma_v0,
+        'u0': u0,
+        'sigma_v0_eff': sigma_v0_eff,
+        'Qt1': Qt1,
+        'Fr': Fr,
+        'Bq': Bq,
+        'n': n,
+        'Qtn': Qtn,
+        'Ic': Ic,
+        'Isbt': Isbt,
+        'sbt_zone': sbt_zone(Isbt),
+        'sbtn_zone': sbt_zone(Ic),
+    }
+
+
+def interpret_channels(channels, bottoms, unit_weights, water_depth, area_ratio=DEFAULT_AREA_RATIO):
+    sigma_v0, u0, _ = vertical_stresses(channels['depth'], bottoms, unit_weights, water_depth)
+    return interpret(channels['depth'], channels['qc'], channels['fs'], channels['u2'],
+                     sigma_v0, u0, area_ratio=area_ratio)
+
+
+def to_json_columns(result):
+    """Columnar JSON-ready lists; NaN and infinities become None."""
+    columns = {}
+    for field in OUTPUT_FIELDS:
+        values = result[field]
+        if values.dtype.kind == 'f':
+            columns[field] = [v if math.isfinite(v) else None for v in values.tolist()]
+        else:
+            columns[field] = values.tolist()
+    return columns
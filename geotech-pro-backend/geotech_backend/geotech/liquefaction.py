@@ -0,0 +1,209 @@
+"""
+CPT-based liquefaction triggering, LPI and LSN.
+
+Works on interpreted soundings (interpretation.interpret: qt, stresses,
+Qtn, Ic) against a matrix of seismic scenarios, peak ground acceleration
+(g) x earthquake magnitude. Every formula is evaluated on ``(scenarios,
+samples)`` arrays, and the samples of all soundings are concatenated so a
+whole project is one pass; the per-sounding indexes are sums over each
+sounding's slice of the result.
+
+Two triggering methods:
+
+- ``robertson``: Robertson & Wride (1998) as updated by Robertson (2009).
+  Qtn,cs = Kc Qtn, the NCEER (Youd et al. 2001) depth reduction rd and
+  magnitude scaling 10^2.24 / M^2.56, no overburden correction.
+- ``boulanger_idriss``: Boulanger & Idriss (2014). qc1Ncs with the fines
+  content estimated from Ic (CFC = 0), their rd(z, M), MSF(M, qc1Ncs)
+  and K_sigma.
+
+Samples above the water table, with Ic > 2.6 (clay-like, not
+susceptible) or with a clean-sand resistance beyond the method's range are
+non-liquefiable and report MAX_FACTOR_OF_SAFETY; samples the
+interpretation could not normalize report NaN and count as
+non-liquefiable in the indexes.
+
+LPI (Iwasaki et al. 1978) integrates (1 - FS) with the weight 10 - 0.5 z
+over the top 20 m. LSN (van Ballegooy et al. 2014) integrates 1000 ev / z
+over the same depth, with the post-liquefaction volumetric strain ev of
+Zhang et al. (2002) interpolated between its FS curves.
+"""
+import numpy as np
+
+from .interpretation import ATMOSPHERIC_PRESSURE
+
+METHODS = ('robertson', 'boulanger_idriss')
+MAX_FACTOR_OF_SAFETY = 2.0
+IC_CUTOFF = 2.6
+INDEX_DEPTH = 20.0
+MAX_SCENARIOS = 400
+
+QC1NCS_TOLERANCE = 1e-3
+QC1NCS_MAX_ITERATIONS = 50
+
+# Zhang et al. (2002): volumetric strain (%) curves for these factors of safety
+STRAIN_FACTORS_OF_SAFETY = np.array([0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 2.0])
+
+
+def nceer_depth_reduction(depth):
+    """rd of Liao & Whitman (1986) as adopted by Youd et al. (2001)."""
+    return np.select(
+        [depth <= 9.15, depth <= 23.0, depth <= 30.0],
+        [1.0 - 0.00765 * depth, 1.174 - 0.0267 * depth, 0.744 - 0.008 * depth],
+        0.5,
+    )
+
+
+def robertson_resistance(result):
+    """``(CRR at M 7.5, Qtn,cs, K_sigma)`` after Robertson (2009)."""
+    ic, qtn = result['Ic'], result['Qtn']
+    kc = np.where(ic <= 1.64, 1.0, -0.403 * ic ** 4 + 5.581 * ic ** 3 - 21.63 * ic ** 2 + 33.75 * ic - 17.88)
+    qtn_cs = kc * qtn
+    crr = np.where(qtn_cs < 50, 0.833 * qtn_cs / 1000 + 0.05, 93 * (qtn_cs / 1000) ** 3 + 0.08)
+    crr = np.where(qtn_cs < 160, crr, np.inf)
+    return crr, qtn_cs, np.ones_like(crr)
+
+
+def boulanger_idriss_resistance(result):
+    """
+    ``(CRR at M 7.5 and 1 atm, qc1Ncs, K_sigma)`` after Boulanger & Idriss
+    (2014). The overburden exponent depends on qc1Ncs, so qc1Ncs is solved
+    per sample by fixed-point iteration, all samples together.
+    """
+    pa = ATMOSPHERIC_PRESSURE
+    qt, eff = result['qt'] / pa, result['sigma_v0_eff'] / pa
+    fines = np.clip(80.0 * result['Ic'] - 137.0, 0.0, 100.0)
+    fines_term = np.exp(1.63 - 9.7 / (fines + 2) - (15.7 / (fines + 2)) ** 2)
+
+    def clean_sand(exponent):
+        qc1n = np.minimum(np.minimum(eff ** -exponent, 1.7) * qt, 254.0)
+        return qc1n + (11.9 + qc1n / 14.6) * fines_term
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        qc1ncs = clean_sand(0.5)
+        # Converged samples stop iterating, so a sample's result does not depend on the batch
+        active = np.isfinite(qc1ncs)
+        for _ in range(QC1NCS_MAX_ITERATIONS):
+            if not active.any():
+                break
+            updated = clean_sand(1.338 - 0.249 * np.clip(qc1ncs, 21.0, 254.0) ** 0.264)
+            change = np.abs(updated - qc1ncs)
+            qc1ncs = np.where(active, updated, qc1ncs)
+            active &= change >= QC1NCS_TOLERANCE
+        q = np.minimum(qc1ncs, 211.0)
+        crr = np.exp(q / 113 + (q / 1000) ** 2 - (q / 140) ** 3 + (q / 137) ** 4 - 2.80)
+        c_sigma = np.minimum(1 / (37.3 - 8.27 * q ** 0.264), 0.3)
+        k_sigma = np.minimum(1 - c_sigma * np.log(eff), 1.1)
+    return crr, qc1ncs, k_sigma
+
+
+def factors_of_safety(result, water_depth, pga, magnitude, method='robertson'):
+    """
+    ``(FS, qc1Ncs)``: the factor of safety against triggering as a
+    ``(scenarios, samples)`` array for scenario vectors ``pga`` (g) and
+    ``magnitude``, and the clean-sand resistance used for the strains.
+    """
+    depth, sigma_v0, eff = result['depth'], result['sigma_v0'], result['sigma_v0_eff']
+    pga = np.asarray(pga, dtype=np.float64)[:, None]
+    magnitude = np.asarray(magnitude, dtype=np.float64)[:, None]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if method == 'robertson':
+            crr, qc1ncs, k_sigma = robertson_resistance(result)
+            rd = nceer_depth_reduction(depth)
+            msf = 10 ** 2.24 / magnitude ** 2.56
+        else:
+            crr, qc1ncs, k_sigma = boulanger_idriss_resistance(result)
+            alpha = -1.012 - 1.126 * np.sin(depth / 11.73 + 5.133)
+            beta = 0.106 + 0.118 * np.sin(depth / 11.28 + 5.142)
+            rd = np.exp(alpha + beta * magnitude)
+            msf_max = np.minimum(1.09 + (qc1ncs / 180) ** 3, 2.2)
+            msf = 1 + (msf_max - 1) * (8.64 * np.exp(-magnitude / 4) - 1.325)
+
+        csr = 0.65 * pga * sigma_v0 / eff * rd
+        fs = np.minimum(crr * msf * k_sigma / csr, MAX_FACTOR_OF_SAFETY)
+    non_liquefiable = (depth < water_depth) | (result['Ic'] > IC_CUTOFF)
+    fs = np.where(non_liquefiable & np.isfinite(result['Ic']), MAX_FACTOR_OF_SAFETY, fs)
+    return np.where(np.isfinite(result['Ic']), fs, np.nan), qc1ncs
+
+
+def volumetric_strain(fs, qc1ncs):
+    """
+    Post-liquefaction volumetric strain (%) of Zhang et al. (2002), linear
+    in FS between the published curves and zero from FS = 2.
+    """
+    q = np.clip(np.nan_to_num(qc1ncs, nan=200.0), 33.0, 200.0)
+    base = 102 * q ** -0.82
+    curves = np.array([
+        base,
+        np.where(q < 147, base, 2411 * q ** -1.45),
+        np.where(q < 110, base, 1701 * q ** -1.42),
+        np.where(q < 80, base, 1690 * q ** -1.46),
+        np.where(q < 60, base, 1430 * q ** -1.48),
+        64 * q ** -0.93,
+        11 * q ** -0.65,
+        9.7 * q ** -0.69,
+        7.6 * q ** -0.71,
+        np.zeros_like(q),
+    ])
+    fs = np.clip(np.nan_to_num(fs, nan=MAX_FACTOR_OF_SAFETY), STRAIN_FACTORS_OF_SAFETY[0],
+                 STRAIN_FACTORS_OF_SAFETY[-1])
+    upper = np.clip(np.searchsorted(STRAIN_FACTORS_OF_SAFETY, fs, side='right'), 1,
+                    len(STRAIN_FACTORS_OF_SAFETY) - 1)
+    low, high = STRAIN_FACTORS_OF_SAFETY[upper - 1], STRAIN_FACTORS_OF_SAFETY[upper]
+    columns = np.broadcast_to(np.arange(q.shape[-1]), fs.shape)
+    below, above = curves[upper - 1, columns], curves[upper, columns]
+    strain = below + (above - below) * (fs - low) / (high - low)
+    return np.where(fs < STRAIN_FACTORS_OF_SAFETY[-1], np.maximum(strain, 0), 0.0)
+
+
+def sample_thickness(depth):
+    """Depth interval each sample represents, halfway to its neighbours."""
+    if len(depth) < 2:
+        return np.zeros_like(depth)
+    edges = np.concatenate(([depth[0]], (depth[1:] + depth[:-1]) / 2, [depth[-1]]))
+    return np.diff(edges)
+
+
+def assess_soundings(results, water_depths, pga, magnitude, method='robertson'):
+    """
+    Triggering and indexes for many interpreted soundings under every
+    scenario (``pga`` and ``magnitude`` are equal-length scenario vectors).
+    Returns one dict per sounding: ``lpi``, ``lsn`` and ``min_fs`` per
+    scenario, and ``fs`` as ``(scenarios, samples)``.
+    """
+    sizes = [len(result['depth']) for result in results]
+    fields = ['depth', 'qt', 'sigma_v0', 'sigma_v0_eff', 'Qtn', 'Ic']
+    merged = {field: np.concatenate([result[field] for result in results]) if results else np.empty(0)
+              for field in fields}
+    water = np.repeat(np.asarray(water_depths, dtype=np.float64), sizes)
+    thickness = np.concatenate([sample_thickness(result['depth']) for result in results]) if results \
+        else np.empty(0)
+
+    fs, qc1ncs = factors_of_safety(merged, water, pga, magnitude, method)
+    depth = merged['depth']
+    within = (depth > 0) & (depth <= INDEX_DEPTH)
+    severity = np.where(within, np.clip(1 - np.nan_to_num(fs, nan=MAX_FACTOR_OF_SAFETY), 0, None), 0)
+    lpi_terms = severity * (10 - 0.5 * depth) * thickness
+    strain = volumetric_strain(fs, qc1ncs)
+    lsn_terms = np.where(within, 10 * strain / np.where(within, depth, 1.0), 0) * thickness
+    fs_in_range = np.where(within, np.nan_to_num(fs, nan=MAX_FACTOR_OF_SAFETY), MAX_FACTOR_OF_SAFETY)
+
+    assessments = []
+    start = 0
+    for size in sizes:
+        window = slice(start, start + size)
+        assessments.append({
+            'lpi': lpi_terms[:, window].sum(axis=1),
+            'lsn': lsn_terms[:, window].sum(axis=1),
+            'min_fs': fs_in_range[:, window].min(axis=1, initial=MAX_FACTOR_OF_SAFETY),
+            'fs': fs[:, window],
+        })
+        start += size
+    return assessments
+
+
+def scenario_matrix(pga, magnitude):
+    """Flattened ``(pga, magnitude)`` scenario vectors, magnitude varying fastest."""
+    pga_grid, magnitude_grid = np.meshgrid(pga, magnitude, indexing='ij')
+    return pga_grid.ravel(), magnitude_grid.ravel()
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from geotech.benchmarks import BENCHMARKS
+from geotech.endpoint_suite import ENDPOINT_TIERS
+
+
+class Command(BaseCommand):
+    help = 'Run a geotech backend benchmark against the configured database (use a scratch copy).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS))
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--legacy-limit', type=int, default=100_000,
+                            help='Largest size the slow reference path is run for.')
+        parser.add_argument('--cpt-counts', nargs='+', type=int, default=[1, 10],
+                            help='CPT tests per model, for the model_read benchmark.')
+        parser.add_argument('--tiers', nargs='+', choices=sorted(ENDPOINT_TIERS), default=['small', 'medium'],
+                            help='Dataset tiers, for the endpoints benchmark.')
+        parser.add_argument('--steps', type=int, default=1000, help='Time steps, for the consolidation benchmark.')
+        parser.add_argument('--nodes', type=int, default=500, help='Nodes, for the consolidation benchmark.')
+        parser.add_argument('--load-cases', type=int, default=100,
+                            help='Load cases, for the consolidation benchmark.')
+        parser.add_argument('--workers', nargs='+', type=int,
+                            help='Process pool sizes, for the slope benchmark (default: 1 and every core).')
+        parser.add_argument('--baseline', action='store_true',
+                            help='Record the endpoints results as the new perf_baseline.json.')
+
+    def handle(self, *args, **options):
+        results = BENCHMARKS[options['name']](**options)
+        if not results:
+            return
+        columns = list(results[0])
+        for row in results[1:]:
+            columns += [key for key in row if key not in columns]
+        self.stdout.write('  '.join(f'{column:>14}' for column in columns))
+        for row in results:
+            self.stdout.write('  '.join(f'{self._format(row.get(column)):>14}' for column in columns))
+        if any(column not in row for row in results for column in columns):
+            # Only the reference paths are left out of a row, by their size limit
+            self.stdout.write(f'- not run: reference paths stop at --legacy-limit {options["legacy_limit"]:,} samples')
+
+    def _format(self, value):
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return f'{value:,.1f}'
+        return f'{value:,}' if isinstance(value, int) else str(value)
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from geotech.models import CptTest
+from geotech.synthetic import DatasetSpec, delete_dataset, generate_dataset, username
+
+
+class Command(BaseCommand):
+    help = ('Generate a deterministic synthetic dataset (users x projects x objects x models x '
+            'layers x CPT tests x samples) for load and scale testing. Use a scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--projects', type=int, default=10, help='Projects per user.')
+        parser.add_argument('--objects', type=int, default=2, help='Objects per project.')
+        parser.add_argument('--models', type=int, default=2, help='Models per object.')
+        parser.add_argument('--layers', type=int, default=6, help='Layers per model.')
+        parser.add_argument('--cpt-tests', type=int, default=3, help='CPT tests per model.')
+        parser.add_argument('--samples', type=int, default=2000, help='Samples per CPT test.')
+        parser.add_argument('--depth', type=float, default=30.0, help='Depth of every sounding (m).')
+        parser.add_argument('--storage', choices=[choice for choice, _ in CptTest.STORAGE_CHOICES],
+                            default=CptTest.STORAGE_ROWS)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synthetic', help='Username prefix of generated users.')
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete users generated earlier under the same prefix first.')
+
+    def handle(self, *args, **options):
+        spec = DatasetSpec(**{field: options[field] for field in DatasetSpec._fields})
+        for field in ('users', 'projects', 'objects', 'models', 'layers'):
+            if getattr(spec, field) < 1:
+                raise CommandError(f'--{field} must be at least 1.')
+        if spec.cpt_tests < 0 or spec.samples < 0 or spec.depth <= 0:
+            raise CommandError('--cpt-tests and --samples cannot be negative, --depth must be positive.')
+
+        if options['replace']:
+            self.stdout.write(f'Deleted {delete_dataset(spec.prefix):,} rows generated under "{spec.prefix}".')
+        elif User.objects.filter(username=username(spec, 0)).exists():
+            raise CommandError(f'A dataset with prefix "{spec.prefix}" and seed {spec.seed} exists; use --replace.')
+
+        started = time.perf_counter()
+
+        def progress(user_index, counts):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'user {user_index + 1}/{spec.users}: {counts["samples"]:,} samples '
+                              f'in {elapsed:,.1f} s')
+
+        counts = generate_dataset(spec, progress=progress if spec.users > 1 else None)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(', '.join(f'{count:,} {table}' for table, count in counts.items()))
+        rate = counts['samples'] / elapsed if elapsed > 0 else 0
+        self.stdout.write(f'Generated in {elapsed:,.1f} s ({rate:,.0f} samples/s).')
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from geotech.models import QueryReport
+
+
+class Command(BaseCommand):
+    help = 'Summarize slow and repeated (N+1) queries captured with GEOTECH_QUERY_DIAGNOSTICS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=[kind for kind, _ in QueryReport.KIND_CHOICES])
+        parser.add_argument('--view', help='Only reports for this URL name.')
+        parser.add_argument('--hours', type=float, help='Only reports from the last N hours.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--clear', action='store_true', help='Delete the selected reports instead.')
+
+    def handle(self, *args, **options):
+        reports = QueryReport.objects.all()
+        if options['kind']:
+            reports = reports.filter(kind=options['kind'])
+        if options['view']:
+            reports = reports.filter(view=options['view'])
+        if options['hours']:
+            reports = reports.filter(created_at__gte=timezone.now() - timedelta(hours=options['hours']))
+
+        if options['clear']:
+            deleted, _ = reports.delete()
+            self.stdout.write(f'Deleted {deleted} reports.')
+            return
+
+        # Same query from the same place in the same view, worst total time first
+        groups = reports.values('kind', 'view', 'source', 'sql').annotate(
+            requests=Count('id'),
+            queries=Sum('count'),
+            total_ms=Sum('duration_ms'),
+            max_ms=Max('duration_ms'),
+            last_seen=Max('created_at'),
+            plan=Max('plan'),
+        ).order_by('-total_ms')[:options['limit']]
+
+        if not groups:
+            self.stdout.write('No query reports.')
+            return
+        for group in groups:
+            self.stdout.write(
+                f"[{group['kind']}] {group['view']}: {group['queries']:,} queries in {group['requests']:,} "
+                f"requests, {group['total_ms']:,.1f} ms total, {group['max_ms']:,.1f} ms max "
+                f"(last {group['last_seen']:%Y-%m-%d %H:%M})"
+            )
+            self.stdout.write(f"  source: {group['source'] or '-'}")
+            self.stdout.write(f"  sql: {group['sql']}")
+            for line in group['plan'].splitlines():
+                self.stdout.write(f'  plan: {line}')
+            self.stdout.write('')
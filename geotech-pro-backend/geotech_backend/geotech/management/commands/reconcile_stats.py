@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from geotech.models import Project
+from geotech.stats import RECONCILE_BATCH_SIZE, reconcile_project_stats
+
+
+class Command(BaseCommand):
+    help = ('Recount the ProjectStats rollup from the tables and fix rows that drifted, e.g. after '
+            'writes from the admin, the shell or queryset update()/delete(). Safe to run periodically.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only projects of this username.')
+        parser.add_argument('--project', type=int, action='append', help='Only this project id (repeatable).')
+        parser.add_argument('--batch-size', type=int, default=RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['user']:
+            projects = projects.filter(user__username=options['user'])
+        if options['project']:
+            projects = projects.filter(id__in=options['project'])
+        corrected = reconcile_project_stats(projects, batch_size=options['batch_size'])
+        self.stdout.write(f'Corrected {corrected:,} project rollups.')
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geotech', '0004_project_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cpttest',
+            name='storage',
+            field=models.CharField(choices=[('rows', 'One CptData row per sample'), ('packed', 'Packed channel arrays')], default='rows', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='PackedSounding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dtype', models.CharField(choices=[('f4', 'float32'), ('f8', 'float64')], default='f8', max_length=2)),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('depth', models.BinaryField(default=b'')),
+                ('qc', models.BinaryField(default=b'')),
+                ('fs', models.BinaryField(default=b'')),
+                ('u2', models.BinaryField(default=b'')),
+                ('cpt_test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='packed', to='geotech.cpttest')),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geotech', '0005_packed_sounding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cpttest',
+            name='samples_digest',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='DerivedSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('input_hash', models.CharField(max_length=64)),
+                ('payload', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cpt_test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derived_series', to='geotech.cpttest')),
+            ],
+            options={
+                'unique_together': {('cpt_test', 'input_hash')},
+            },
+        ),
+    ]
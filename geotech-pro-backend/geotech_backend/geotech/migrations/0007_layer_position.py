@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geotech', '0006_derived_series'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='layer',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.AddField(
+            model_name='layer',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
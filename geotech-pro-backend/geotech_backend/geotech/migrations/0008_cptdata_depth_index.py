@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geotech', '0007_layer_position'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cptdata',
+            index=models.Index(fields=['cpt_test', 'depth'], name='cptdata_test_depth_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geotech', '0008_cptdata_depth_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PyramidLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bin_size', models.PositiveIntegerField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('source_count', models.PositiveIntegerField(default=0)),
+                ('samples_digest', models.CharField(blank=True, default='', max_length=64)),
+                ('depth', models.BinaryField(default=b'')),
+                ('qc', models.BinaryField(default=b'')),
+                ('fs', models.BinaryField(default=b'')),
+                ('u2', models.BinaryField(default=b'')),
+                ('cpt_test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pyramid', to='geotech.cpttest')),
+            ],
+            options={
+                'ordering': ['bin_size'],
+                'unique_together': {('cpt_test', 'bin_size')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geotech', '0011_project_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geotechnicalmodel',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
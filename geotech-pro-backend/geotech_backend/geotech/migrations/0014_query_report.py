@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geotech', '0013_project_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('slow', 'Slow query'), ('repeated', 'Repeated query (N+1)')], max_length=10)),
+                ('view', models.CharField(max_length=200)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('source', models.CharField(blank=True, default='', max_length=500)),
+                ('sql', models.TextField()),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('duration_ms', models.FloatField(default=0)),
+                ('plan', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
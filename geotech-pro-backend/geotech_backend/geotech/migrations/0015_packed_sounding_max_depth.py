@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:41
+
+import numpy as np
+from django.db import migrations, models
+
+
+def record_max_depth(apps, schema_editor):
+    PackedSounding = apps.get_model('geotech', 'PackedSounding')
+    for packed in PackedSounding.objects.filter(sample_count__gt=0).iterator():
+        depth = np.frombuffer(bytes(packed.depth), dtype=f'<{packed.dtype}')
+        if len(depth):
+            packed.max_depth = float(depth.max())
+            packed.save(update_fields=['max_depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geotech', '0014_query_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packedsounding',
+            name='max_depth',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(record_max_depth, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,16 @@
 # geotech/models.py
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
+def _count_per_project(queryset, project_path):
+    """Correlated ``COUNT(*)`` of ``queryset`` rows belonging to the outer project."""
+    return Coalesce(models.Subquery(
+        queryset.filter(**{project_path: models.OuterRef('pk')})
+        .order_by().values(project_path)
+        .annotate(count=models.Count('pk')).values('count')
+    ), 0)
+
 class ProjectQuerySet(models.QuerySet):
     def for_user(self, user):
         return self.filter(user=user)
@@ -9,22 +18,64 @@ class ProjectQuerySet(models.QuerySet):
     def with_related_data(self):
         return self.select_related('user')
 
+    def with_counts(self, *names):
+        """
+        Annotate ``models_count``, ``cpt_tests_count`` and ``layers_count``
+        (or only ``names`` of them). Each is an independent subquery, so the
+        counts are not multiplied by joining models to both layers and CPT
+        tests, and a whole list costs one query.
+        """
+        counts = {
+            'models_count': (GeotechnicalModel, 'project'),
+            'cpt_tests_count': (CptTest, 'model__project'),
+            'layers_count': (Layer, 'model__project'),
+        }
+        return self.annotate(**{
+            name: _count_per_project(model.objects.all(), path)
+            for name, (model, path) in counts.items() if not names or name in names
+        })
+
 class Project(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=50, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProjectQuerySet.as_manager()
+
     def __str__(self):
         return self.name
+
+    @classmethod
+    def get_user_projects(cls, user):
+        return cls.objects.for_user(user).with_related_data()
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Keyset pagination of a user's projects (see pagination.py)
+            models.Index(fields=['user', '-updated_at', '-id'], name='project_user_updated_idx'),
+        ]
+
+class ProjectStats(models.Model):
+    """
+    Rollup of a project's row counts for the dashboard, adjusted in the same
+    transaction as the writes that change them (see stats.py).
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='stats')
+    models_count = models.IntegerField(default=0)
+    cpt_tests_count = models.IntegerField(default=0)
+    layers_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.project}"
 
 class Object(models.Model):
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='objects')
+    # Not 'objects': that would shadow Project's manager
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='project_objects')
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -34,6 +85,21 @@ class Object(models.Model):
     class Meta:
         unique_together = ['project', 'name']
 
+def model_read_prefetches():
+    """
+    What GeotechnicalModelSerializer reads: layers in stacking order and CPT
+    tests with their packed channels. Row-stored samples are loaded
+    separately by storage.prefetch_samples.
+    """
+    return [
+        models.Prefetch('layers', queryset=Layer.objects.order_by('position', 'id')),
+        models.Prefetch('cpt_tests', queryset=CptTest.objects.select_related('packed').order_by('id')),
+    ]
+
+class GeotechnicalModelQuerySet(models.QuerySet):
+    def with_read_data(self):
+        return self.prefetch_related(*model_read_prefetches())
+
 class GeotechnicalModel(models.Model):
     object = models.ForeignKey(Object, on_delete=models.CASCADE, related_name='geotechnical_models', null=True, blank=True)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='geotechnical_models')
@@ -41,8 +107,12 @@ class GeotechnicalModel(models.Model):
     name = models.CharField(max_length=100)
     npv = models.FloatField(default=0)
     npv_max = models.FloatField(default=0)
+    # Bumped on every write to the model, its layers or its CPT samples
+    version = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = GeotechnicalModelQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -59,13 +129,26 @@ class Layer(models.Model):
     compressibility = models.FloatField(default=0)
     permeability = models.FloatField(null=True, blank=True)
     cpt_data = models.TextField(null=True, blank=True)
+    position = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.name} (Depth: {self.depth}m)"
 
+    class Meta:
+        ordering = ['position', 'id']
+
 class CptTest(models.Model):
+    STORAGE_ROWS = 'rows'
+    STORAGE_PACKED = 'packed'
+    STORAGE_CHOICES = [
+        (STORAGE_ROWS, 'One CptData row per sample'),
+        (STORAGE_PACKED, 'Packed channel arrays'),
+    ]
+
     model = models.ForeignKey(GeotechnicalModel, on_delete=models.CASCADE, related_name='cpt_tests')
     name = models.CharField(max_length=100)
+    storage = models.CharField(max_length=10, choices=STORAGE_CHOICES, default=STORAGE_ROWS)
+    samples_digest = models.CharField(max_length=64, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -79,4 +162,92 @@ class CptData(models.Model):
     u2 = models.FloatField(default=0)
 
     def __str__(self):
-        return f"CPT Data at {self.depth}m"
\ No newline at end of file
+        return f"CPT Data at {self.depth}m"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cpt_test', 'depth'], name='cptdata_test_depth_idx'),
+        ]
+
+class PackedSounding(models.Model):
+    """Channels of a packed CptTest, each stored as a raw little-endian float array."""
+    DTYPE_CHOICES = [
+        ('f4', 'float32'),
+        ('f8', 'float64'),
+    ]
+
+    cpt_test = models.OneToOneField(CptTest, on_delete=models.CASCADE, related_name='packed')
+    dtype = models.CharField(max_length=2, choices=DTYPE_CHOICES, default='f8')
+    sample_count = models.PositiveIntegerField(default=0)
+    # Deepest sample, kept with the channels so appends need not decode them
+    max_depth = models.FloatField(null=True, blank=True)
+    depth = models.BinaryField(default=b'')
+    qc = models.BinaryField(default=b'')
+    fs = models.BinaryField(default=b'')
+    u2 = models.BinaryField(default=b'')
+
+    def __str__(self):
+        return f"Packed {self.cpt_test} ({self.sample_count} samples)"
+
+class PyramidLevel(models.Model):
+    """
+    One level of a CptTest's decimation pyramid: the samples kept by a
+    min/max envelope over bins of ``bin_size`` raw samples, packed like a
+    PackedSounding. ``samples_digest`` is the sounding's digest it was built from.
+    """
+    cpt_test = models.ForeignKey(CptTest, on_delete=models.CASCADE, related_name='pyramid')
+    bin_size = models.PositiveIntegerField()
+    sample_count = models.PositiveIntegerField(default=0)
+    source_count = models.PositiveIntegerField(default=0)
+    samples_digest = models.CharField(max_length=64, blank=True, default='')
+    depth = models.BinaryField(default=b'')
+    qc = models.BinaryField(default=b'')
+    fs = models.BinaryField(default=b'')
+    u2 = models.BinaryField(default=b'')
+
+    def __str__(self):
+        return f"{self.cpt_test} 1:{self.bin_size} ({self.sample_count} samples)"
+
+    class Meta:
+        unique_together = ['cpt_test', 'bin_size']
+        ordering = ['bin_size']
+
+class DerivedSeries(models.Model):
+    """
+    Materialized interpretation of one CptTest, keyed by a hash of everything
+    it was computed from (samples, layer stack, groundwater, settings).
+    """
+    cpt_test = models.ForeignKey(CptTest, on_delete=models.CASCADE, related_name='derived_series')
+    input_hash = models.CharField(max_length=64)
+    payload = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Derived {self.cpt_test} ({self.input_hash[:12]})"
+
+    class Meta:
+        unique_together = ['cpt_test', 'input_hash']
+
+class QueryReport(models.Model):
+    """A slow query or repeated query shape captured by the query diagnostics mode."""
+    KIND_CHOICES = [
+        ('slow', 'Slow query'),
+        ('repeated', 'Repeated query (N+1)'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    view = models.CharField(max_length=200)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    source = models.CharField(max_length=500, blank=True, default='')
+    sql = models.TextField()
+    count = models.PositiveIntegerField(default=1)
+    duration_ms = models.FloatField(default=0)
+    plan = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} in {self.view} ({self.count}x, {self.duration_ms:.1f} ms)"
+
+    class Meta:
+        ordering = ['-created_at']
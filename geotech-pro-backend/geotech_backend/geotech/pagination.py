@@ -0,0 +1,81 @@
+"""
+Keyset ("seek") pagination for the project list.
+
+Pages are ordered by ``(updated_at, id)`` descending and the cursor is the
+last row's key, so fetching the next page is a range scan on the
+``(user, -updated_at, -id)`` index however deep the client has paged.
+An OFFSET would read and discard every earlier row. Rows inserted or
+touched while paging shift to the front instead of duplicating rows on
+later pages.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(updated_at, pk):
+    raw = json.dumps([updated_at.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        updated_at, pk = json.loads(raw)
+        updated_at = parse_datetime(updated_at)
+        if updated_at is None or not isinstance(pk, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+    return updated_at, pk
+
+
+class KeysetPagination(BasePagination):
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.limit_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        if limit < 1:
+            raise ValidationError({'limit': 'Must be at least 1.'})
+        return min(limit, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_limit(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            updated_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk))
+
+        # One extra row tells whether there is a next page
+        page = list(queryset.order_by('-updated_at', '-id')[:limit + 1])
+        self.next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            self.next_cursor = encode_cursor(page[-1].updated_at, page[-1].id)
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
@@ -0,0 +1,140 @@
+import json
+import struct
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+from .exporters import BINARY_MAGIC, BINARY_VERSION
+from .instrumentation import timing
+from .storage import SAMPLE_BINARY, SAMPLE_COLUMNS, SAMPLE_ROWS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ExportRenderer(renderers.BaseRenderer):
+    """
+    Content-negotiation targets for the streaming export views. The views
+    return a StreamingHttpResponse themselves, so ``render`` is only used
+    for errors raised before the view runs (authentication, permissions).
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode(self.charset)
+
+
+class CsvExportRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JsonLinesExportRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+
+class BinaryExportRenderer(ExportRenderer):
+    media_type = 'application/octet-stream'
+    format = 'bin'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode('utf-8')
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed, several
+    times faster on large sample lists. Indented output (the browsable API)
+    still goes through the standard encoder.
+    """
+    sample_layout = SAMPLE_ROWS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timing('render'):
+            if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+                return super().render(data, accepted_media_type, renderer_context)
+            return orjson.dumps(data, default=encoders.JSONEncoder().default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """JSON with each CPT test's ``data`` as one array per channel instead of one object per sample."""
+    media_type = 'application/vnd.geotech.columnar+json'
+    format = 'columnar'
+    sample_layout = SAMPLE_COLUMNS
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    MessagePack with each CPT channel as raw little-endian bytes (float64,
+    int64 ids), ready to wrap in a typed array. Needs the msgpack package.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    sample_layout = SAMPLE_BINARY
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timing('render'):
+            return msgpack.packb(data, use_bin_type=True, default=encoders.JSONEncoder().default)
+
+
+class BinaryModelRenderer(renderers.BaseRenderer):
+    """
+    Dependency-free binary model payload in the exporters' little-endian
+    framing: ``b'GTPB'``, the uint8 version, the tag ``M``, a ``uint32``
+    header length and a UTF-8 JSON header, then the CPT channels as raw
+    bytes (float64, int64 ids). In the header each channel is
+    ``{"$bytes": [offset, length]}``, offsets counted from the end of the
+    header; the header is space-padded and every block zero-padded to 8
+    bytes, so each channel can be viewed as a typed array in place.
+    """
+    media_type = 'application/vnd.geotech.binary'
+    format = 'gtpb'
+    charset = None
+    render_style = 'binary'
+    sample_layout = SAMPLE_BINARY
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timing('render'):
+            blocks = []
+            header = json.dumps(self._extract_bytes(data, blocks), cls=encoders.JSONEncoder,
+                                separators=(',', ':')).encode('utf-8')
+            header += b' ' * (-(len(BINARY_MAGIC) + struct.calcsize('<BcI') + len(header)) % 8)
+            return BINARY_MAGIC + struct.pack('<BcI', BINARY_VERSION, b'M', len(header)) + header + b''.join(blocks)
+
+    def _extract_bytes(self, value, blocks):
+        """``value`` with every bytes object moved to ``blocks`` and replaced by its ``$bytes`` reference."""
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            value = bytes(value)
+            offset = sum(len(block) for block in blocks)
+            blocks.append(value + b'\0' * (-len(value) % 8))
+            return {'$bytes': [offset, len(value)]}
+        if isinstance(value, dict):
+            return {key: self._extract_bytes(item, blocks) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._extract_bytes(item, blocks) for item in value]
+        return value
+
+
+# Offered for model payloads, in order of preference when the client accepts anything
+MODEL_RENDERERS = [FastJSONRenderer, ColumnarJSONRenderer, BinaryModelRenderer]
+if msgpack is not None:
+    MODEL_RENDERERS.append(MessagePackRenderer)
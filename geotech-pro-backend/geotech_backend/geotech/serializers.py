@@ -1,128 +1,183 @@
 # geotech/serializers.py
+import numpy as np
 from rest_framework import serializers
-from .models import GeotechnicalModel, Layer, CptTest, CptData, Project
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from .models import GeotechnicalModel, Layer, CptTest, CptData, Project, PackedSounding, model_read_prefetches
+from .ingest import CPT_CHANNELS, parse_samples
+from .storage import (SAMPLE_BINARY, SAMPLE_ROWS, read_channels, write_samples, replace_samples,
+                      prefetch_samples, row_dicts, sample_columns, sample_dicts, stored_dtype)
+from .derived import invalidate_model
+from .sync import sync_layers, sync_cpt_tests
+from .stats import adjust_for_changes
+from .caching import bump_model_version
+from .instrumentation import timing
 from django.contrib.auth.models import User
 
-class ProjectSerializer(serializers.ModelSerializer):
+class TimedRepresentationMixin:
+    """Reports representation time to the request's Server-Timing ``serialize`` entry."""
+    def to_representation(self, instance):
+        with timing('serialize'):
+            return super().to_representation(instance)
+
+class ProjectSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    """
+    The counts are read from the annotations of ProjectQuerySet.with_counts(),
+    so serializing a list costs no query per project. ``fields`` limits the
+    output to a subset of Meta.fields.
+    """
     user = serializers.PrimaryKeyRelatedField(read_only=True)
-    models_count = serializers.SerializerMethodField()
-    cpt_tests_count = serializers.SerializerMethodField()
-    layers_count = serializers.SerializerMethodField()
+    models_count = serializers.IntegerField(read_only=True)
+    cpt_tests_count = serializers.IntegerField(read_only=True)
+    layers_count = serializers.IntegerField(read_only=True)
+
+    COUNT_FIELDS = ['models_count', 'cpt_tests_count', 'layers_count']
 
     class Meta:
         model = Project
-        fields = ['id', 'name', 'description', 'location', 'client', 'status', 
-                 'start_date', 'end_date', 'created_at', 'updated_at', 'user',
-                 'models_count', 'cpt_tests_count', 'layers_count']
-
-    def get_models_count(self, obj):
-        try:
-            return obj.geotechnical_models.all().count()
-        except Exception as e:
-            print(f"Error in get_models_count: {str(e)}")
-            return 0
-
-    def get_cpt_tests_count(self, obj):
-        try:
-            return CptTest.objects.filter(model__project=obj).count()
-        except Exception as e:
-            print(f"Error in get_cpt_tests_count: {str(e)}")
-            return 0
-
-    def get_layers_count(self, obj):
-        try:
-            return Layer.objects.filter(model__project=obj).count()
-        except Exception as e:
-            print(f"Error in get_layers_count: {str(e)}")
-            return 0
+        fields = ['id', 'name', 'description', 'status', 'created_at', 'updated_at', 'user',
+                  'models_count', 'cpt_tests_count', 'layers_count']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
+        project = super().create(validated_data)
+        project.models_count = project.cpt_tests_count = project.layers_count = 0
+        return project
 
 class CptDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = CptData
         fields = ['id', 'depth', 'qc', 'fs', 'u2']
 
+class CptSamplesField(serializers.Field):
+    """
+    Validates a whole sounding in one pass instead of running a nested
+    CptDataSerializer per sample. Bound with source='*' so it can read
+    packed soundings as well as CptData rows; the internal value is
+    {'data': [(depth, qc, fs, u2), ...]}.
+
+    The representation shape comes from ``context['sample_layout']`` (see
+    storage.SAMPLE_ROWS/COLUMNS/BINARY), set by the negotiated renderer.
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return {'data': parse_samples(data)}
+
+    def to_representation(self, instance):
+        layout = self.context.get('sample_layout', SAMPLE_ROWS)
+        if instance.storage == CptTest.STORAGE_PACKED:
+            channels = read_channels(instance)
+            if layout == SAMPLE_ROWS:
+                return sample_dicts(channels)
+            return sample_columns(range(1, len(channels['depth']) + 1), channels, layout == SAMPLE_BINARY)
+
+        if hasattr(instance, 'prefetched_samples'):
+            rows = instance.prefetched_samples
+        else:
+            rows = instance.data.order_by('depth', 'id').values_list('id', 'depth', 'qc', 'fs', 'u2')
+        if layout == SAMPLE_ROWS:
+            return row_dicts(rows)
+        array = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        channels = {channel: array[:, i] for i, channel in enumerate(CPT_CHANNELS, start=1)}
+        return sample_columns(array[:, 0].astype(np.int64).tolist(), channels, layout == SAMPLE_BINARY)
+
 class CptTestSerializer(serializers.ModelSerializer):
-    data = CptDataSerializer(many=True)
+    # Writable so differential saves can match incoming tests to stored ones
+    id = serializers.IntegerField(required=False, allow_null=True)
+    data = CptSamplesField(required=False)
+    dtype = serializers.ChoiceField(choices=PackedSounding.DTYPE_CHOICES, write_only=True, required=False)
 
     class Meta:
         model = CptTest
-        fields = ['id', 'name', 'data']
+        fields = ['id', 'name', 'storage', 'dtype', 'data']
 
+    @transaction.atomic
     def create(self, validated_data):
-        data = validated_data.pop('data')
+        validated_data.pop('id', None)
+        data = validated_data.pop('data', [])
+        dtype = validated_data.pop('dtype', 'f8')
         cpt_test = CptTest.objects.create(**validated_data)
-        for item in data:
-            CptData.objects.create(cpt_test=cpt_test, **item)
+        write_samples(cpt_test, data, dtype)
         return cpt_test
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        data = validated_data.pop('data')
         instance.name = validated_data.get('name', instance.name)
+        instance.storage = validated_data.get('storage', instance.storage)
         instance.save()
-        instance.data.all().delete()
-        for item in data:
-            CptData.objects.create(cpt_test=instance, **item)
+        if 'data' in validated_data:
+            replace_samples(instance, validated_data['data'], stored_dtype(instance, validated_data.get('dtype')))
         return instance
 
 class LayerSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False, allow_null=True)
+
     class Meta:
         model = Layer
         fields = ['id', 'name', 'depth', 'unit_weight', 'cohesion', 'friction_angle', 'compressibility', 'permeability', 'cpt_data']
 
-class GeotechnicalModelSerializer(serializers.ModelSerializer):
+class GeotechnicalModelSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     layers = LayerSerializer(many=True, required=False)
     cpt_tests = CptTestSerializer(many=True, required=False)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
-    project_id = serializers.IntegerField(source='project.id', read_only=True)
+    project_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = GeotechnicalModel
-        fields = ['id', 'user', 'name', 'npv', 'npv_max', 'layers', 'cpt_tests', 'project', 'project_id']
+        fields = ['id', 'user', 'name', 'npv', 'npv_max', 'version', 'layers', 'cpt_tests', 'project', 'project_id']
+        read_only_fields = ['version']
+
+    # Row counts of the last differential save, set by update()
+    changes = None
 
     def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if not instance.layers.exists():
-            data['layers'] = []
-        if not instance.cpt_tests.exists():
-            data['cpt_tests'] = []
-        return data
+        # A fixed number of queries however many tests and samples there are;
+        # lookups already prefetched by with_read_data() are not repeated
+        prefetch_related_objects([instance], *model_read_prefetches())
+        prefetch_samples(instance.cpt_tests.all())
+        return super().to_representation(instance)
 
+    @transaction.atomic
     def create(self, validated_data):
         layers_data = validated_data.pop('layers', [])
         cpt_tests_data = validated_data.pop('cpt_tests', [])
         model = GeotechnicalModel.objects.create(user=self.context['request'].user, **validated_data)
-        
-        for layer_data in layers_data:
-            Layer.objects.create(model=model, **layer_data)
-            
-        for cpt_test_data in cpt_tests_data:
-            data = cpt_test_data.pop('data', [])
-            cpt_test = CptTest.objects.create(model=model, **cpt_test_data)
-            for item in data:
-                CptData.objects.create(cpt_test=cpt_test, **item)
+
+        layer_changes = sync_layers(model, layers_data)
+        cpt_test_changes = sync_cpt_tests(model, cpt_tests_data)
+        adjust_for_changes(model.project_id, layer_changes, cpt_test_changes, models=1)
         return model
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        groundwater = (instance.npv, instance.npv_max)
         instance.name = validated_data.get('name', instance.name)
         instance.npv = validated_data.get('npv', instance.npv)
         instance.npv_max = validated_data.get('npv_max', instance.npv_max)
-        instance.save()
+        # Not a full save: that would write back a stale version
+        instance.save(update_fields=['name', 'npv', 'npv_max'])
 
+        self.changes = {}
         if 'layers' in validated_data:
-            instance.layers.all().delete()
-            for layer_data in validated_data['layers']:
-                Layer.objects.create(model=instance, **layer_data)
-
+            self.changes['layers'] = sync_layers(instance, validated_data['layers'])
         if 'cpt_tests' in validated_data:
-            instance.cpt_tests.all().delete()
-            for cpt_test_data in validated_data['cpt_tests']:
-                data = cpt_test_data.pop('data', [])
-                cpt_test = CptTest.objects.create(model=instance, **cpt_test_data)
-                for item in data:
-                    CptData.objects.create(cpt_test=instance, **item)
+            self.changes['cpt_tests'] = sync_cpt_tests(instance, validated_data['cpt_tests'])
+        adjust_for_changes(instance.project_id, self.changes.get('layers'), self.changes.get('cpt_tests'))
+        bump_model_version(instance.id)
+        instance.version += 1
+        self.changes['rows_touched'] = sum(sum(counts.values()) for counts in self.changes.values())
+
+        layers_changed = any(self.changes.get('layers', {}).values())
+        if layers_changed or groundwater != (instance.npv, instance.npv_max):
+            invalidate_model(instance)
 
         return instance
\ No newline at end of file
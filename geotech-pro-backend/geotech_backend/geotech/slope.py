@@ -0,0 +1,277 @@
+"""
+Slope stability by Bishop's simplified method over a model's layer stack.
+
+The section is a simple slope of ``height`` H at ``angle`` to the
+horizontal: level ground at elevation 0 left of the toe (x = 0), the slope
+face up to the crest at x = H / tan(angle), level ground at elevation H
+beyond it. Layers are horizontal with their depths measured down from the
+crest. The phreatic surface lies ``npv`` below the crest and follows the
+ground surface where it would be above it (seepage out of the face).
+
+A trial slip circle is its centre and radius. All slices of a circle, and
+all circles of a batch, are evaluated as arrays:
+
+    F = sum((c b + (W - u b) tan(phi)) / m_alpha) / sum(W sin(alpha))
+    m_alpha = cos(alpha) + sin(alpha) tan(phi) / F
+
+iterated to convergence from F = 1. Circles that do not cut the slope, do
+not drive the mass downslope, or reach m_alpha < 0.2 (where the method
+breaks down) get F = inf.
+
+``search`` runs a grid of circle centres x tangent elevations, then
+repeatedly refines a smaller grid around the most critical circle. Grids
+are split into chunks evaluated over a process pool; the workers need
+only numpy, so they are spawned fresh rather than forked from the server.
+Each web worker process keeps its own pool, so the total is web workers x
+``GEOTECH_SLOPE_WORKERS`` processes; the default is kept small.
+
+Lengths in m, unit weights in kN/m3, cohesion and pressures in kPa,
+angles in degrees.
+"""
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .stress import WATER_UNIT_WEIGHT, cumulative_table, depth_integral, layer_properties
+
+SOIL_FIELDS = ['unit_weight', 'cohesion', 'friction_angle']
+DEFAULT_SLICES = 40
+DEFAULT_GRID = (20, 20, 10)
+DEFAULT_REFINEMENTS = 3
+MAX_CIRCLES = 200_000
+# Below m_alpha = 0.2 Bishop's method gives meaningless factors of safety
+MIN_M_ALPHA = 0.2
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-5
+# Samples along a circle used to bracket its entry and exit points
+ARC_SAMPLES = 96
+BISECTIONS = 24
+# Smaller grids are cheaper to evaluate in-process than to ship to workers
+PARALLEL_MIN_CIRCLES = 2000
+CHUNKS_PER_WORKER = 4
+# Search processes per web worker when GEOTECH_SLOPE_WORKERS is not set
+DEFAULT_WORKERS = 2
+
+
+class SlopeSection:
+    """A slope geometry with its soil profile and water table, picklable for the worker processes."""
+
+    def __init__(self, height, angle, bottoms, soil, water_depth):
+        if not height > 0 or not 0 < angle < 90:
+            raise ValueError('height must be positive and angle between 0 and 90 degrees.')
+        self.height = float(height)
+        self.angle = float(angle)
+        self.crest = self.height / math.tan(math.radians(self.angle))
+        self.bottoms = np.asarray(bottoms, dtype=np.float64)
+        self.unit_weights = np.asarray(soil['unit_weight'], dtype=np.float64)
+        self.cohesion = np.nan_to_num(np.asarray(soil['cohesion'], dtype=np.float64))
+        self.tan_phi = np.tan(np.radians(np.nan_to_num(np.asarray(soil['friction_angle'], dtype=np.float64))))
+        self.table = cumulative_table(self.bottoms, self.unit_weights)
+        self.water_level = self.height - float(water_depth)
+
+    def ground(self, x):
+        return np.interp(x, [0.0, self.crest], [0.0, self.height])
+
+    def _below_ground(self, circles, x):
+        xc, yc, r = circles[:, 0:1], circles[:, 1:2], circles[:, 2:3]
+        arc = yc - np.sqrt(np.maximum(r ** 2 - (x - xc) ** 2, 0))
+        return self.ground(x) - arc
+
+    def _crossings(self, circles):
+        """Entry and exit x of each circle through the ground, NaN where it does not cut it."""
+        t = np.linspace(-1.0, 1.0, ARC_SAMPLES)
+        x = circles[:, 0:1] + circles[:, 2:3] * t
+        below = self._below_ground(circles, x) > 0
+        rows = np.arange(len(circles))
+        first = np.argmax(below, axis=1)
+        last = ARC_SAMPLES - 1 - np.argmax(below[:, ::-1], axis=1)
+        # Both ends of the arc must be in the air, so the circle enters and leaves the ground
+        valid = below.any(axis=1) & (first > 0) & (last < ARC_SAMPLES - 1)
+        first, last = np.clip(first, 1, None), np.clip(last, None, ARC_SAMPLES - 2)
+
+        def bisect(outside, inside):
+            for _ in range(BISECTIONS):
+                middle = (outside + inside) / 2
+                is_below = self._below_ground(circles, middle[:, None])[:, 0] > 0
+                inside = np.where(is_below, middle, inside)
+                outside = np.where(is_below, outside, middle)
+            return (outside + inside) / 2
+
+        entry = bisect(x[rows, first - 1], x[rows, first])
+        exit_ = bisect(x[rows, last + 1], x[rows, last])
+        return np.where(valid, entry, np.nan), np.where(valid, exit_, np.nan)
+
+    def factors_of_safety(self, circles, slices=DEFAULT_SLICES):
+        """
+        ``(fs, entry, exit)`` for an ``(n, 3)`` array of circles ``(xc, yc,
+        radius)``, every slice of every circle at once.
+        """
+        circles = np.asarray(circles, dtype=np.float64).reshape(-1, 3)
+        entry, exit_ = self._crossings(circles)
+        valid = np.isfinite(entry)
+        entry, exit_ = np.where(valid, entry, 0.0), np.where(valid, exit_, 1.0)
+        xc, yc, r = circles[:, 0:1], circles[:, 1:2], circles[:, 2:3]
+
+        width = ((exit_ - entry) / slices)[:, None]
+        x = entry[:, None] + (np.arange(slices) + 0.5) * width
+        sin_alpha = np.clip((x - xc) / r, -1, 1)
+        cos_alpha = np.sqrt(1 - sin_alpha ** 2)
+        base = yc - r * cos_alpha
+        top = np.maximum(self.ground(x), base)
+
+        weight = width * (depth_integral(self.height - base, self.bottoms, self.unit_weights, self.table)
+                          - depth_integral(self.height - top, self.bottoms, self.unit_weights, self.table))
+        layer = np.minimum(np.searchsorted(self.bottoms, np.maximum(self.height - base, 0), side='right'),
+                           len(self.bottoms) - 1)
+        in_soil = top > base
+        cohesion = np.where(in_soil, self.cohesion[layer], 0.0) * width
+        tan_phi = self.tan_phi[layer]
+        pore_pressure = WATER_UNIT_WEIGHT * np.maximum(np.minimum(self.water_level, top) - base, 0)
+        normal = np.maximum(weight - pore_pressure * width, 0)
+
+        driving = np.sum(weight * sin_alpha, axis=1)
+        valid &= driving > 0
+        driving = np.where(valid, driving, 1.0)
+        resisting = cohesion + normal * tan_phi
+        fs = np.ones(len(circles))
+        # Each circle stops iterating once it converges, so results do not depend on the batch
+        active = valid.copy()
+        for _ in range(MAX_ITERATIONS):
+            m_alpha = cos_alpha + sin_alpha * tan_phi / np.maximum(fs, TOLERANCE)[:, None]
+            updated = np.sum(resisting / np.maximum(m_alpha, MIN_M_ALPHA), axis=1) / driving
+            change = np.abs(updated - fs)
+            fs = np.where(active, updated, fs)
+            active &= change >= TOLERANCE
+            if not active.any():
+                break
+        m_alpha = cos_alpha + sin_alpha * tan_phi / np.maximum(fs, TOLERANCE)[:, None]
+        valid &= np.all((m_alpha >= MIN_M_ALPHA) | ~in_soil, axis=1) & (fs > 0)
+        return np.where(valid, fs, np.inf), np.where(valid, entry, np.nan), np.where(valid, exit_, np.nan)
+
+    def slices(self, circle, slices=DEFAULT_SLICES):
+        """Slice midpoints, base and top elevations of one circle, for drawing it."""
+        xc, yc, r = circle
+        _, entry, exit_ = self.factors_of_safety([circle], slices)
+        if not np.isfinite(entry[0]):
+            return {'x': [], 'base': [], 'top': []}
+        x = entry[0] + (np.arange(slices) + 0.5) * (exit_[0] - entry[0]) / slices
+        base = yc - np.sqrt(np.maximum(r ** 2 - (x - xc) ** 2, 0))
+        return {'x': x.tolist(), 'base': base.tolist(), 'top': np.maximum(self.ground(x), base).tolist()}
+
+
+def circle_grid(x_range, y_range, tangent_range, counts):
+    """
+    ``(n, 3)`` circles from ``counts = (nx, ny, nt)`` centres and tangent
+    elevations; each circle reaches down to its tangent elevation.
+    """
+    nx, ny, nt = counts
+    xc, yc, tangent = np.meshgrid(np.linspace(*x_range, nx), np.linspace(*y_range, ny),
+                                  np.linspace(*tangent_range, nt), indexing='ij')
+    circles = np.column_stack([xc.ravel(), yc.ravel(), (yc - tangent).ravel()])
+    return circles[circles[:, 2] > 0]
+
+
+def default_search_box(section):
+    """Centres above the slope face, circles reaching from mid-height down to H/2 below the toe."""
+    h, crest = section.height, section.crest
+    return (-0.25 * h, crest + 0.25 * h), (h * 1.1, h * 2.5 + crest * 0.5), (-0.5 * h, 0.5 * h)
+
+
+def available_workers():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def configured_workers(setting):
+    """Search processes for a ``GEOTECH_SLOPE_WORKERS`` value, never more than the available cores."""
+    return max(1, min(setting or DEFAULT_WORKERS, available_workers()))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def process_pool(workers):
+    """
+    A persistent pool of ``workers`` spawned processes, shared by every
+    search (and thread) asking for that many. Pools are created under a
+    lock and never replaced, since another request may be using one.
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return pool
+
+
+def _evaluate(section, circles, slices):
+    return section.factors_of_safety(circles, slices)
+
+
+def evaluate_circles(section, circles, slices=DEFAULT_SLICES, workers=1):
+    """``factors_of_safety`` of ``circles``, fanned out over ``workers`` processes for large grids."""
+    if workers <= 1 or len(circles) < PARALLEL_MIN_CIRCLES:
+        return section.factors_of_safety(circles, slices)
+    chunks = np.array_split(circles, workers * CHUNKS_PER_WORKER)
+    results = list(process_pool(workers).map(_evaluate, [section] * len(chunks), chunks, [slices] * len(chunks)))
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def search(section, grid=DEFAULT_GRID, refinements=DEFAULT_REFINEMENTS, slices=DEFAULT_SLICES, box=None,
+           workers=1):
+    """
+    Grid-then-refine search for the critical circle. Each refinement
+    centres a grid of the same size on the best circle so far, over a
+    quarter of the previous spacing span. Returns the minimum factor of
+    safety, the critical circle and the search throughput.
+    """
+    x_range, y_range, tangent_range = box or default_search_box(section)
+    started = time.perf_counter()
+    evaluated = 0
+    best = (np.inf, None, None, None)
+    for stage in range(refinements + 1):
+        circles = circle_grid(x_range, y_range, tangent_range, grid)
+        fs, entry, exit_ = evaluate_circles(section, circles, slices, workers)
+        evaluated += len(circles)
+        i = int(np.argmin(fs)) if len(fs) else 0
+        if len(fs) and fs[i] < best[0]:
+            best = (float(fs[i]), circles[i], float(entry[i]), float(exit_[i]))
+        if best[1] is None:
+            break
+        xc, yc, r = best[1]
+        spans = [(high - low) / 4 for low, high in (x_range, y_range, tangent_range)]
+        x_range = (xc - spans[0], xc + spans[0])
+        y_range = (yc - spans[1], yc + spans[1])
+        tangent_range = (yc - r - spans[2], yc - r + spans[2])
+    elapsed = time.perf_counter() - started
+
+    fs, circle, entry, exit_ = best
+    return {
+        'factor_of_safety': fs if circle is not None else None,
+        'circle': None if circle is None else {
+            'x': float(circle[0]), 'y': float(circle[1]), 'radius': float(circle[2]),
+            'entry': entry, 'exit': exit_,
+        },
+        'slices': section.slices(circle, slices) if circle is not None else None,
+        'circles': evaluated,
+        'seconds': elapsed,
+        'circles_per_second': evaluated / elapsed if elapsed > 0 else float('inf'),
+        'workers': workers,
+    }
+
+
+def model_section(model, height, angle, water_depth=None):
+    """A SlopeSection from ``model``'s layers, groundwater at ``model.npv`` unless given."""
+    bottoms, soil = layer_properties(model, SOIL_FIELDS)
+    if not len(bottoms):
+        raise ValueError('The model has no layers.')
+    return SlopeSection(height, angle, bottoms, soil, model.npv if water_depth is None else water_depth)
@@ -0,0 +1,129 @@
+"""
+Dashboard statistics.
+
+Per-project row counts live in the ``ProjectStats`` rollup. Writes that add
+or remove models, layers or CPT tests adjust it with ``F()`` increments in
+their own transaction, so reading the stats never touches the layer or CPT
+tables. Projects without a rollup row yet (created before it existed, or
+never saved through the API) are backfilled on first read from
+``ProjectQuerySet.with_counts()``, whose counts are independent subqueries
+rather than one join of models x CPT tests x layers.
+
+Writes that bypass the API (the admin, the shell, queryset ``update()`` or
+``delete()``) do not adjust the rollup. ``reconcile_project_stats``
+recounts from the tables and corrects the rows that drifted; run it
+periodically with ``manage.py reconcile_stats``.
+
+"Recent activity" is a time window and cannot be rolled up; it is one
+indexed count with the cutoff computed in Python, so it works on any
+database backend.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .ingest import chunked
+from .models import Project, ProjectStats, GeotechnicalModel
+
+STAT_FIELDS = ('models_count', 'cpt_tests_count', 'layers_count')
+RECENT_ACTIVITY_WINDOW = timedelta(days=1)
+RECONCILE_BATCH_SIZE = 1000
+
+
+def backfill_project_stats(projects):
+    """Create rollup rows for the projects in ``projects`` that have none."""
+    missing = projects.filter(stats__isnull=True).with_counts()
+    ProjectStats.objects.bulk_create([
+        ProjectStats(project_id=project.id, **{field: getattr(project, field) for field in STAT_FIELDS})
+        for project in missing
+    ], ignore_conflicts=True)
+
+
+def reconcile_project_stats(projects, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Recount ``projects`` from the tables, ``batch_size`` at a time, and
+    rewrite the rollup rows that disagree (creating missing ones).
+    Returns the number of rows corrected.
+    """
+    corrected = 0
+    counts = projects.order_by('id').with_counts().values_list('id', *STAT_FIELDS)
+    for batch in chunked(counts.iterator(chunk_size=batch_size), batch_size):
+        current = ProjectStats.objects.in_bulk([row[0] for row in batch], field_name='project_id')
+        now = timezone.now()
+        stale, missing = [], []
+        for project_id, *values in batch:
+            stats = current.get(project_id)
+            if stats is None:
+                missing.append(ProjectStats(project_id=project_id, **dict(zip(STAT_FIELDS, values))))
+            elif [getattr(stats, field) for field in STAT_FIELDS] != values:
+                for field, value in zip(STAT_FIELDS, values):
+                    setattr(stats, field, value)
+                stats.updated_at = now
+                stale.append(stats)
+        ProjectStats.objects.bulk_update(stale, [*STAT_FIELDS, 'updated_at'])
+        ProjectStats.objects.bulk_create(missing, ignore_conflicts=True)
+        corrected += len(stale) + len(missing)
+    return corrected
+
+
+def adjust_project_stats(project_id, **deltas):
+    """
+    Apply count deltas (``models_count=1, layers_count=-2`` ...) after a
+    write. Call it once the rows are written: a project without a rollup
+    row is backfilled from the tables instead, which already include them.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = ProjectStats.objects.filter(project_id=project_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        backfill_project_stats(Project.objects.filter(id=project_id))
+
+
+def _net(changes):
+    return changes['created'] - changes['deleted'] if changes else 0
+
+
+def adjust_for_changes(project_id, layers=None, cpt_tests=None, models=0):
+    """``adjust_project_stats`` from the change counts returned by sync_layers/sync_cpt_tests."""
+    adjust_project_stats(project_id, models_count=models, layers_count=_net(layers),
+                         cpt_tests_count=_net(cpt_tests))
+
+
+def project_stats(user, project_id):
+    """``{'totalCptTests', 'totalSoilLayers'}`` for one of ``user``'s projects, or None."""
+    projects = Project.objects.for_user(user).filter(id=project_id)
+    row = ProjectStats.objects.filter(project__in=projects).values(*STAT_FIELDS).first()
+    if row is None:
+        backfill_project_stats(projects)
+        row = ProjectStats.objects.filter(project__in=projects).values(*STAT_FIELDS).first()
+        if row is None:
+            return None
+    return {
+        'totalCptTests': row['cpt_tests_count'],
+        'totalSoilLayers': row['layers_count'],
+    }
+
+
+def user_stats(user):
+    """Dashboard totals over all of ``user``'s projects, in a fixed number of queries."""
+    backfill_project_stats(Project.objects.for_user(user))
+    totals = ProjectStats.objects.filter(project__user=user).aggregate(
+        total_projects=Count('pk'),
+        total_cpt_tests=Coalesce(Sum('cpt_tests_count'), 0),
+        total_soil_layers=Coalesce(Sum('layers_count'), 0),
+    )
+    recent_activity = GeotechnicalModel.objects.filter(
+        project__user=user,
+        created_at__gte=timezone.now() - RECENT_ACTIVITY_WINDOW,
+    ).count()
+    return {
+        'totalProjects': totals['total_projects'],
+        'totalCptTests': totals['total_cpt_tests'],
+        'totalSoilLayers': totals['total_soil_layers'],
+        'recentActivity': recent_activity,
+    }
@@ -0,0 +1,424 @@
+"""
+Storage backends for CPT soundings.
+
+A CptTest keeps its samples either as one ``CptData`` row per sample
+(``storage='rows'``) or as four packed little-endian float arrays on a
+``PackedSounding`` (``storage='packed'``). Everything that reads or writes
+samples goes through this module so callers never care which one is used.
+
+Samples are always read in depth order, backed by the ``(cpt_test, depth)``
+index on CptData; packed channels are stored sorted by depth. ``read_depth_window`` reads a depth slice decimated to a
+point budget, using the pyramid from ``decimation``. Full writes build the
+pyramid from the samples they already hold; incremental writes drop it and
+the next level-of-detail read rebuilds it.
+
+Writes also record ``CptTest.samples_digest``, a SHA-256 of the samples as
+stored (in the stored dtype and in depth order, whatever order they were
+sent in), which derived-data caches use as the sounding's content version.
+Incremental writes (appends, depth-window replacements) chain the digest
+instead: the new digest hashes the old one plus the change, so their cost
+stays proportional to the increment.
+"""
+import hashlib
+
+import numpy as np
+from django.db import models
+
+from .decimation import (DEFAULT_MAX_POINTS, PYRAMID_BASE_BIN, PYRAMID_MIN_BINS, build_pyramid,
+                         choose_level, decimate, depth_slice, unpack_level)
+from .ingest import CPT_CHANNELS, bulk_create_samples
+from .models import CptTest, CptData, PackedSounding, PyramidLevel, DerivedSeries
+
+PREFETCH_CHUNK_SIZE = 5000
+
+# Shapes of the nested ``data`` representation: a list of sample objects,
+# one list per channel, or one little-endian byte string per channel
+SAMPLE_ROWS = 'rows'
+SAMPLE_COLUMNS = 'columns'
+SAMPLE_BINARY = 'binary'
+
+NUMPY_DTYPES = {
+    'f4': np.dtype('<f4'),
+    'f8': np.dtype('<f8'),
+}
+
+
+def pack_samples(samples, dtype='f8'):
+    """
+    Turn ``(depth, qc, fs, u2)`` tuples, in any order, into one bytes object
+    per channel. Samples are packed in depth order (stable for equal
+    depths), the order row storage reads them in.
+    """
+    array = np.asarray(samples, dtype=NUMPY_DTYPES[dtype]).reshape(-1, len(CPT_CHANNELS))
+    array = array[np.argsort(array[:, 0], kind='stable')]
+    return {
+        channel: np.ascontiguousarray(array[:, i]).tobytes()
+        for i, channel in enumerate(CPT_CHANNELS)
+    }
+
+
+def packed_fields(samples, dtype='f8'):
+    """PackedSounding field values for ``samples``: the packed channels plus their count and bottom."""
+    channels = pack_samples(samples, dtype)
+    depth = np.frombuffer(channels['depth'], dtype=NUMPY_DTYPES[dtype])
+    return {
+        'dtype': dtype,
+        'sample_count': len(depth),
+        'max_depth': float(depth[-1]) if len(depth) else None,
+        **channels,
+    }
+
+
+def unpack_channels(packed):
+    """Read-only NumPy views over a PackedSounding's buffers, no copy."""
+    dtype = NUMPY_DTYPES[packed.dtype]
+    return {
+        channel: np.frombuffer(getattr(packed, channel), dtype=dtype)
+        for channel in CPT_CHANNELS
+    }
+
+
+def read_channels(cpt_test):
+    """Return ``{'depth': array, 'qc': array, 'fs': array, 'u2': array}`` for a sounding."""
+    if cpt_test.storage == CptTest.STORAGE_PACKED:
+        try:
+            return unpack_channels(cpt_test.packed)
+        except PackedSounding.DoesNotExist:
+            return {channel: np.empty(0) for channel in CPT_CHANNELS}
+    rows = list(cpt_test.data.order_by('depth', 'id').values_list(*CPT_CHANNELS))
+    array = np.array(rows, dtype=np.float64).reshape(-1, len(CPT_CHANNELS))
+    return {channel: array[:, i] for i, channel in enumerate(CPT_CHANNELS)}
+
+
+def read_samples(cpt_test):
+    """The stored samples as a list of ``(depth, qc, fs, u2)`` tuples."""
+    channels = read_channels(cpt_test)
+    return list(zip(*(channels[channel].tolist() for channel in CPT_CHANNELS)))
+
+
+def stored_dtype(cpt_test, dtype=None):
+    """
+    The dtype ``cpt_test`` keeps samples in when written as ``dtype``: rows
+    are always f8, and a packed sounding written without one keeps the dtype
+    it has (f8 when it has none yet).
+    """
+    if cpt_test.storage != CptTest.STORAGE_PACKED:
+        return 'f8'
+    if dtype is None:
+        dtype = PackedSounding.objects.filter(cpt_test=cpt_test).values_list('dtype', flat=True).first()
+    return dtype or 'f8'
+
+
+def samples_hasher(cpt_test, dtype='f8'):
+    """
+    A hashlib object primed for ``cpt_test``'s storage mode. Feed it
+    ``(depth, qc, fs, u2)`` rows in depth order with update_samples_digest,
+    passing the same stored_dtype; one call may take them in any order.
+    """
+    return hashlib.sha256(f'{cpt_test.storage}:{stored_dtype(cpt_test, dtype)}:'.encode())
+
+
+def update_samples_digest(hasher, samples, dtype='f8'):
+    """
+    Hash samples as stored: in ``dtype`` and in depth order (stable for
+    equal depths), so a digest computed from what was sent matches one
+    recomputed from what was read back.
+    """
+    array = np.asarray(samples, dtype=NUMPY_DTYPES[dtype]).reshape(-1, len(CPT_CHANNELS))
+    hasher.update(array[np.argsort(array[:, 0], kind='stable')].tobytes())
+
+
+def set_samples_digest(cpt_test, hasher):
+    cpt_test.samples_digest = hasher.hexdigest()
+    CptTest.objects.filter(id=cpt_test.id).update(samples_digest=cpt_test.samples_digest)
+
+
+def ensure_samples_digest(cpt_test):
+    """Digest for soundings written before digests were recorded."""
+    if not cpt_test.samples_digest:
+        channels = read_channels(cpt_test)
+        dtype = stored_dtype(cpt_test)
+        hasher = samples_hasher(cpt_test, dtype)
+        update_samples_digest(hasher, np.column_stack([channels[c] for c in CPT_CHANNELS]), dtype)
+        set_samples_digest(cpt_test, hasher)
+    return cpt_test.samples_digest
+
+
+def write_samples(cpt_test, samples, dtype='f8'):
+    """Store validated samples on a CptTest that has none yet, honouring its storage mode."""
+    hasher = samples_hasher(cpt_test, dtype)
+    update_samples_digest(hasher, samples, stored_dtype(cpt_test, dtype))
+    set_samples_digest(cpt_test, hasher)
+    build_sample_pyramid(cpt_test, samples)
+    if cpt_test.storage == CptTest.STORAGE_PACKED:
+        PackedSounding.objects.update_or_create(cpt_test=cpt_test, defaults=packed_fields(samples, dtype))
+        return len(samples)
+    return bulk_create_samples(cpt_test, samples)
+
+
+def clear_samples(cpt_test):
+    """Drop whatever a CptTest currently stores, and anything derived from it."""
+    CptData.objects.filter(cpt_test=cpt_test).delete()
+    DerivedSeries.objects.filter(cpt_test=cpt_test).delete()
+    PyramidLevel.objects.filter(cpt_test=cpt_test).delete()
+    if cpt_test.storage != CptTest.STORAGE_PACKED:
+        PackedSounding.objects.filter(cpt_test=cpt_test).delete()
+
+
+def replace_samples(cpt_test, samples, dtype='f8'):
+    """Drop whatever a CptTest currently stores, in either backend, and write ``samples``."""
+    clear_samples(cpt_test)
+    return write_samples(cpt_test, samples, dtype)
+
+
+class SampleRangeError(ValueError):
+    pass
+
+
+def _chain_samples_digest(cpt_test, operation, samples, dtype='f8'):
+    hasher = hashlib.sha256(f'{cpt_test.samples_digest}:{operation}:'.encode())
+    update_samples_digest(hasher, samples, dtype)
+    set_samples_digest(cpt_test, hasher)
+    DerivedSeries.objects.filter(cpt_test=cpt_test).delete()
+    PyramidLevel.objects.filter(cpt_test=cpt_test).delete()
+
+
+def max_depth(cpt_test):
+    """
+    Deepest stored sample, or None. One index seek for row storage; packed
+    soundings record it on the PackedSounding, so no channel is decoded.
+    """
+    if cpt_test.storage == CptTest.STORAGE_PACKED:
+        return PackedSounding.objects.filter(cpt_test=cpt_test).values_list('max_depth', flat=True).first()
+    return cpt_test.data.aggregate(max_depth=models.Max('depth'))['max_depth']
+
+
+def append_samples(cpt_test, samples):
+    """
+    Add samples below the current bottom of a sounding, as a live feed
+    does while the cone advances. Row storage inserts only the new rows,
+    so its cost follows the size of the increment.
+
+    Packed storage checks the bottom against ``PackedSounding.max_depth``
+    and never decodes the existing samples, but each channel is a single
+    BLOB that is rewritten with the new bytes appended: the cost of a
+    packed append grows with the whole sounding. Live feeds belong in row
+    storage; pack the sounding once it is complete.
+    """
+    if not samples:
+        return 0
+    bottom = max_depth(cpt_test)
+    if bottom is not None and min(sample[0] for sample in samples) <= bottom:
+        raise SampleRangeError(f'Appended samples must be deeper than the current bottom ({bottom} m).')
+    ensure_samples_digest(cpt_test)
+
+    dtype = 'f8'
+    if cpt_test.storage == CptTest.STORAGE_PACKED:
+        packed = PackedSounding.objects.filter(cpt_test=cpt_test).first()
+        if packed is None:
+            write_samples(cpt_test, samples)
+            return len(samples)
+        dtype = packed.dtype
+        fields = packed_fields(samples, dtype)
+        for channel in CPT_CHANNELS:
+            setattr(packed, channel, bytes(getattr(packed, channel)) + fields[channel])
+        packed.sample_count += fields['sample_count']
+        packed.max_depth = fields['max_depth']
+        packed.save()
+    else:
+        bulk_create_samples(cpt_test, samples)
+    _chain_samples_digest(cpt_test, 'append', samples, dtype)
+    return len(samples)
+
+
+def replace_depth_range(cpt_test, depth_from, depth_to, samples):
+    """
+    Replace the samples with ``depth_from <= depth <= depth_to`` by
+    ``samples``, which must lie inside that window. Returns
+    ``(deleted, inserted)``.
+    """
+    if depth_from > depth_to:
+        raise SampleRangeError('depth_from must not be greater than depth_to.')
+    if any(not depth_from <= sample[0] <= depth_to for sample in samples):
+        raise SampleRangeError('Replacement samples must lie inside the depth window.')
+    ensure_samples_digest(cpt_test)
+
+    if cpt_test.storage == CptTest.STORAGE_PACKED:
+        packed = PackedSounding.objects.filter(cpt_test=cpt_test).first()
+        dtype = packed.dtype if packed else 'f8'
+        channels = read_channels(cpt_test)
+        keep = (channels['depth'] < depth_from) | (channels['depth'] > depth_to)
+        merged = np.concatenate([
+            np.column_stack([channels[channel][keep] for channel in CPT_CHANNELS]),
+            np.asarray(samples, dtype=np.float64).reshape(-1, len(CPT_CHANNELS)),
+        ])
+        merged = merged[np.argsort(merged[:, 0], kind='stable')]
+        PackedSounding.objects.update_or_create(cpt_test=cpt_test, defaults=packed_fields(merged, dtype))
+        deleted = int((~keep).sum())
+    else:
+        dtype = 'f8'
+        deleted, _ = cpt_test.data.filter(depth__gte=depth_from, depth__lte=depth_to).delete()
+        bulk_create_samples(cpt_test, samples)
+    _chain_samples_digest(cpt_test, f'replace:{depth_from!r}:{depth_to!r}', samples, dtype)
+    return deleted, len(samples)
+
+
+def build_sample_pyramid(cpt_test, samples):
+    """Pyramid for freshly written ``(depth, qc, fs, u2)`` samples, in any order."""
+    if len(samples) < PYRAMID_BASE_BIN * PYRAMID_MIN_BINS:
+        return []
+    array = np.asarray(samples, dtype=np.float64).reshape(-1, len(CPT_CHANNELS))
+    array = array[np.argsort(array[:, 0], kind='stable')]
+    return build_pyramid(cpt_test, {channel: array[:, i] for i, channel in enumerate(CPT_CHANNELS)})
+
+
+def _window_rows(cpt_test, depth_from, depth_to):
+    rows = cpt_test.data.all()
+    if depth_from is not None:
+        rows = rows.filter(depth__gte=depth_from)
+    if depth_to is not None:
+        rows = rows.filter(depth__lte=depth_to)
+    return rows
+
+
+def _window_count(cpt_test, depth_from, depth_to):
+    if cpt_test.storage != CptTest.STORAGE_PACKED:
+        return _window_rows(cpt_test, depth_from, depth_to).count()
+    # Only the depth channel is needed to count the window
+    packed = PackedSounding.objects.filter(cpt_test=cpt_test).values_list('dtype', 'depth').first()
+    if packed is None:
+        return 0
+    depth = np.frombuffer(packed[1], dtype=NUMPY_DTYPES[packed[0]])
+    return len(depth_slice({channel: depth for channel in CPT_CHANNELS}, depth_from, depth_to)['depth'])
+
+
+def _current_levels(cpt_test):
+    """Metadata of an up-to-date pyramid, rebuilding it when missing or stale."""
+    digest = ensure_samples_digest(cpt_test)
+    levels = list(cpt_test.pyramid.values_list('bin_size', 'sample_count', 'source_count', 'samples_digest'))
+    if not levels or any(level[3] != digest for level in levels):
+        levels = [
+            (level.bin_size, level.sample_count, level.source_count, level.samples_digest)
+            for level in build_pyramid(cpt_test, read_channels(cpt_test))
+        ]
+    return [level[:3] for level in levels]
+
+
+def read_depth_window(cpt_test, depth_from=None, depth_to=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Samples with ``depth_from <= depth <= depth_to`` (either bound may be
+    None), decimated to about ``max_points``. Returns ``(channels, bin_size,
+    window_count)`` where ``bin_size`` is 1 for raw samples and
+    ``window_count`` is the number of raw samples in the window.
+
+    Small windows are read raw, through the depth index for row storage;
+    windows too large to decimate cheaply on the fly are served from the
+    coarsest pyramid level that still fits the budget.
+    """
+    window_count = _window_count(cpt_test, depth_from, depth_to)
+    if window_count <= max_points or window_count < PYRAMID_BASE_BIN * PYRAMID_MIN_BINS:
+        if cpt_test.storage == CptTest.STORAGE_PACKED:
+            window = depth_slice(read_channels(cpt_test), depth_from, depth_to)
+        else:
+            rows = list(_window_rows(cpt_test, depth_from, depth_to)
+                        .order_by('depth', 'id').values_list(*CPT_CHANNELS))
+            array = np.array(rows, dtype=np.float64).reshape(-1, len(CPT_CHANNELS))
+            window = {channel: array[:, i] for i, channel in enumerate(CPT_CHANNELS)}
+        channels, bin_size = decimate(window, max_points)
+        return channels, bin_size, window_count
+
+    bin_size = choose_level(_current_levels(cpt_test), window_count, max_points)[0]
+    level = PyramidLevel.objects.get(cpt_test=cpt_test, bin_size=bin_size)
+    channels, extra = decimate(depth_slice(unpack_level(level), depth_from, depth_to), max_points)
+    return channels, bin_size * extra, window_count
+
+
+def prefetch_samples(cpt_tests):
+    """
+    Load the samples of every row-stored test in ``cpt_tests`` with one
+    query and attach them as ``prefetched_samples``, a list of
+    ``(id, depth, qc, fs, u2)`` tuples in depth order. Tests that already
+    have them are skipped.
+    """
+    pending = {
+        cpt_test.id: cpt_test for cpt_test in cpt_tests
+        if cpt_test.storage != CptTest.STORAGE_PACKED and not hasattr(cpt_test, 'prefetched_samples')
+    }
+    if not pending:
+        return
+    for cpt_test in pending.values():
+        cpt_test.prefetched_samples = []
+    rows = (CptData.objects.filter(cpt_test_id__in=pending)
+            .order_by('cpt_test_id', 'depth', 'id')
+            .values_list('cpt_test_id', 'id', *CPT_CHANNELS))
+    for cpt_test_id, *sample in rows.iterator(chunk_size=PREFETCH_CHUNK_SIZE):
+        pending[cpt_test_id].prefetched_samples.append(tuple(sample))
+
+
+def read_channels_batch(cpt_tests):
+    """
+    ``read_channels`` for many soundings, in order, with at most two
+    queries: one for the row-stored tests, like prefetch_samples but
+    grouped into arrays in NumPy (tests that already carry
+    ``prefetched_samples`` reuse them), and one for the packed ones.
+    """
+    rows = [cpt_test for cpt_test in cpt_tests if cpt_test.storage != CptTest.STORAGE_PACKED]
+    pending = [cpt_test.id for cpt_test in rows if not hasattr(cpt_test, 'prefetched_samples')]
+    arrays = {}
+    if pending:
+        values = list(CptData.objects.filter(cpt_test_id__in=pending)
+                      .order_by('cpt_test_id', 'depth', 'id').values_list('cpt_test_id', *CPT_CHANNELS))
+        array = np.array(values, dtype=np.float64).reshape(-1, len(CPT_CHANNELS) + 1)
+        ids, starts = np.unique(array[:, 0], return_index=True)
+        arrays = dict(zip(ids.astype(np.int64).tolist(), np.split(array[:, 1:], starts[1:])))
+    for cpt_test in rows:
+        if hasattr(cpt_test, 'prefetched_samples'):
+            arrays[cpt_test.id] = np.array([sample[1:] for sample in cpt_test.prefetched_samples],
+                                           dtype=np.float64).reshape(-1, len(CPT_CHANNELS))
+
+    packed_ids = [cpt_test.id for cpt_test in cpt_tests if cpt_test.storage == CptTest.STORAGE_PACKED]
+    packed = {record.cpt_test_id: record for record in PackedSounding.objects.filter(cpt_test_id__in=packed_ids)} \
+        if packed_ids else {}
+    empty = np.empty((0, len(CPT_CHANNELS)))
+    batch = []
+    for cpt_test in cpt_tests:
+        if cpt_test.id in packed:
+            batch.append(unpack_channels(packed[cpt_test.id]))
+        else:
+            array = arrays.get(cpt_test.id, empty)
+            batch.append({channel: array[:, i] for i, channel in enumerate(CPT_CHANNELS)})
+    return batch
+
+
+def row_dicts(rows):
+    """The nested ``data`` representation from ``(id, depth, qc, fs, u2)`` tuples."""
+    return [
+        {'id': sample_id, 'depth': depth, 'qc': qc, 'fs': fs, 'u2': u2}
+        for sample_id, depth, qc, fs, u2 in rows
+    ]
+
+
+def sample_columns(ids, channels, binary=False):
+    """
+    The columnar ``data`` representation: ``{'id': [...], 'depth': [...], ...}``.
+    With ``binary`` each column is raw little-endian bytes (int64 ids,
+    float64 channels) that a client can view as a typed array.
+    """
+    if binary:
+        return {
+            'id': np.asarray(ids, dtype='<i8').tobytes(),
+            **{channel: np.asarray(channels[channel], dtype='<f8').tobytes() for channel in CPT_CHANNELS},
+        }
+    return {'id': list(ids), **{channel: np.asarray(channels[channel]).tolist() for channel in CPT_CHANNELS}}
+
+
+def sample_dicts(channels):
+    """
+    The nested ``data`` representation for packed soundings. Packed samples
+    have no row ids, so ``id`` is the 1-based sample position.
+    """
+    columns = [channels[channel].tolist() for channel in CPT_CHANNELS]
+    return [
+        {'id': i, 'depth': depth, 'qc': qc, 'fs': fs, 'u2': u2}
+        for i, (depth, qc, fs, u2) in enumerate(zip(*columns), start=1)
+    ]
@@ -0,0 +1,117 @@
+"""
+In-situ vertical stresses from a model's layer stack.
+
+Layers are stacked from the ground surface down by ``Layer.position`` (the
+order they were saved in); ``Layer.depth`` holds the layer *thickness* (the
+layer table edits it as "Debljina"). The last layer extends indefinitely. ``GeotechnicalModel.npv``
+is the groundwater depth below the surface. Depths are in m, unit weights in
+kN/m3 and stresses in kPa.
+"""
+import numpy as np
+
+WATER_UNIT_WEIGHT = 9.81
+
+
+def layer_stack(model):
+    """``(bottoms, unit_weights)`` arrays for a model's layers in stacking order."""
+    bottoms, properties = layer_properties(model, ['unit_weight'])
+    return bottoms, properties['unit_weight']
+
+
+def layer_properties(model, fields):
+    """``(bottoms, {field: array})`` for a model's layers in stacking order; nulls become NaN."""
+    rows = list(model.layers.order_by('position', 'id').values_list('depth', *fields))
+    if not rows:
+        return np.empty(0), {field: np.empty(0) for field in fields}
+    columns = np.array(rows, dtype=np.float64).T
+    return np.cumsum(np.maximum(columns[0], 0)), dict(zip(fields, columns[1:]))
+
+
+def layer_stacks(layers):
+    """``{model_id: (bottoms, unit_weights)}`` for a Layer queryset spanning several models, in one query."""
+    rows = layers.order_by('model_id', 'position', 'id').values_list('model_id', 'depth', 'unit_weight')
+    grouped = {}
+    for model_id, depth, unit_weight in rows:
+        grouped.setdefault(model_id, []).append((depth, unit_weight))
+    stacks = {}
+    for model_id, stack in grouped.items():
+        columns = np.array(stack, dtype=np.float64)
+        stacks[model_id] = np.cumsum(np.maximum(columns[:, 0], 0)), columns[:, 1]
+    return stacks
+
+
+def cumulative_table(bottoms, values):
+    """``(tops, at_top)``: layer tops and the integral of ``values`` down to each of them."""
+    tops = np.concatenate(([0.0], bottoms[:-1]))
+    at_top = np.concatenate(([0.0], np.cumsum((bottoms - tops) * values)[:-1]))
+    return tops, at_top
+
+
+def depth_integral(depth, bottoms, values, table=None):
+    """
+    Integral from the surface to ``depth`` of a property that is constant
+    within each layer (``values[i]`` down to ``bottoms[i]``, the last layer
+    extending indefinitely), for all depths at once. ``table`` is a
+    precomputed ``cumulative_table(bottoms, values)``.
+    """
+    depth = np.maximum(np.asarray(depth, dtype=np.float64), 0)
+    tops, at_top = cumulative_table(bottoms, values) if table is None else table
+    index = np.minimum(np.searchsorted(bottoms, depth, side='right'), len(bottoms) - 1)
+    return at_top[index] + values[index] * (depth - tops[index])
+
+
+def depth_average(top, bottom, bottoms, values):
+    """Thickness-weighted mean of a layered property between two depths (``bottom > top``)."""
+    top = np.asarray(top, dtype=np.float64)
+    return (depth_integral(bottom, bottoms, values) - depth_integral(top, bottoms, values)) / (bottom - top)
+
+
+def vertical_stresses(depth, bottoms, unit_weights, water_depth, default_unit_weight=18.0):
+    """
+    Total stress, hydrostatic pore pressure and effective stress at ``depth``.
+
+    Evaluated for all depths at once: each depth is located in the stack
+    with ``searchsorted`` and the stress is the cumulative weight of the
+    layers above plus the partial weight of its own layer.
+    """
+    depth = np.asarray(depth, dtype=np.float64)
+    if len(bottoms) == 0:
+        bottoms = np.array([np.inf])
+        unit_weights = np.array([default_unit_weight])
+    sigma_v0 = depth_integral(depth, bottoms, unit_weights)
+    u0 = WATER_UNIT_WEIGHT * np.maximum(np.maximum(depth, 0) - water_depth, 0)
+    return sigma_v0, u0, sigma_v0 - u0
+
+
+class StressProfile:
+    """
+    Cumulative stress table of one model, built once from its layers and
+    groundwater levels and then queried for any number of depths. Each
+    query is a ``searchsorted`` over the layer bottoms, so a million depths
+    cost a few milliseconds. Profiles are cached per model version (see
+    ``caching.cached_stress_profile``); any layer or groundwater change
+    bumps the version.
+    """
+    def __init__(self, bottoms, unit_weights, npv, npv_max, default_unit_weight=18.0):
+        if len(bottoms) == 0:
+            bottoms = np.array([np.inf])
+            unit_weights = np.array([default_unit_weight])
+        self.bottoms = np.asarray(bottoms, dtype=np.float64)
+        self.unit_weights = np.asarray(unit_weights, dtype=np.float64)
+        self.table = cumulative_table(self.bottoms, self.unit_weights)
+        self.water_depths = {'npv': npv, 'npv_max': npv_max}
+
+    @classmethod
+    def from_model(cls, model):
+        bottoms, unit_weights = layer_stack(model)
+        return cls(bottoms, unit_weights, model.npv, model.npv_max)
+
+    def stresses(self, depth, groundwater='npv'):
+        """
+        ``vertical_stresses`` at ``depth`` with the water table at the
+        model's ``npv`` (usual) or ``npv_max`` (highest expected) level.
+        """
+        depth = np.asarray(depth, dtype=np.float64)
+        sigma_v0 = depth_integral(depth, self.bottoms, self.unit_weights, self.table)
+        u0 = WATER_UNIT_WEIGHT * np.maximum(np.maximum(depth, 0) - self.water_depths[groundwater], 0)
+        return sigma_v0, u0, sigma_v0 - u0
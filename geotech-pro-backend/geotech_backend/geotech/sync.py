@@ -0,0 +1,110 @@
+"""
+Differential saves of a model's layers and CPT tests.
+
+Incoming items are matched to existing rows by ``id``. Matched rows are
+updated only when a value changed (one ``bulk_update`` for layers), items
+without a known id are inserted, and existing rows missing from the payload
+are deleted. Fields left out of a matched item keep their stored value.
+Layer ``position`` follows the payload order. CPT samples are only
+rewritten when their content digest differs from the stored
+``samples_digest``, so renaming a sounding does not touch its samples, and
+a CPT test sent without ``data`` keeps the samples it has.
+
+Each function returns a ``{'created', 'updated', 'deleted'}`` count dict;
+``sync_cpt_tests`` adds the sample rows written and deleted.
+"""
+from .models import Layer, CptTest, PackedSounding
+from .storage import (clear_samples, ensure_samples_digest, read_samples, samples_hasher, stored_dtype,
+                      update_samples_digest, write_samples)
+
+LAYER_SYNC_FIELDS = ['name', 'depth', 'unit_weight', 'cohesion', 'friction_angle',
+                     'compressibility', 'permeability', 'cpt_data', 'position']
+
+
+def sync_layers(model, layers_data):
+    existing = {layer.id: layer for layer in model.layers.all()}
+    changes = {'created': 0, 'updated': 0, 'deleted': 0}
+    to_create, to_update, seen = [], [], set()
+
+    for position, layer_data in enumerate(layers_data):
+        layer_data = {**layer_data, 'position': position}
+        layer = existing.get(layer_data.pop('id', None))
+        if layer is None or layer.id in seen:
+            to_create.append(Layer(model=model, **layer_data))
+            continue
+        seen.add(layer.id)
+        changed = False
+        for field, value in layer_data.items():
+            if getattr(layer, field) != value:
+                setattr(layer, field, value)
+                changed = True
+        if changed:
+            to_update.append(layer)
+
+    removed = [layer_id for layer_id in existing if layer_id not in seen]
+    if removed:
+        Layer.objects.filter(id__in=removed).delete()
+    if to_update:
+        Layer.objects.bulk_update(to_update, LAYER_SYNC_FIELDS)
+    if to_create:
+        Layer.objects.bulk_create(to_create)
+    changes.update(created=len(to_create), updated=len(to_update), deleted=len(removed))
+    return changes
+
+
+def _stored_sample_count(cpt_test):
+    if cpt_test.storage == CptTest.STORAGE_PACKED:
+        return PackedSounding.objects.filter(cpt_test=cpt_test).values_list('sample_count', flat=True).first() or 0
+    return cpt_test.data.count()
+
+
+def sync_cpt_tests(model, cpt_tests_data):
+    existing = {cpt_test.id: cpt_test for cpt_test in model.cpt_tests.all()}
+    changes = {'created': 0, 'updated': 0, 'deleted': 0, 'samples_written': 0, 'samples_deleted': 0}
+    seen = set()
+
+    for cpt_test_data in cpt_tests_data:
+        cpt_test_data = dict(cpt_test_data)
+        data = cpt_test_data.pop('data', None)
+        dtype = cpt_test_data.pop('dtype', None)
+        cpt_test = existing.get(cpt_test_data.pop('id', None))
+
+        if cpt_test is None or cpt_test.id in seen:
+            cpt_test = CptTest.objects.create(model=model, **cpt_test_data)
+            changes['created'] += 1
+            changes['samples_written'] += write_samples(cpt_test, data or [], dtype or 'f8')
+            continue
+        seen.add(cpt_test.id)
+
+        stored_digest = ensure_samples_digest(cpt_test)
+        previous = CptTest(id=cpt_test.id, storage=cpt_test.storage)
+        changed = [field for field, value in cpt_test_data.items() if getattr(cpt_test, field) != value]
+        for field in changed:
+            setattr(cpt_test, field, cpt_test_data[field])
+        if data is None and 'storage' in changed:
+            # Storage mode changed without new samples: carry the stored ones across
+            data = read_samples(previous)
+
+        samples_changed = False
+        if data is not None:
+            # ``dtype`` is write-only: a payload read back from the API omits it, so keep the stored one
+            dtype = stored_dtype(cpt_test, dtype)
+            hasher = samples_hasher(cpt_test, dtype)
+            update_samples_digest(hasher, data, dtype)
+            samples_changed = hasher.hexdigest() != stored_digest
+        if samples_changed:
+            changes['samples_deleted'] += _stored_sample_count(previous)
+            clear_samples(cpt_test)
+            changes['samples_written'] += write_samples(cpt_test, data, dtype)
+        if changed:
+            cpt_test.save(update_fields=changed)
+        if changed or samples_changed:
+            changes['updated'] += 1
+
+    removed = [cpt_test_id for cpt_test_id in existing if cpt_test_id not in seen]
+    for cpt_test_id in removed:
+        changes['samples_deleted'] += _stored_sample_count(existing[cpt_test_id])
+    if removed:
+        CptTest.objects.filter(id__in=removed).delete()
+    changes['deleted'] = len(removed)
+    return changes
@@ -0,0 +1,213 @@
+"""
+Synthetic datasets for load and scale testing, generated by
+``python manage.py generate_dataset``.
+
+The dataset is users x projects x objects x models, each model with a stack
+of layers and a set of CPT tests. Everything is derived from one seed:
+the layer stack of a model is drawn from the model's own generator and
+every sounding from ``default_rng([seed, model, cpt])``, so the same
+arguments always produce the same rows, in any order.
+
+Soundings follow the model's layer stack. Each layer is a soil type with a
+typical cone resistance, friction ratio and pore pressure ratio; qc grows
+with depth and carries smooth, spatially correlated noise, fs follows from
+the friction ratio, and u2 is hydrostatic below the water table plus the
+excess pore pressure fine-grained layers develop (qc in MPa, fs and u2 in
+kPa, like everything else).
+
+Rows go in with bulk inserts, one transaction per user. Packed soundings
+are stored through storage.write_samples. Row-stored samples skip model
+instances and go straight to ``executemany``, several times faster than
+``bulk_create`` at tens of millions of rows; their digests and
+decimation pyramids still come from the storage helpers, so every table
+holds exactly what the API would have written.
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from .ingest import CPT_CHANNELS, INSERT_CHUNK_SIZE, chunked
+from .models import Project, ProjectStats, Object, GeotechnicalModel, Layer, CptTest, CptData
+from .storage import (build_sample_pyramid, samples_hasher, set_samples_digest, update_samples_digest,
+                      write_samples)
+from .stress import WATER_UNIT_WEIGHT
+
+SoilType = namedtuple('SoilType', [
+    'name', 'qc', 'friction_ratio', 'pore_pressure_ratio', 'unit_weight',
+    'cohesion', 'friction_angle', 'compressibility', 'permeability',
+])
+
+# qc in MPa at ~10 m, friction ratio fs/qc, Bq = (u2 - u0) / (qt - sigma_v)
+SOIL_TYPES = (
+    SoilType('Sand', 12.0, 0.008, 0.0, 19.5, 0.0, 34.0, 0.00005, 1e-4),
+    SoilType('Silty sand', 6.0, 0.015, 0.05, 19.0, 0.0, 31.0, 0.0001, 1e-5),
+    SoilType('Silt', 3.0, 0.025, 0.2, 18.5, 5.0, 28.0, 0.0002, 1e-7),
+    SoilType('Clay', 1.2, 0.04, 0.45, 17.5, 15.0, 22.0, 0.0005, 1e-9),
+    SoilType('Peat', 0.4, 0.06, 0.6, 11.0, 5.0, 18.0, 0.002, 1e-6),
+)
+SOIL_WEIGHTS = (0.3, 0.2, 0.2, 0.22, 0.08)
+
+# Correlation length of the qc/fs noise, in metres
+NOISE_CORRELATION = 0.25
+
+DatasetSpec = namedtuple('DatasetSpec', [
+    'users', 'projects', 'objects', 'models', 'layers', 'cpt_tests', 'samples',
+    'depth', 'storage', 'seed', 'prefix',
+])
+
+
+def username(spec, index):
+    return f'{spec.prefix}-{spec.seed}-{index:04d}'
+
+
+def layer_stack(rng, count, depth):
+    """``count`` layers ``(soil type, thickness)`` covering ``depth`` metres."""
+    thicknesses = rng.dirichlet(np.full(count, 2.0)) * depth
+    soils = rng.choice(len(SOIL_TYPES), size=count, p=SOIL_WEIGHTS)
+    return [(SOIL_TYPES[soil], float(thickness)) for soil, thickness in zip(soils, thicknesses)]
+
+
+def _correlated_noise(rng, count, step):
+    """Unit-variance noise smoothed over NOISE_CORRELATION metres."""
+    width = max(int(NOISE_CORRELATION / step), 1)
+    kernel = np.exp(-np.arange(-3 * width, 3 * width + 1) ** 2 / (2.0 * width ** 2))
+    noise = np.convolve(rng.standard_normal(count + len(kernel) - 1), kernel, mode='valid')
+    return noise / (np.sqrt(np.sum(kernel ** 2)))
+
+
+def synthetic_profile(rng, stack, count, depth, water_depth):
+    """
+    A ``(count, 4)`` array of ``(depth, qc, fs, u2)`` samples through
+    ``stack``, evenly spaced down to ``depth`` metres.
+    """
+    step = depth / count
+    depths = np.arange(1, count + 1) * step
+    bottoms = np.cumsum([thickness for _, thickness in stack])
+    index = np.minimum(np.searchsorted(bottoms, depths), len(stack) - 1)
+    soils = [soil for soil, _ in stack]
+
+    def per_sample(field, spread=0.0):
+        values = np.array([getattr(soil, field) for soil in soils])
+        if spread:
+            # Lateral variation: the same layer differs from one sounding to the next
+            values = values * rng.lognormal(0.0, spread, size=len(values))
+        return values[index]
+
+    unit_weight = per_sample('unit_weight')
+    total_stress = np.cumsum(unit_weight) * step
+    hydrostatic = np.maximum(depths - water_depth, 0.0) * WATER_UNIT_WEIGHT
+
+    qc = per_sample('qc', spread=0.2) * np.sqrt(0.2 + depths / 10.0)
+    qc *= np.exp(0.15 * _correlated_noise(rng, count, step))
+    fs = qc * 1000.0 * per_sample('friction_ratio', spread=0.15)
+    fs *= np.exp(0.1 * _correlated_noise(rng, count, step))
+    excess = per_sample('pore_pressure_ratio') * np.maximum(qc * 1000.0 - total_stress, 0.0)
+    u2 = hydrostatic + excess
+    return np.column_stack([np.round(depths, 4), np.round(qc, 4), np.round(fs, 3), np.round(u2, 3)])
+
+
+def write_sample_rows(cpt_test, profile):
+    """storage.write_samples for a row-stored CptTest, inserting with ``executemany``."""
+    hasher = samples_hasher(cpt_test)
+    update_samples_digest(hasher, profile)
+    set_samples_digest(cpt_test, hasher)
+    build_sample_pyramid(cpt_test, profile)
+
+    meta = CptData._meta
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(meta.get_field(field).column) for field in ('cpt_test', *CPT_CHANNELS))
+    sql = f'INSERT INTO {quote(meta.db_table)} ({columns}) VALUES ({", ".join(["%s"] * (len(CPT_CHANNELS) + 1))})'
+    rows = ((cpt_test.id, *sample) for sample in profile.tolist())
+    with connection.cursor() as cursor:
+        for chunk in chunked(rows, INSERT_CHUNK_SIZE):
+            cursor.executemany(sql, chunk)
+
+
+def generate_dataset(spec, progress=None):
+    """
+    Create the dataset described by ``spec`` and return row counts per
+    table. ``progress(user_index, counts)`` is called after each user.
+    """
+    password = make_password(None)
+    counts = dict.fromkeys(['users', 'projects', 'objects', 'models', 'layers', 'cpt_tests', 'samples'], 0)
+    for user_index in range(spec.users):
+        with transaction.atomic():
+            _generate_user(spec, user_index, password, counts)
+        if progress is not None:
+            progress(user_index, counts)
+    return counts
+
+
+def _generate_user(spec, user_index, password, counts):
+    user = User.objects.create(username=username(spec, user_index), password=password)
+    projects = Project.objects.bulk_create([
+        Project(user=user, name=f'Project {p + 1}', description=f'Synthetic project, seed {spec.seed}',
+                status='active' if p % 4 else 'archived')
+        for p in range(spec.projects)
+    ])
+    objects = Object.objects.bulk_create([
+        Object(project=project, name=f'Object {o + 1}')
+        for project in projects for o in range(spec.objects)
+    ])
+
+    model_index = user_index * spec.projects * spec.objects * spec.models
+    models, stacks, model_seeds = [], [], []
+    for obj in objects:
+        for m in range(spec.models):
+            rng = np.random.default_rng([spec.seed, model_index])
+            stacks.append(layer_stack(rng, spec.layers, spec.depth))
+            model_seeds.append(model_index)
+            # Groundwater depth below the surface, and the highest expected level
+            npv = round(float(rng.uniform(0.5, 3.0)), 2)
+            npv_max = round(max(npv - float(rng.uniform(0.2, 1.0)), 0.0), 2)
+            models.append(GeotechnicalModel(project_id=obj.project_id, object=obj, user=user,
+                                            name=f'Model {m + 1}', npv=npv, npv_max=npv_max))
+            model_index += 1
+    models = GeotechnicalModel.objects.bulk_create(models)
+
+    Layer.objects.bulk_create([
+        Layer(model=model, name=soil.name, depth=round(thickness, 3), position=position,
+              unit_weight=soil.unit_weight, cohesion=soil.cohesion, friction_angle=soil.friction_angle,
+              compressibility=soil.compressibility, permeability=soil.permeability)
+        for model, stack in zip(models, stacks) for position, (soil, thickness) in enumerate(stack)
+    ], batch_size=INSERT_CHUNK_SIZE)
+    cpt_tests = CptTest.objects.bulk_create([
+        CptTest(model=model, name=f'CPT-{c + 1:02d}', storage=spec.storage)
+        for model in models for c in range(spec.cpt_tests)
+    ])
+
+    soundings = [(model_seed, stack, model.npv, c) for model_seed, stack, model in zip(model_seeds, stacks, models)
+                 for c in range(spec.cpt_tests)]
+    for cpt_test, (model_seed, stack, water_depth, c) in zip(cpt_tests, soundings if spec.samples else []):
+        rng = np.random.default_rng([spec.seed, model_seed, c])
+        profile = synthetic_profile(rng, stack, spec.samples, spec.depth, water_depth)
+        if spec.storage == CptTest.STORAGE_PACKED:
+            write_samples(cpt_test, profile)
+        else:
+            write_sample_rows(cpt_test, profile)
+
+    per_project = spec.objects * spec.models
+    ProjectStats.objects.bulk_create([
+        ProjectStats(project=project, models_count=per_project, cpt_tests_count=per_project * spec.cpt_tests,
+                     layers_count=per_project * spec.layers)
+        for project in projects
+    ])
+
+    counts['users'] += 1
+    counts['projects'] += len(projects)
+    counts['objects'] += len(objects)
+    counts['models'] += len(models)
+    counts['layers'] += len(models) * spec.layers
+    counts['cpt_tests'] += len(cpt_tests)
+    counts['samples'] += len(cpt_tests) * spec.samples
+
+
+def delete_dataset(prefix):
+    """Delete every user (and, by cascade, everything) generated under ``prefix``."""
+    users = User.objects.filter(username__startswith=f'{prefix}-')
+    # One DELETE for the samples instead of collecting millions of rows for the cascade
+    CptData.objects.filter(cpt_test__model__user__in=users).delete()
+    return users.delete()[0]
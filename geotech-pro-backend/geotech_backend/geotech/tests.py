@@ -1,7 +1,49 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import math
+import os
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
-from .models import Project, GeotechnicalModel, Layer, CptTest
-from django.db.models import Count
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from .models import Project, GeotechnicalModel, Layer, CptTest, CptData, DerivedSeries, PackedSounding, ProjectStats, QueryReport
+from .ingest import parse_samples, bulk_create_samples
+from .importers import CptImportError, import_samples
+from .storage import (read_channels, write_samples, replace_samples, ensure_samples_digest,
+                      append_samples, max_depth, read_depth_window)
+from .stress import StressProfile, layer_stack, vertical_stresses
+from .bearing import bearing_capacity, bearing_factors
+from .interpretation import interpret
+from .benchmarks import synthetic_samples, reference_consolidation, reference_interpretation
+from .consolidation import discretize, load_at, solve_consolidation, time_grid
+from .slope import (DEFAULT_WORKERS as DEFAULT_SLOPE_WORKERS, SlopeSection, available_workers, circle_grid,
+                    configured_workers, evaluate_circles, process_pool, search as slope_search)
+from .liquefaction import assess_soundings, factors_of_safety, scenario_matrix, volumetric_strain
+from .decimation import MIN_MAX_POINTS
+from .instrumentation import histograms
+from .authentication import deactivate_users
+from .diagnostics import QueryDiagnostics, query_shape
+from .endpoint_suite import (ENDPOINT_TIERS, TIMED_RUNS, TIMING_TOLERANCE, build_fixture, endpoint_cases,
+                             load_baseline, run_endpoint_suite)
+from .urls import urlpatterns
+from .views import MAX_PROFILE_DEPTHS
+import numpy as np
+from django.db.models import Count, F
+from django.utils import timezone
 
 class ProjectModelTest(TestCase):
     def setUp(self):
@@ -124,3 +166,1677 @@ class ProjectModelTest(TestCase):
         # Test filtering on the queryset
         filtered_project = user_projects.filter(name='Test Project').first()
         self.assertEqual(filtered_project.id, self.project.id)
+
+
+class BulkCptIngestTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ingest', password='testpass123')
+        self.project = Project(user=self.user, name='Ingest Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='Ingest Model'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sounding(self, count):
+        return [
+            {'depth': (i + 1) * 0.01, 'qc': 1.0 + i, 'fs': 0.01, 'u2': 0.001 * i}
+            for i in range(count)
+        ]
+
+    def test_save_cpt_bulk_inserts_all_samples(self):
+        """Samples are written with a constant number of queries per CPT"""
+        payload = {'cpt_tests': [
+            {'name': 'CPT-1', 'data': self.sounding(1200)},
+            {'name': 'CPT-2', 'data': self.sounding(300)},
+        ]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CptData.objects.filter(cpt_test__model=self.model).count(), 1500)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "geotech_cptdata"')]
+        self.assertLess(len(inserts), 20)
+        cpt = CptTest.objects.get(model=self.model, name='CPT-1')
+        self.assertEqual(cpt.data.order_by('depth').last().qc, 1200.0)
+
+    def test_invalid_sample_rolls_back_request(self):
+        """A bad sample rejects the request and leaves existing data untouched"""
+        self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': [
+            {'name': 'CPT-1', 'data': self.sounding(10)},
+        ]}, format='json')
+        data = self.sounding(10)
+        data[4]['qc'] = 'not a number'
+        response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': [
+            {'name': 'CPT-1', 'data': data},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('4', str(response.data['details']))
+        self.assertEqual(CptData.objects.filter(cpt_test__model=self.model).count(), 10)
+
+    def test_parse_samples_defaults_missing_channels(self):
+        """Missing channels default to zero and ids are ignored"""
+        self.assertEqual(
+            parse_samples([{'id': 7, 'depth': '0.5', 'qc': 3}]),
+            [(0.5, 3.0, 0.0, 0.0)]
+        )
+        with self.assertRaises(ValidationError):
+            parse_samples([{'depth': float('nan')}])
+
+
+class PackedStorageTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='packed', password='testpass123')
+        self.project = Project(user=self.user, name='Packed Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='Packed Model'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.samples = [
+            {'depth': 0.25 * (i + 1), 'qc': 1.5 + i, 'fs': 0.02, 'u2': 0.125 * i}
+            for i in range(50)
+        ]
+
+    def test_packed_sounding_keeps_api_contract(self):
+        """A packed CPT is stored without CptData rows but serializes like a row-backed one"""
+        response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': [
+            {'name': 'Rows', 'data': self.samples},
+            {'name': 'Packed', 'storage': 'packed', 'data': self.samples},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        rows, packed = response.data['cpt_tests']
+        self.assertEqual(packed['storage'], 'packed')
+        strip = lambda data: [{k: v for k, v in item.items() if k != 'id'} for item in data]
+        self.assertEqual(strip(packed['data']), strip(rows['data']))
+        self.assertEqual([item['id'] for item in packed['data']][:3], [1, 2, 3])
+
+        cpt = CptTest.objects.get(model=self.model, name='Packed')
+        self.assertFalse(cpt.data.exists())
+        self.assertEqual(cpt.packed.sample_count, 50)
+        self.assertEqual(len(bytes(cpt.packed.qc)), 50 * 8)
+
+    def test_read_channels_is_zero_copy_and_float32_is_supported(self):
+        """Packed channels decode to read-only NumPy views in the stored dtype"""
+        cpt = CptTest.objects.create(model=self.model, name='F4', storage=CptTest.STORAGE_PACKED)
+        write_samples(cpt, parse_samples(self.samples), dtype='f4')
+        channels = read_channels(CptTest.objects.get(id=cpt.id))
+        self.assertEqual(channels['qc'].dtype, np.float32)
+        self.assertFalse(channels['qc'].flags.writeable)
+        self.assertEqual(channels['depth'][-1], 12.5)
+
+    def test_unsorted_samples_are_packed_in_depth_order(self):
+        """Packed reads, windows and appends match row storage for samples written out of order"""
+        samples = [(3.0, 3.0, 0.0, 0.0), (1.0, 1.0, 0.0, 0.0), (2.0, 2.0, 0.0, 0.0), (0.5, 0.5, 0.0, 0.0)]
+        for storage in (CptTest.STORAGE_ROWS, CptTest.STORAGE_PACKED):
+            with self.subTest(storage=storage):
+                cpt = CptTest.objects.create(model=self.model, name=storage, storage=storage)
+                write_samples(cpt, samples)
+                channels, _, count = read_depth_window(cpt, 1.0, 2.0)
+                self.assertEqual((channels['depth'].tolist(), channels['qc'].tolist(), count),
+                                 ([1.0, 2.0], [1.0, 2.0], 2))
+                append_samples(cpt, [(5.0, 5.0, 0.0, 0.0), (4.0, 4.0, 0.0, 0.0)])
+                self.assertEqual(read_channels(CptTest.objects.get(id=cpt.id))['qc'].tolist(),
+                                 [0.5, 1.0, 2.0, 3.0, 4.0, 5.0])
+
+    def test_switching_storage_mode_drops_previous_samples(self):
+        """Replacing samples clears whichever backend held them before"""
+        cpt = CptTest.objects.create(model=self.model, name='Switch')
+        write_samples(cpt, parse_samples(self.samples))
+        cpt.storage = CptTest.STORAGE_PACKED
+        cpt.save()
+        replace_samples(cpt, parse_samples(self.samples[:5]))
+        self.assertFalse(CptData.objects.filter(cpt_test=cpt).exists())
+        self.assertEqual(len(read_channels(cpt)['qc']), 5)
+
+
+class CptImportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='importer', password='testpass123')
+        self.project = Project(user=self.user, name='Import Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='Import Model'
+        )
+        self.cpt = CptTest.objects.create(model=self.model, name='CPT-1')
+        self.url = f'/geotech/projects/{self.project.id}/cpt-tests/{self.cpt.id}/import/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content):
+        return self.client.post(self.url, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_csv_import_streams_in_batches(self):
+        """A CSV spooled to a temporary file is imported in fixed-size batches"""
+        lines = ['﻿Depth,qc,fs,u2,comment'] + [f'{i * 0.01:.2f},{1 + i % 7},0.02,0.001,x' for i in range(1, 12001)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.upload('sounding.csv', '\n'.join(lines).encode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 12000)
+        self.assertEqual(self.cpt.data.count(), 12000)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "geotech_cptdata"')]
+        self.assertLess(len(inserts), 100)
+
+    def test_semicolon_csv_with_decimal_comma_into_packed_storage(self):
+        """European-style logger files import into packed soundings"""
+        self.cpt.storage = CptTest.STORAGE_PACKED
+        self.cpt.save()
+        response = self.upload('sounding.csv', b'depth;qc;fs;u2\n0,5;1,25;0,01;0\n\n1,0;2,5;0,02;0,1\n')
+        self.assertEqual(response.status_code, 200)
+        channels = read_channels(CptTest.objects.get(id=self.cpt.id))
+        self.assertEqual(channels['qc'].tolist(), [1.25, 2.5])
+        self.assertFalse(self.cpt.data.exists())
+
+        response = self.upload('sounding.csv', b'depth,qc,fs,u2\n2.0,4,0,0\n0.5,1,0,0\n1.0,2,0,0\n')
+        self.assertEqual(response.status_code, 200)
+        channels = read_channels(CptTest.objects.get(id=self.cpt.id))
+        self.assertEqual((channels['depth'].tolist(), channels['qc'].tolist()), ([0.5, 1.0, 2.0], [1.0, 2.0, 4.0]))
+
+    def test_import_keeps_a_float32_sounding(self):
+        """Re-importing into an f4 packed sounding keeps f4 unless another dtype is asked for"""
+        self.cpt.storage = CptTest.STORAGE_PACKED
+        self.cpt.save()
+        write_samples(self.cpt, [(0.5, 1.0, 0.0, 0.0)], dtype='f4')
+        csv_file = b'depth,qc,fs,u2\n0.5,1.1,0,0\n1.0,2.2,0,0\n'
+        self.assertEqual(self.upload('sounding.csv', csv_file).status_code, 200)
+        self.assertEqual(PackedSounding.objects.get(cpt_test=self.cpt).dtype, 'f4')
+        response = self.client.post(self.url, {'file': SimpleUploadedFile('sounding.csv', csv_file), 'dtype': 'f8'},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PackedSounding.objects.get(cpt_test=self.cpt).dtype, 'f8')
+        response = self.client.post(self.url, {'file': SimpleUploadedFile('sounding.csv', csv_file), 'dtype': 'f2'},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bad_row_reports_line_and_keeps_existing_data(self):
+        """A malformed row rejects the whole import with its line number"""
+        write_samples(self.cpt, [(0.1, 1.0, 0.0, 0.0)])
+        response = self.upload('sounding.csv', b'depth,qc,fs,u2\n0.1,1,0,0\n0.2,abc,0,0\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['line'], 3)
+        self.assertEqual(self.cpt.data.count(), 1)
+
+    def test_missing_columns_and_other_users_tests_are_rejected(self):
+        """Uploads without the CPT channels or for someone else's test are refused"""
+        response = self.upload('sounding.csv', b'depth,qc\n0.1,1\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fs', response.data['error'])
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(other)
+        response = self.upload('sounding.csv', b'depth,qc,fs,u2\n')
+        self.assertEqual(response.status_code, 404)
+
+    def test_undecodable_and_malformed_files_are_rejected(self):
+        """Non-UTF-8 text and CSV the reader cannot parse are client errors, not crashes"""
+        response = self.upload('sounding.csv', 'depth,qc,fs,u2\n0.1,1,0,0\n0.2,2,0,0 Größe\n'.encode('latin-1'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.data['error'])
+        response = self.upload('sounding.csv', b'depth,qc,fs,u2\n0.1,1,0,0\n0.2,2,0,"' + b'0' * 200000 + b'"\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['line'], 3)
+        self.assertFalse(self.cpt.data.exists())
+
+    def test_packed_import_size_is_capped(self):
+        """Packed imports buffer the whole sounding, so they refuse files above the cap"""
+        self.cpt.storage = CptTest.STORAGE_PACKED
+        self.cpt.save()
+        samples = [(i * 0.01, 1.0, 0.0, 0.0) for i in range(1, 101)]
+        with self.assertRaises(CptImportError):
+            import_samples(self.cpt, iter(samples), batch_size=30, max_packed_samples=99)
+        self.assertEqual(import_samples(self.cpt, iter(samples), batch_size=30, max_packed_samples=100), 100)
+
+    @skipUnless(importlib.util.find_spec('openpyxl'), 'openpyxl is not installed')
+    def test_xlsx_import(self):
+        """XLSX uploads are read row by row from the first worksheet"""
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['depth', 'qc', 'fs', 'u2'])
+        for i in range(1, 101):
+            sheet.append([i * 0.02, 3.5, 0.04, None if i == 50 else 0.01])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        response = self.upload('sounding.xlsx', buffer.getvalue())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['line'], 51)
+        sheet.cell(row=51, column=4, value=0.01)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        response = self.upload('sounding.xlsx', buffer.getvalue())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cpt.data.count(), 100)
+
+
+class StreamingExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='testpass123')
+        self.project = Project(user=self.user, name='Export Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='Export Model',
+            npv=2.0
+        )
+        Layer.objects.create(model=self.model, name='Clay', depth=3.0, unit_weight=19.0)
+        Layer.objects.create(model=self.model, name='Sand', depth=8.0, unit_weight=20.0, permeability=1e-5)
+        self.samples = [(0.02 * i, 1.0 + i, 0.01, 0.0) for i in range(1, 4502)]
+        self.cpt = CptTest.objects.create(model=self.model, name='CPT-1')
+        write_samples(self.cpt, self.samples)
+        self.packed = CptTest.objects.create(model=self.model, name='CPT-2', storage=CptTest.STORAGE_PACKED)
+        write_samples(self.packed, self.samples[:10])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, url, **kwargs):
+        response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_cpt_csv_is_default_for_browser_accept_header(self):
+        """The frontend's default Accept header gets a CSV attachment"""
+        url = f'/geotech/projects/{self.project.id}/cpt-tests/{self.cpt.id}/export/'
+        response, body = self.export(url, HTTP_ACCEPT='application/json, text/plain, */*')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'cpt-test-{self.cpt.id}.csv', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0], ['depth', 'qc', 'fs', 'u2'])
+        self.assertEqual(len(rows), 4502)
+        self.assertEqual(float(rows[-1][1]), 4502.0)
+
+    def test_cpt_jsonl_and_binary_round_trip(self):
+        """JSON lines and the framed binary format carry the same samples"""
+        url = f'/geotech/projects/{self.project.id}/cpt-tests/{self.packed.id}/export/'
+        _, body = self.export(url + '?format=jsonl')
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(lines[0], {'depth': 0.02, 'qc': 2.0, 'fs': 0.01, 'u2': 0.0})
+
+        url = f'/geotech/projects/{self.project.id}/cpt-tests/{self.cpt.id}/export/'
+        response, body = self.export(url, HTTP_ACCEPT='application/octet-stream')
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(body[:5], b'GTPB\x01')
+        self.assertEqual(body[5:6], b'C')
+        test_id, name_length = struct.unpack_from('<qH', body, 6)
+        self.assertEqual(test_id, self.cpt.id)
+        offset = 6 + 10 + name_length
+        values = []
+        while True:
+            (count,) = struct.unpack_from('<I', body, offset)
+            offset += 4
+            if count == 0:
+                break
+            values.append(np.frombuffer(body, dtype='<f8', count=count * 4, offset=offset))
+            offset += count * 32
+        self.assertEqual(body[offset:], b'E')
+        self.assertTrue(np.array_equal(np.concatenate(values).reshape(-1, 4), np.array(self.samples)))
+
+    def test_layer_and_model_exports(self):
+        """Layer tables and whole models export in every format"""
+        _, body = self.export(f'/geotech/export_layers/{self.model.id}/')
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual([row[1] for row in rows[1:]], ['Clay', 'Sand'])
+
+        _, body = self.export(f'/geotech/export_model/{self.model.id}/?format=jsonl')
+        types = [json.loads(line)['type'] for line in body.decode().splitlines()]
+        self.assertEqual(types[:4], ['model', 'layer', 'layer', 'cpt_test'])
+        self.assertEqual(types.count('sample'), 4511)
+
+        _, body = self.export(f'/geotech/export_model/{self.model.id}/?format=csv')
+        text = body.decode()
+        self.assertTrue(text.startswith('# layers\n'))
+        self.assertIn('\n# cpt_data\ncpt_test_id,cpt_test,depth,qc,fs,u2\n', text)
+
+        _, body = self.export(f'/geotech/export_model/{self.model.id}/?format=bin')
+        self.assertEqual(body[:6], b'GTPB\x01L')
+        self.assertEqual(body[-1:], b'E')
+
+    def test_export_of_another_users_model_is_not_found(self):
+        """Exports are scoped to the requesting user"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(other)
+        response = self.client.get(f'/geotech/export_model/{self.model.id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class CptInterpretationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='interpreter', password='testpass123')
+        self.project = Project(user=self.user, name='Interpretation Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='Interpretation Model',
+            npv=2.0
+        )
+        # Layer.depth is the layer thickness: 0-3 m at 18, 3-10 m at 20
+        Layer.objects.create(model=self.model, name='Clay', depth=3.0, unit_weight=18.0)
+        Layer.objects.create(model=self.model, name='Sand', depth=7.0, unit_weight=20.0)
+        self.cpt = CptTest.objects.create(model=self.model, name='CPT-1')
+        self.samples = parse_samples(synthetic_samples(500, step=0.02))
+        write_samples(self.cpt, self.samples)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_vertical_stresses_follow_layer_thicknesses(self):
+        """Total stress accumulates layer thicknesses; pore pressure starts at npv"""
+        bottoms, unit_weights = layer_stack(self.model)
+        self.assertEqual(bottoms.tolist(), [3.0, 10.0])
+        sigma_v0, u0, sigma_v0_eff = vertical_stresses([1.0, 3.0, 5.0, 12.0], bottoms, unit_weights, 2.0)
+        self.assertTrue(np.allclose(sigma_v0, [18.0, 54.0, 94.0, 234.0]))
+        self.assertTrue(np.allclose(u0, [0.0, 9.81, 29.43, 98.1]))
+        self.assertTrue(np.allclose(sigma_v0_eff, sigma_v0 - u0))
+
+    def test_vectorized_engine_matches_reference(self):
+        """The NumPy engine agrees with the per-sample reference implementation"""
+        depth, qc, fs, u2 = (list(column) for column in zip(*self.samples))
+        bottoms, unit_weights = layer_stack(self.model)
+        sigma_v0, u0, _ = vertical_stresses(depth, bottoms, unit_weights, 2.0)
+        result = interpret(depth, qc, fs, u2, sigma_v0, u0)
+        qtn, ic, zones = reference_interpretation(depth, qc, fs, u2, bottoms.tolist(), unit_weights.tolist(), 2.0)
+        self.assertTrue(np.allclose(result['Qtn'], qtn, rtol=1e-3, equal_nan=True))
+        self.assertTrue(np.allclose(result['Ic'], ic, rtol=1e-3, equal_nan=True))
+        self.assertEqual(result['sbtn_zone'].tolist(), zones)
+        self.assertTrue(set(result['sbtn_zone'].tolist()) - {0})
+        self.assertTrue(np.all(result['n'][np.isfinite(result['n'])] <= 1.0))
+
+    def test_undefined_samples_are_nan(self):
+        """Samples without friction or below the overburden have no normalized values"""
+        result = interpret([1.0, 1.0], [0.001, 5.0], [10.0, 0.0], [0.0, 0.0],
+                           np.array([18.0, 18.0]), np.array([0.0, 0.0]))
+        self.assertTrue(np.isnan(result['Ic']).all())
+        self.assertEqual(result['sbtn_zone'].tolist(), [0, 0])
+
+    def test_interpretation_endpoint_returns_columns(self):
+        """The endpoint returns one array per derived quantity and NaN as null"""
+        response = self.client.get(f'/geotech/cpt_interpretation/{self.model.id}/?area_ratio=0.75')
+        self.assertEqual(response.status_code, 200)
+        cpt = response.data['cpt_tests'][0]
+        self.assertEqual(cpt['id'], self.cpt.id)
+        self.assertEqual(len(cpt['Ic']), 500)
+        self.assertEqual(cpt['qt'][0], self.samples[0][1] * 1000 + self.samples[0][3] * 0.25)
+        response = self.client.get(f'/geotech/cpt_interpretation/{self.model.id}/?area_ratio=2')
+        self.assertEqual(response.status_code, 400)
+
+
+class DerivedSeriesCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='derived', password='testpass123')
+        self.project = Project(user=self.user, name='Derived Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='Derived Model',
+            npv=2.0
+        )
+        Layer.objects.create(model=self.model, name='Clay', depth=4.0, unit_weight=18.0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': [
+            {'name': 'CPT-1', 'data': synthetic_samples(400, step=0.02)},
+        ]}, format='json')
+        self.url = f'/geotech/cpt_interpretation/{self.model.id}/'
+
+    def test_repeated_reads_hit_the_persisted_series(self):
+        """The second read loads the stored series instead of the samples"""
+        first = self.client.get(self.url)
+        self.assertEqual(DerivedSeries.objects.count(), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        self.assertFalse(any('geotech_cptdata' in q['sql'] for q in ctx.captured_queries))
+
+    def test_layer_groundwater_and_sample_changes_invalidate(self):
+        """Changing any input drops the stored series and changes the result"""
+        before = self.client.get(self.url).data['cpt_tests'][0]['sigma_v0_eff']
+
+        self.client.post(f'/geotech/save_layers/{self.model.id}/', {'layers': [
+            {'name': 'Clay', 'depth': 4.0, 'unit_weight': 16.0},
+        ]}, format='json')
+        self.assertEqual(DerivedSeries.objects.count(), 0)
+        after_layers = self.client.get(self.url).data['cpt_tests'][0]['sigma_v0_eff']
+        self.assertNotEqual(before, after_layers)
+
+        self.client.post(f'/geotech/model_detail/{self.model.id}/', {
+            'name': self.model.name, 'project': self.project.id, 'npv': 5.0, 'npv_max': 1.0,
+        }, format='json')
+        self.assertEqual(DerivedSeries.objects.count(), 0)
+        self.assertNotEqual(after_layers, self.client.get(self.url).data['cpt_tests'][0]['sigma_v0_eff'])
+
+        cpt = CptTest.objects.get(model=self.model)
+        digest = cpt.samples_digest
+        replace_samples(cpt, parse_samples(synthetic_samples(10)))
+        self.assertNotEqual(CptTest.objects.get(id=cpt.id).samples_digest, digest)
+        self.assertFalse(DerivedSeries.objects.filter(cpt_test=cpt).exists())
+        self.assertEqual(len(self.client.get(self.url).data['cpt_tests'][0]['Ic']), 10)
+
+    def test_sample_digest_is_content_based(self):
+        """Identical samples give identical digests; legacy rows get one on demand"""
+        cpt = CptTest.objects.get(model=self.model)
+        other = CptTest.objects.create(model=self.model, name='CPT-2')
+        write_samples(other, parse_samples(synthetic_samples(400, step=0.02)))
+        self.assertEqual(other.samples_digest, cpt.samples_digest)
+        CptTest.objects.filter(id=cpt.id).update(samples_digest='')
+        self.assertEqual(ensure_samples_digest(CptTest.objects.get(id=cpt.id)), other.samples_digest)
+
+    def test_unsorted_samples_digest_matches_the_stored_order(self):
+        """Samples are stored depth-sorted, so an unsorted write hashes like its read-back"""
+        samples = parse_samples(synthetic_samples(400, step=0.02))
+        shuffled = [samples[i] for i in np.random.default_rng(3).permutation(len(samples))]
+        for storage, dtype in ((CptTest.STORAGE_ROWS, 'f8'), (CptTest.STORAGE_PACKED, 'f8'),
+                               (CptTest.STORAGE_PACKED, 'f4')):
+            with self.subTest(storage=storage, dtype=dtype):
+                written = CptTest.objects.create(model=self.model, name='Shuffled', storage=storage)
+                write_samples(written, shuffled, dtype=dtype)
+                ordered = CptTest.objects.create(model=self.model, name='Ordered', storage=storage)
+                write_samples(ordered, samples, dtype=dtype)
+                imported = CptTest.objects.create(model=self.model, name='Imported', storage=storage)
+                import_samples(imported, shuffled, batch_size=64, dtype=dtype)
+                self.assertEqual({written.samples_digest, imported.samples_digest}, {ordered.samples_digest})
+                CptTest.objects.filter(id=written.id).update(samples_digest='')
+                self.assertEqual(ensure_samples_digest(CptTest.objects.get(id=written.id)), written.samples_digest)
+
+    def test_float32_digest_matches_the_stored_samples(self):
+        """An f4 sounding's digest hashes the stored float32 values, whichever path computes it"""
+        samples = parse_samples(synthetic_samples(400, step=0.02))
+        written = CptTest.objects.create(model=self.model, name='F4', storage=CptTest.STORAGE_PACKED)
+        write_samples(written, samples, dtype='f4')
+        imported = CptTest.objects.create(model=self.model, name='F4-import', storage=CptTest.STORAGE_PACKED)
+        import_samples(imported, samples, batch_size=64, dtype='f4')
+        self.assertEqual(imported.samples_digest, written.samples_digest)
+        CptTest.objects.filter(id=written.id).update(samples_digest='')
+        self.assertEqual(ensure_samples_digest(CptTest.objects.get(id=written.id)), written.samples_digest)
+
+
+class DifferentialSaveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='differ', password='testpass123')
+        self.project = Project(user=self.user, name='Diff Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='Diff Model'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.samples = synthetic_samples(2000)
+        response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': [
+            {'name': 'CPT-1', 'data': self.samples},
+            {'name': 'CPT-2', 'data': self.samples[:100]},
+        ]}, format='json')
+        self.cpt_tests = response.data['cpt_tests']
+        response = self.client.post(f'/geotech/save_layers/{self.model.id}/', {'layers': [
+            {'name': 'Fill', 'depth': 1.0, 'unit_weight': 17.0},
+            {'name': 'Clay', 'depth': 4.0, 'unit_weight': 18.5},
+        ]}, format='json')
+        self.layers = response.data['layers']
+
+    def test_renaming_a_cpt_does_not_rewrite_samples(self):
+        """A one-field CPT edit touches one row and keeps sample primary keys"""
+        sample_ids = list(CptData.objects.values_list('id', flat=True))
+        payload = [dict(self.cpt_tests[0], name='CPT-1a'), self.cpt_tests[1]]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': payload}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changes']['cpt_tests'], {
+            'created': 0, 'updated': 1, 'deleted': 0, 'samples_written': 0, 'samples_deleted': 0,
+        })
+        self.assertEqual(response.data['changes']['rows_touched'], 1)
+        self.assertFalse(any(q['sql'].startswith(('INSERT INTO "geotech_cptdata"', 'DELETE FROM "geotech_cptdata"'))
+                             for q in ctx.captured_queries))
+        self.assertEqual(list(CptData.objects.values_list('id', flat=True)), sample_ids)
+        self.assertEqual(CptTest.objects.get(id=self.cpt_tests[0]['id']).name, 'CPT-1a')
+
+    def test_cpt_tests_are_matched_inserted_and_deleted_by_id(self):
+        """Changed samples are rewritten, new tests inserted and missing ones removed"""
+        payload = [
+            {'id': self.cpt_tests[0]['id'], 'name': 'CPT-1', 'data': self.samples[:10]},
+            {'name': 'CPT-3', 'data': self.samples[:5]},
+        ]
+        response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': payload}, format='json')
+        self.assertEqual(response.data['changes']['cpt_tests'], {
+            'created': 1, 'updated': 1, 'deleted': 1, 'samples_written': 15, 'samples_deleted': 2100,
+        })
+        self.assertEqual(response.data['cpt_tests'][0]['id'], self.cpt_tests[0]['id'])
+        self.assertEqual(CptData.objects.filter(cpt_test__model=self.model).count(), 15)
+        self.assertFalse(CptTest.objects.filter(id=self.cpt_tests[1]['id']).exists())
+
+    def test_cpt_without_data_keeps_samples_and_can_change_storage(self):
+        """Omitting data keeps the samples, even across a storage mode switch"""
+        payload = [{'id': self.cpt_tests[1]['id'], 'name': 'CPT-2', 'storage': 'packed'}]
+        response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': payload}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changes']['cpt_tests']['samples_written'], 100)
+        cpt = CptTest.objects.get(id=self.cpt_tests[1]['id'])
+        self.assertEqual(cpt.packed.sample_count, 100)
+        self.assertFalse(cpt.data.exists())
+
+    def test_float32_sounding_round_trips_unchanged(self):
+        """Sending back the get_layers payload (which omits the write-only dtype) keeps an f4 sounding"""
+        response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': [
+            {'name': 'F4', 'storage': 'packed', 'dtype': 'f4', 'data': self.samples[:10]},
+        ]}, format='json')
+        cpt_id = response.data['cpt_tests'][0]['id']
+        cpt_tests = json.loads(self.client.get(f'/geotech/get_layers/{self.model.id}/').content)['cpt_tests']
+        self.assertNotIn('dtype', cpt_tests[-1])
+        response = self.client.post(f'/geotech/save_cpt/{self.model.id}/', {'cpt_tests': cpt_tests}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changes']['cpt_tests'], {
+            'created': 0, 'updated': 0, 'deleted': 0, 'samples_written': 0, 'samples_deleted': 0,
+        })
+        self.assertEqual(PackedSounding.objects.get(cpt_test_id=cpt_id).dtype, 'f4')
+
+    def test_layer_edits_use_bulk_update_and_keep_order(self):
+        """Layers are diffed by id and stacked in payload order"""
+        fill, clay = self.layers
+        payload = [
+            dict(fill, unit_weight=16.0),
+            {'name': 'Silt', 'depth': 2.0, 'unit_weight': 19.0},
+            clay,
+        ]
+        response = self.client.post(f'/geotech/save_layers/{self.model.id}/', {'layers': payload}, format='json')
+        self.assertEqual(response.data['changes']['layers'], {'created': 1, 'updated': 2, 'deleted': 0})
+        self.assertEqual([layer['name'] for layer in response.data['layers']], ['Fill', 'Silt', 'Clay'])
+        self.assertEqual(Layer.objects.get(id=clay['id']).position, 2)
+        bottoms, unit_weights = layer_stack(self.model)
+        self.assertEqual(bottoms.tolist(), [1.0, 3.0, 7.0])
+        self.assertEqual(unit_weights.tolist(), [16.0, 19.0, 18.5])
+
+        response = self.client.post(f'/geotech/save_layers/{self.model.id}/', {'layers': [clay]}, format='json')
+        self.assertEqual(response.data['changes']['layers'], {'created': 0, 'updated': 1, 'deleted': 2})
+
+    def test_ids_from_another_model_are_not_matched(self):
+        """An id belonging to a different model is treated as a new row"""
+        other = GeotechnicalModel.objects.create(project=self.project, user=self.user, name='Other')
+        response = self.client.post(f'/geotech/save_layers/{other.id}/', {'layers': [self.layers[0]]}, format='json')
+        self.assertEqual(response.data['changes']['layers']['created'], 1)
+        self.assertEqual(Layer.objects.filter(model=self.model).count(), 2)
+
+
+class LiveSoundingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='live', password='testpass123')
+        self.project = Project(user=self.user, name='Live Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='Live Model'
+        )
+        self.cpt = CptTest.objects.create(model=self.model, name='CPT-1')
+        self.url = f'/geotech/projects/{self.project.id}/cpt-tests/{self.cpt.id}/samples/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def feed(self, start, count):
+        return [{'depth': round((start + i) * 0.01, 2), 'qc': 2.0, 'fs': 20.0, 'u2': 5.0} for i in range(count)]
+
+    def append_queries(self, start, count):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'data': self.feed(start, count)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_append_cost_does_not_grow_with_the_sounding(self):
+        """Appending to a long sounding costs the same queries as to a short one"""
+        self.append_queries(1, 5)
+        early = self.append_queries(6, 5)
+        bulk_create_samples(self.cpt, [tuple(s.values()) for s in self.feed(11, 4995)])
+        late = self.append_queries(5006, 5)
+        self.assertEqual(early, late)
+        self.assertEqual(self.cpt.data.count(), 5010)
+        self.assertEqual(read_channels(self.cpt)['depth'][-1], 50.1)
+
+    def test_append_must_go_deeper(self):
+        """Samples above the current bottom are rejected"""
+        self.client.post(self.url, {'data': self.feed(1, 10)}, format='json')
+        response = self.client.post(self.url, {'data': self.feed(5, 2)}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cpt.data.count(), 10)
+
+    def test_depth_window_replace_for_rows_and_packed(self):
+        """Only the samples inside the window are replaced, in either storage mode"""
+        for storage in (CptTest.STORAGE_ROWS, CptTest.STORAGE_PACKED):
+            self.cpt.storage = storage
+            self.cpt.save()
+            replace_samples(self.cpt, [tuple(s.values()) for s in self.feed(1, 100)])
+            digest = CptTest.objects.get(id=self.cpt.id).samples_digest
+            window = [{'depth': 0.25, 'qc': 9.0, 'fs': 1.0, 'u2': 0.0}, {'depth': 0.35, 'qc': 9.5, 'fs': 1.0, 'u2': 0.0}]
+            response = self.client.put(self.url, {'depth_from': 0.2, 'depth_to': 0.4, 'data': window}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.data['deleted'], response.data['inserted']), (21, 2))
+            channels = read_channels(CptTest.objects.get(id=self.cpt.id))
+            self.assertEqual(len(channels['depth']), 81)
+            self.assertTrue(np.all(np.diff(channels['depth']) > 0))
+            self.assertEqual(channels['qc'][np.searchsorted(channels['depth'], 0.25)], 9.0)
+            self.assertNotEqual(CptTest.objects.get(id=self.cpt.id).samples_digest, digest)
+
+        response = self.client.put(self.url, {'depth_from': 0.2, 'depth_to': 0.4, 'data': self.feed(90, 1)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_packed_append_extends_channels(self):
+        """Packed soundings grow by concatenating the new bytes"""
+        self.cpt.storage = CptTest.STORAGE_PACKED
+        self.cpt.save()
+        self.client.post(self.url, {'data': self.feed(1, 3)}, format='json')
+        self.client.post(self.url, {'data': self.feed(4, 2)}, format='json')
+        self.assertEqual(read_channels(CptTest.objects.get(id=self.cpt.id))['depth'].tolist(),
+                         [0.01, 0.02, 0.03, 0.04, 0.05])
+
+    def test_packed_append_checks_the_recorded_bottom(self):
+        """The overlap check reads PackedSounding.max_depth, not the depth channel"""
+        self.cpt.storage = CptTest.STORAGE_PACKED
+        self.cpt.save()
+        self.client.post(self.url, {'data': self.feed(1, 100)}, format='json')
+        self.assertEqual(self.cpt.packed.max_depth, 1.0)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(max_depth(self.cpt), 1.0)
+        self.assertNotIn('"depth"', ctx.captured_queries[0]['sql'])
+        self.assertEqual(self.client.post(self.url, {'data': self.feed(100, 1)}, format='json').status_code, 400)
+        self.client.post(self.url, {'data': self.feed(101, 5)}, format='json')
+        packed = PackedSounding.objects.get(cpt_test=self.cpt)
+        self.assertEqual((packed.sample_count, packed.max_depth), (105, 1.05))
+
+
+class LevelOfDetailTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lod', password='testpass123')
+        self.project = Project(user=self.user, name='LOD Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(
+            project=self.project,
+            user=self.user,
+            name='LOD Model'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.samples = [(i * 0.01, 2.0 + (i % 7) * 0.1, 20.0, 5.0) for i in range(20000)]
+        # A thin hard lens that must survive decimation
+        self.samples[12345] = (123.45, 40.0, 20.0, 5.0)
+
+    def sounding(self, storage):
+        cpt = CptTest.objects.create(model=self.model, name=storage, storage=storage)
+        write_samples(cpt, self.samples)
+        return cpt
+
+    def test_pyramid_built_at_save_time(self):
+        cpt = self.sounding(CptTest.STORAGE_ROWS)
+        levels = list(cpt.pyramid.values_list('bin_size', 'source_count', 'samples_digest'))
+        self.assertEqual(levels, [(16, 20000, cpt.samples_digest), (64, 20000, cpt.samples_digest)])
+
+    def test_window_reads_for_rows_and_packed(self):
+        """Zoomed-in windows are raw, zoomed-out ones fit the budget and keep peaks"""
+        for storage in (CptTest.STORAGE_ROWS, CptTest.STORAGE_PACKED):
+            cpt = self.sounding(storage)
+            channels, bin_size, count = read_depth_window(cpt, 100.0, 105.0, max_points=1000)
+            self.assertEqual((bin_size, count), (1, 501))
+            self.assertEqual(channels['depth'][0], 100.0)
+
+            channels, bin_size, count = read_depth_window(cpt, max_points=1000)
+            self.assertEqual(count, 20000)
+            self.assertGreater(bin_size, 1)
+            self.assertLessEqual(len(channels['depth']), 1000)
+            self.assertEqual(channels['qc'].max(), 40.0)
+            self.assertTrue(np.all(np.diff(channels['depth']) >= 0))
+
+    def test_incremental_write_rebuilds_pyramid_on_read(self):
+        cpt = self.sounding(CptTest.STORAGE_ROWS)
+        append_samples(cpt, [(200.0, 50.0, 20.0, 5.0)])
+        self.assertFalse(cpt.pyramid.exists())
+        channels, _, count = read_depth_window(cpt, max_points=500)
+        self.assertEqual(count, 20001)
+        self.assertEqual(channels['qc'].max(), 50.0)
+        self.assertEqual(set(cpt.pyramid.values_list('samples_digest', flat=True)), {cpt.samples_digest})
+
+    def test_window_endpoint(self):
+        cpt = self.sounding(CptTest.STORAGE_PACKED)
+        url = f'/geotech/projects/{self.project.id}/cpt-tests/{cpt.id}/samples/'
+        response = self.client.get(url, {'depth_from': 10, 'depth_to': 12})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['count'], len(response.data['qc'])), (201, 201))
+
+        for max_points in (300, MIN_MAX_POINTS):
+            response = self.client.get(url, {'max_points': max_points})
+            self.assertLessEqual(len(response.data['depth']), max_points)
+        for max_points in ('many', MIN_MAX_POINTS - 1):
+            self.assertEqual(self.client.get(url, {'max_points': max_points}).status_code, 400)
+
+
+class ProjectCountsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counts', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        projects = Project.objects.bulk_create(
+            Project(user=self.user, name=f'Project {i}') for i in range(1000)
+        )
+        self.project = projects[0]
+        models = GeotechnicalModel.objects.bulk_create(
+            GeotechnicalModel(project=self.project, user=self.user, name=f'Model {i}') for i in range(2)
+        )
+        Layer.objects.bulk_create(Layer(model=models[0], name=f'Layer {i}') for i in range(3))
+        CptTest.objects.bulk_create(CptTest(model=model, name='CPT') for model in models)
+
+    def test_list_costs_constant_queries(self):
+        """Counts come from one annotated query, not three per project"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/geotech/projects/')
+        self.assertEqual(len(response.data), 1000)
+        counts = {p['id']: (p['models_count'], p['cpt_tests_count'], p['layers_count']) for p in response.data}
+        self.assertEqual(counts[self.project.id], (2, 2, 3))
+        self.assertEqual(sum(map(sum, counts.values())), 7)
+
+    def test_detail_includes_counts(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/geotech/projects/{self.project.id}/')
+        self.assertEqual((response.data['models_count'], response.data['layers_count']), (2, 3))
+        self.assertEqual(len(response.data['geotechnical_models']), 2)
+
+
+class StatsRollupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='stats', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(user=self.user, name='Stats Project')
+        # Written directly, so the first stats read has to backfill the rollup
+        model = GeotechnicalModel.objects.create(project=self.project, user=self.user, name='Fan-out')
+        Layer.objects.bulk_create(Layer(model=model, name=f'L{i}') for i in range(40))
+        CptTest.objects.bulk_create(CptTest(model=model, name=f'CPT{i}') for i in range(30))
+        self.model = model
+
+    def test_counts_without_join_fan_out(self):
+        response = self.client.get('/geotech/stats/')
+        self.assertEqual(response.data, {
+            'totalProjects': 1, 'totalCptTests': 30, 'totalSoilLayers': 40, 'recentActivity': 1,
+        })
+        response = self.client.get(f'/geotech/projects/{self.project.id}/stats/')
+        self.assertEqual(response.data, {'totalCptTests': 30, 'totalSoilLayers': 40})
+        self.assertEqual(ProjectStats.objects.get(project=self.project).layers_count, 40)
+
+    def test_rollup_follows_api_writes(self):
+        """Saves adjust the rollup, so stats reads never scan the tables"""
+        self.client.get('/geotech/stats/')
+        self.client.post(f'/geotech/save_layers/{self.model.id}/', {
+            'name': 'Fan-out', 'layers': [{'name': 'Only'}],
+        }, format='json')
+        self.client.post('/geotech/model_detail/0/', {
+            'name': 'Second', 'project': self.project.id,
+            'layers': [{'name': 'A'}, {'name': 'B'}], 'cpt_tests': [{'name': 'CPT'}],
+        }, format='json')
+        with self.assertNumQueries(3):
+            response = self.client.get('/geotech/stats/')
+        self.assertEqual(response.data['totalSoilLayers'], 3)
+        self.assertEqual(response.data['totalCptTests'], 31)
+        stats = ProjectStats.objects.get(project=self.project)
+        self.assertEqual((stats.models_count, stats.layers_count), (2, 3))
+
+    def test_reconcile_fixes_writes_outside_the_api(self):
+        """Queryset deletes and shell writes leave the rollup stale until it is reconciled"""
+        self.client.get('/geotech/stats/')
+        Layer.objects.filter(id__in=list(self.model.layers.values_list('id', flat=True)[:15])).delete()
+        GeotechnicalModel.objects.create(project=self.project, user=self.user, name='From the shell')
+        self.assertEqual(self.client.get('/geotech/stats/').data['totalSoilLayers'], 40)
+        fresh = Project.objects.create(user=self.user, name='No rollup yet')
+
+        out = io.StringIO()
+        call_command('reconcile_stats', '--user', 'stats', '--batch-size', '1', stdout=out)
+        self.assertIn('Corrected 2 project rollups', out.getvalue())
+        stats = ProjectStats.objects.get(project=self.project)
+        self.assertEqual((stats.models_count, stats.cpt_tests_count, stats.layers_count), (2, 30, 25))
+        self.assertEqual(ProjectStats.objects.get(project=fresh).models_count, 0)
+        self.assertEqual(self.client.get('/geotech/stats/').data['totalSoilLayers'], 25)
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('Corrected 0 project rollups', out.getvalue())
+
+    def test_other_users_project(self):
+        other = User.objects.create_user(username='other-stats', password='testpass123')
+        self.client.force_authenticate(other)
+        response = self.client.get(f'/geotech/projects/{self.project.id}/stats/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get('/geotech/stats/').data['totalProjects'], 0)
+
+
+@override_settings(GEOTECH_MODEL_CACHES=['default'])
+class ModelReadPathTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.project = Project(user=self.user, name='Read Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(project=self.project, user=self.user, name='Read Model')
+        Layer.objects.create(model=self.model, name='Clay', depth=2.0, position=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_tests(self, count, storage=CptTest.STORAGE_ROWS):
+        for i in range(count):
+            cpt = CptTest.objects.create(model=self.model, name=f'{storage} {i}', storage=storage)
+            write_samples(cpt, [(0.2, 1.0, 10.0, 0.0), (0.1, 2.0, 20.0, 0.0)])
+
+    def read_queries(self):
+        # Samples are written directly here, without bumping the model version
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/geotech/get_layers/{self.model.id}/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), json.loads(response.content)
+
+    def test_queries_do_not_grow_with_cpt_tests(self):
+        self.add_tests(1)
+        few, _ = self.read_queries()
+        self.add_tests(20)
+        self.add_tests(5, CptTest.STORAGE_PACKED)
+        many, data = self.read_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(data['cpt_tests']), 26)
+
+    def test_representation_unchanged(self):
+        self.add_tests(1)
+        self.add_tests(1, CptTest.STORAGE_PACKED)
+        _, data = self.read_queries()
+        rows, packed = data['cpt_tests']
+        self.assertEqual([s['depth'] for s in rows['data']], [0.1, 0.2])
+        self.assertEqual(set(rows['data'][0]), {'id', 'depth', 'qc', 'fs', 'u2'})
+        self.assertEqual(packed['data'][0], {'id': 1, 'depth': 0.1, 'qc': 2.0, 'fs': 20.0, 'u2': 0.0})
+        self.assertEqual(data['layers'][0]['name'], 'Clay')
+        self.assertEqual(data['project_id'], self.project.id)
+
+
+@override_settings(GEOTECH_MODEL_CACHES=['default'])
+class ModelPayloadCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cacher', password='testpass123')
+        self.project = Project(user=self.user, name='Cache Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(project=self.project, user=self.user, name='Cached')
+        cpt = CptTest.objects.create(model=self.model, name='CPT-1')
+        write_samples(cpt, [(0.1, 1.0, 10.0, 0.0)])
+        self.url = f'/geotech/get_layers/{self.model.id}/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_conditional_get_checks_the_version(self):
+        """Per-process caches cannot see other workers' writes, so the version is read every time"""
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['ETag'], f'"model-{self.model.id}-v1-json"')
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        # A write by another process, which could not drop this process' entries
+        GeotechnicalModel.objects.filter(id=self.model.id).update(version=F('version') + 1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_conditional_get_without_queries_from_a_shared_tier(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+            with override_settings(CACHES={**settings.CACHES, 'shared': shared},
+                                   GEOTECH_MODEL_CACHES=['default', 'shared']):
+                first = self.client.get(self.url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 304)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(f'/geotech/save_layers/{self.model.id}/', {'layers': [{'name': 'Sand'}]},
+                                     format='json')
+                self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_payload_served_from_cache_until_a_write(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            again = self.client.get(self.url)
+        self.assertEqual(again.content, first.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/geotech/save_layers/{self.model.id}/', {'layers': [{'name': 'Sand'}]}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"model-{self.model.id}-v2-json"')
+        self.assertEqual(json.loads(response.content)['layers'][0]['name'], 'Sand')
+
+    def test_sample_writes_bump_version(self):
+        first = self.client.get(self.url)
+        cpt = self.model.cpt_tests.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/geotech/projects/{self.project.id}/cpt-tests/{cpt.id}/samples/',
+                             {'data': [{'depth': 0.2, 'qc': 2.0}]}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['cpt_tests'][0]['data']), 2)
+
+    def test_other_users_etag_is_not_honoured(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_authenticate(User.objects.create_user(username='snoop', password='testpass123'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+@override_settings(GEOTECH_MODEL_CACHES=['default'])
+class ModelPayloadFormatTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='formats', password='testpass123')
+        self.project = Project(user=self.user, name='Format Project')
+        self.project.save()
+        self.model = GeotechnicalModel.objects.create(project=self.project, user=self.user, name='Formats')
+        Layer.objects.create(model=self.model, name='Clay', depth=2.0)
+        self.samples = parse_samples(synthetic_samples(5000))
+        for storage in (CptTest.STORAGE_ROWS, CptTest.STORAGE_PACKED):
+            write_samples(CptTest.objects.create(model=self.model, name=storage, storage=storage), self.samples)
+        self.url = f'/geotech/get_layers/{self.model.id}/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_columnar_matches_rows(self):
+        rows = self.client.get(self.url)
+        columnar = self.client.get(self.url, HTTP_ACCEPT='application/vnd.geotech.columnar+json')
+        self.assertEqual(columnar['Content-Type'], 'application/vnd.geotech.columnar+json')
+        self.assertNotEqual(columnar['ETag'], rows['ETag'])
+        for by_row, by_column in zip(json.loads(rows.content)['cpt_tests'], json.loads(columnar.content)['cpt_tests']):
+            self.assertEqual(by_column['data']['depth'], [s['depth'] for s in by_row['data']])
+            self.assertEqual(by_column['data']['id'], [s['id'] for s in by_row['data']])
+        self.assertLess(len(columnar.content) * 1.5, len(rows.content))
+
+    def test_gzip_when_accepted(self):
+        plain = self.client.get(self.url, {'format': 'columnar'})
+        compressed = self.client.get(self.url, {'format': 'columnar'}, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        row_json = self.client.get(self.url)
+        self.assertLess(len(compressed.content) * 4, len(row_json.content))
+
+    def test_gzip_refused_by_q_value(self):
+        for header, compressed in (('gzip;q=0', False), ('br, gzip; q=0.0', False), ('*;q=0', False),
+                                   ('identity', False), ('gzip;q=0.5, br', True), ('*', True),
+                                   ('br, *;q=0.1, gzip;q=0', False)):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get('Content-Encoding') == 'gzip', compressed)
+
+    def test_binary_channels_are_aligned_typed_arrays(self):
+        """The GTPB payload is the columnar one with each channel as aligned raw bytes"""
+        columnar = json.loads(self.client.get(self.url, {'format': 'columnar'}).content)
+        response = self.client.get(self.url, HTTP_ACCEPT='application/vnd.geotech.binary')
+        self.assertEqual(response['Content-Type'], 'application/vnd.geotech.binary')
+        body = response.content
+        self.assertEqual(body[:6], b'GTPB\x01M')
+        (header_length,) = struct.unpack_from('<I', body, 6)
+        blocks = 10 + header_length
+        self.assertEqual(blocks % 8, 0)
+        payload = json.loads(body[10:blocks])
+        self.assertEqual(payload['name'], columnar['name'])
+        for by_column, packed in zip(columnar['cpt_tests'], payload['cpt_tests']):
+            for column, dtype in (('id', '<i8'), ('depth', '<f8'), ('u2', '<f8')):
+                offset, length = packed['data'][column]['$bytes']
+                self.assertEqual(offset % 8, 0)
+                values = np.frombuffer(body, dtype=dtype, count=length // 8, offset=blocks + offset)
+                self.assertEqual(values.tolist(), by_column['data'][column])
+
+    @skipUnless(importlib.util.find_spec('msgpack'), 'msgpack is not installed')
+    def test_msgpack_channels_are_typed_arrays(self):
+        import msgpack
+        response = self.client.get(self.url, HTTP_ACCEPT='application/msgpack')
+        payload = msgpack.unpackb(response.content)
+        for cpt_test in payload['cpt_tests']:
+            depth = np.frombuffer(cpt_test['data']['depth'], dtype='<f8')
+            self.assertEqual(depth.tolist(), [s[0] for s in self.samples])
+
+
+class ProjectListPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Project.objects.bulk_create(
+            Project(user=self.user, name=f'{"Bridge" if i % 3 else "Tunnel"} {i}',
+                    status='archived' if i % 5 == 0 else 'active')
+            for i in range(120)
+        )
+        # Same updated_at for several rows, so ties must be broken by id
+        Project.objects.filter(name__endswith='7').update(updated_at=timezone.now())
+
+    def test_keyset_pages_cover_every_project_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 25, **({'cursor': cursor} if cursor else {})}
+            with self.assertNumQueries(1):
+                response = self.client.get('/geotech/projects/', params)
+            self.assertEqual(response.status_code, 200)
+            seen += [project['id'] for project in response.data['results']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+        expected = list(Project.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_filters_and_sparse_fields(self):
+        response = self.client.get('/geotech/projects/', {'status': 'active', 'name': 'tun', 'fields': 'id,name'})
+        self.assertTrue(response.data)
+        self.assertTrue(all(set(project) == {'id', 'name'} for project in response.data))
+        self.assertTrue(all(project['name'].startswith('Tunnel') for project in response.data))
+        self.assertEqual(len(response.data), Project.objects.filter(status='active', name__startswith='Tunnel').count())
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/geotech/projects/', {'fields': 'id,name', 'limit': 5})
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('description', sql)
+        self.assertNotIn('geotech_layer', sql)
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'nonsense'}, {'limit': 0}, {'fields': 'id,password'}):
+            self.assertEqual(self.client.get('/geotech/projects/', params).status_code, 400)
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        caches['auth_tokens'].clear()
+        self.user = User.objects.create_user(username='tokened', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.assertEqual(self.client.get('/geotech/stats/').status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/geotech/stats/').status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'authtoken_token' in q['sql']])
+
+    def test_rotated_token_is_rejected(self):
+        self.client.get('/geotech/stats/')
+        self.token.delete()
+        Token.objects.create(user=self.user)
+        self.assertEqual(self.client.get('/geotech/stats/').status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/geotech/stats/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/geotech/stats/').status_code, 401)
+
+    def test_bulk_deactivation_drops_cached_tokens(self):
+        """A queryset UPDATE sends no post_save, so deactivate_users forgets the tokens itself"""
+        other = User.objects.create_user(username='tokened-too', password='testpass123')
+        other_client = APIClient()
+        other_client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=other).key}')
+        for client in (self.client, other_client):
+            self.assertEqual(client.get('/geotech/stats/').status_code, 200)
+        self.assertEqual(deactivate_users(User.objects.filter(username__startswith='tokened')), 2)
+        for client in (self.client, other_client):
+            self.assertEqual(client.get('/geotech/stats/').status_code, 401)
+
+
+class PerformanceInstrumentationTest(TestCase):
+    def setUp(self):
+        histograms.clear()
+        self.user = User.objects.create_user(username='timed', password='testpass123')
+        self.project = Project.objects.create(user=self.user, name='Timed Project')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_timing_breakdown(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/geotech/projects/{self.project.id}/')
+        self.assertEqual(response.status_code, 200)
+        entries = dict(part.split(';', 1)[0:2] for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(entries), {'db', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', entries['db'])
+
+    def test_structured_log_record(self):
+        with self.assertLogs('geotech.requests', level='INFO') as logs:
+            self.client.get('/geotech/projects/')
+        timings = logs.records[0].timings
+        self.assertEqual(timings['view'], 'project_list')
+        self.assertEqual(timings['status'], 200)
+        self.assertGreaterEqual(timings['total_ms'], timings['db_ms'])
+
+    def test_streaming_response_is_recorded_after_the_body(self):
+        """An export is logged once its last chunk is sent, with the queries issued while streaming"""
+        model = GeotechnicalModel.objects.create(project=self.project, user=self.user, name='Streamed')
+        cpt = CptTest.objects.create(model=model, name='Streamed')
+        write_samples(cpt, parse_samples(synthetic_samples(100)))
+        with self.assertLogs('geotech.requests', level='INFO') as logs:
+            response = self.client.get(f'/geotech/projects/{self.project.id}/cpt-tests/{cpt.id}/export/')
+            self.assertIn('total;dur=', response['Server-Timing'])
+            self.assertEqual(logs.records, [])
+            with CaptureQueriesContext(connection) as ctx:
+                body = b''.join(response.streaming_content)
+        self.assertEqual(len(body.splitlines()), 101)
+        self.assertEqual(len(logs.records), 1)
+        self.assertGreaterEqual(logs.records[0].timings['db_queries'], len(ctx.captured_queries) + 1)
+
+    def test_metrics_endpoint(self):
+        for _ in range(3):
+            self.client.get('/geotech/projects/')
+        self.assertEqual(self.client.get('/geotech/metrics/').status_code, 403)
+
+        admin = User.objects.create_superuser(username='ops', password='testpass123')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/geotech/metrics/')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('geotech_request_duration_seconds_count{view="project_list",method="GET"} 3', text)
+        self.assertIn('geotech_request_duration_seconds_bucket{view="project_list",method="GET",le="+Inf"} 3', text)
+        self.assertIn('geotech_db_queries_total{view="project_list",method="GET"}', text)
+
+
+class QueryDiagnosticsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='diagnosed', password='testpass123')
+        self.project = Project.objects.create(user=self.user, name='Diagnosed Project')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_query_shape(self):
+        self.assertEqual(query_shape('SELECT 1 WHERE id IN (%s, %s, %s)'), 'SELECT 1 WHERE id IN (%s, ...)')
+        self.assertEqual(query_shape('INSERT INTO t VALUES (%s, %s), (%s, %s), (%s, %s)'),
+                         'INSERT INTO t VALUES (%s, ...), ...')
+
+    def test_off_by_default(self):
+        self.client.get(f'/geotech/projects/{self.project.id}/')
+        self.assertFalse(QueryReport.objects.exists())
+
+    @override_settings(GEOTECH_QUERY_DIAGNOSTICS=True, GEOTECH_SLOW_QUERY_MS=0)
+    def test_slow_queries_are_explained(self):
+        with self.assertLogs('geotech.queries', level='WARNING'):
+            self.client.get(f'/geotech/projects/{self.project.id}/')
+        report = QueryReport.objects.filter(kind='slow', sql__contains='geotech_project').first()
+        self.assertEqual(report.view, 'project_detail')
+        self.assertRegex(report.plan, 'SEARCH|SCAN')
+        self.assertIn('views.', report.source)
+
+    def test_repeated_query_shapes(self):
+        diagnostics = QueryDiagnostics(slow_ms=1000, repeat_threshold=3)
+        ids = [Layer.objects.create(model=GeotechnicalModel.objects.create(
+            project=self.project, user=self.user, name=f'M{i}'), name='L', depth=1).id for i in range(4)]
+        with connection.execute_wrapper(diagnostics):
+            for layer_id in ids:
+                Layer.objects.get(id=layer_id)
+            Project.objects.get(id=self.project.id)
+        reports = diagnostics.reports('view', 'GET', '/')
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(reports[0].count, 4)
+        self.assertIn('geotech_layer', reports[0].sql)
+        self.assertIn('QueryDiagnosticsTest.test_repeated_query_shapes', reports[0].source)
+
+    def test_report_command(self):
+        QueryReport.objects.create(kind='repeated', view='get_layers', method='GET', path='/', sql='SELECT 1',
+                                   count=12, duration_ms=3.5, source='serializers.Serializer.method:1')
+        out = io.StringIO()
+        call_command('query_report', stdout=out)
+        self.assertIn('[repeated] get_layers: 12 queries in 1 requests', out.getvalue())
+        self.assertIn('serializers.Serializer.method:1', out.getvalue())
+        call_command('query_report', '--clear', stdout=out)
+        self.assertFalse(QueryReport.objects.exists())
+
+
+class SyntheticDatasetTest(TestCase):
+    def generate(self, **options):
+        options = {'users': 1, 'projects': 2, 'objects': 1, 'models': 2, 'layers': 4, 'cpt_tests': 2,
+                   'samples': 300, 'seed': 7, 'stdout': io.StringIO(), **options}
+        call_command('generate_dataset', **options)
+
+    def test_counts_and_rollups(self):
+        self.generate()
+        user = User.objects.get(username='synthetic-7-0000')
+        self.assertEqual(Project.objects.filter(user=user).count(), 2)
+        self.assertEqual(Layer.objects.filter(model__user=user).count(), 16)
+        self.assertEqual(CptData.objects.filter(cpt_test__model__user=user).count(), 8 * 300)
+        for project in Project.objects.filter(user=user).with_counts():
+            self.assertEqual((project.stats.models_count, project.stats.cpt_tests_count, project.stats.layers_count),
+                             (project.models_count, project.cpt_tests_count, project.layers_count))
+        cpt_test = CptTest.objects.filter(model__user=user).first()
+        self.assertEqual(cpt_test.samples_digest, ensure_samples_digest(cpt_test))
+
+    def test_deterministic_across_storage(self):
+        self.generate(prefix='rows')
+        self.generate(prefix='packed', storage='packed')
+        rows = CptTest.objects.filter(model__user__username__startswith='rows-').order_by('id')
+        packed = CptTest.objects.filter(model__user__username__startswith='packed-').order_by('id')
+        for a, b in zip(rows, packed):
+            np.testing.assert_array_equal(read_channels(a)['qc'], read_channels(b)['qc'])
+
+        with self.assertRaises(CommandError):
+            self.generate(prefix='rows')
+        self.generate(prefix='rows', replace=True, seed=7)
+        self.assertEqual(CptTest.objects.filter(model__user__username__startswith='rows-').count(), 8)
+
+    def test_plausible_profiles(self):
+        self.generate(samples=2000, cpt_tests=1)
+        for cpt_test in CptTest.objects.all():
+            channels = read_channels(cpt_test)
+            self.assertTrue(np.all(np.diff(channels['depth']) > 0))
+            self.assertTrue(np.all(channels['qc'] > 0))
+            friction_ratio = channels['fs'] / (channels['qc'] * 1000)
+            self.assertTrue(np.all((friction_ratio > 0.001) & (friction_ratio < 0.2)))
+            self.assertTrue(np.all(channels['u2'] >= 0))
+        for model in GeotechnicalModel.objects.all():
+            # Groundwater depths in metres, the highest level above the usual one
+            self.assertTrue(0 <= model.npv_max <= model.npv <= 3.0)
+
+
+class EndpointBudgetTest(TestCase):
+    """
+    Query budgets of every endpoint from perf_baseline.json. Set
+    GEOTECH_BENCHMARK_TIERS=small,medium,large to run bigger datasets and
+    check warm timings too.
+    """
+    def test_every_route_has_a_case(self):
+        fixture = build_fixture(ENDPOINT_TIERS['small'])
+        routes = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(routes - {case.route for case in endpoint_cases(fixture)}, set())
+
+    def test_endpoints_stay_within_budget(self):
+        baseline = load_baseline()
+        tiers = os.environ.get('GEOTECH_BENCHMARK_TIERS')
+        for tier in (tiers or 'small').split(','):
+            fixture = build_fixture(ENDPOINT_TIERS[tier])
+            results = run_endpoint_suite(fixture, timed_runs=TIMED_RUNS if tiers else 0)
+            for case, result in zip(endpoint_cases(fixture), results):
+                with self.subTest(tier=tier, endpoint=case.name):
+                    self.assertEqual(result['status'], case.status)
+                    budget = baseline['budgets'][tier][case.name]
+                    self.assertLessEqual(result['queries'], budget, '\n'.join(result['sql']))
+                    if tiers:
+                        self.assertLessEqual(result['ms'], baseline['timings_ms'][tier][case.name] * TIMING_TOLERANCE)
+
+
+class AnalysisEndpointMixin:
+    """
+    Fixture for the analysis endpoints: a user and project, one model built
+    from ``model_fields`` and ``layers`` (override ``create_models`` for
+    more), and a client authenticated on ``url`` (formatted with ``self``).
+    """
+    username = None
+    url = None
+    model_fields = {}
+    layers = ()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username=self.username, password='testpass123')
+        self.project = Project.objects.create(user=self.user, name=f'{self.username.title()} Project')
+        self.create_models()
+        self.url = self.url.format(self=self)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_models(self):
+        self.model = GeotechnicalModel.objects.create(project=self.project, user=self.user, **self.model_fields)
+        for position, layer in enumerate(self.layers):
+            Layer.objects.create(model=self.model, position=position, **layer)
+
+    def assertValidation(self, invalid_bodies, valid_body):
+        """Each invalid body is a 400; a valid one from another user is a 404"""
+        for body in invalid_bodies:
+            with self.subTest(body=body):
+                self.assertEqual(self.client.post(self.url, body, format='json').status_code, 400)
+        self.client.force_authenticate(User.objects.create_user(username=f'other-{self.username}', password='x'))
+        response = self.client.post(self.url, valid_body, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('not found', response.data['error'])
+
+
+class BearingCapacityTest(AnalysisEndpointMixin, TestCase):
+    username = 'foundations'
+    url = '/geotech/bearing_capacity/{self.model.id}/'
+    model_fields = {'name': 'Footings', 'npv': 10.0, 'npv_max': 1.0}
+    layers = [{'name': 'Sand', 'depth': 20.0, 'unit_weight': 19.0, 'cohesion': 0.0, 'friction_angle': 30.0}]
+
+    def test_bearing_factors(self):
+        """Published factors at phi = 30 and the phi = 0 limits"""
+        phi = np.radians(30.0)
+        self.assertTrue(np.allclose(bearing_factors(phi, 'meyerhof'), [30.14, 18.40, 15.67], atol=0.01))
+        self.assertTrue(np.allclose(bearing_factors(phi, 'hansen')[2], 15.07, atol=0.01))
+        self.assertTrue(np.allclose(bearing_factors(phi, 'terzaghi'), [37.16, 22.46, 20.12], atol=0.05))
+        self.assertTrue(np.allclose(bearing_factors(0.0, 'meyerhof'), [5.14, 1.0, 0.0], atol=0.01))
+        self.assertTrue(np.allclose(bearing_factors(0.0, 'terzaghi'), [5.71, 1.0, 0.0], atol=0.01))
+
+    def test_undrained_strip_footing(self):
+        """phi = 0 surface strip: qu = 5.14 c, plus the overburden when embedded"""
+        soil = {'unit_weight': np.array([18.0]), 'cohesion': np.array([50.0]), 'friction_angle': np.array([0.0])}
+        result = bearing_capacity(np.array([30.0]), soil, 30.0, widths=[2.0], depths=[0.0, 1.0],
+                                  method='hansen')
+        qu = result['qu'][0, :, 0]
+        self.assertAlmostEqual(qu[0], 5.14 * 50.0, delta=0.5)
+        self.assertAlmostEqual(qu[1], 5.14 * 50.0 * (1 + 0.4 * 0.5) + 18.0, delta=0.5)
+
+    def test_hansen_square_footing(self):
+        """Hansen (1970) at phi = 30: Nq = 18.40, Ngamma = 15.07, sq = 1 + (B/L) sin(phi), sgamma = 0.6"""
+        soil = {'unit_weight': np.array([18.0]), 'cohesion': np.array([0.0]), 'friction_angle': np.array([30.0])}
+        result = bearing_capacity(np.array([30.0]), soil, 100.0, widths=[2.0], depths=[1.0], footing='square',
+                                  method='hansen')
+        d_q = 1 + 2 * math.tan(math.radians(30)) * 0.5 ** 2 * 0.5
+        expected = 18.0 * 18.40 * 1.5 * d_q + 0.5 * 18.0 * 2.0 * 15.07 * 0.6
+        self.assertAlmostEqual(result['qu'][0, 0, 0], expected, delta=1.0)
+
+    def test_groundwater_and_inclination_reduce_capacity(self):
+        response = self.client.post(self.url, {'widths': [1.0, 2.0], 'depths': [1.0], 'inclinations': [0, 10]},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        dry = np.array(response.data['qu'])
+        self.assertEqual(dry.shape, (2, 1, 2))
+        self.assertTrue(np.all(dry[1] > dry[0]))
+        self.assertTrue(np.all(dry[:, :, 1] < dry[:, :, 0]))
+        self.assertTrue(np.allclose(response.data['q_allow'], dry / 3.0))
+
+        response = self.client.post(self.url, {'widths': [1.0, 2.0], 'depths': [1.0], 'inclinations': [0, 10],
+                                               'groundwater': 'npv_max'}, format='json')
+        self.assertEqual(response.data['water_depth'], 1.0)
+        self.assertTrue(np.all(np.array(response.data['qu']) < dry))
+
+    def test_large_sweep(self):
+        """10^5 footing cases in a single request"""
+        response = self.client.post(self.url, {
+            'widths': {'start': 0.5, 'stop': 5.0, 'count': 100},
+            'depths': {'start': 0.0, 'stop': 3.0, 'count': 100},
+            'inclinations': {'start': 0.0, 'stop': 20.0, 'count': 10},
+            'method': 'terzaghi', 'footing': 'rectangular', 'length': 4.0,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cases'], 100_000)
+        qu = np.array(response.data['qu'])
+        self.assertEqual(qu.shape, (100, 100, 10))
+        self.assertTrue(np.all(np.isfinite(qu)) and np.all(qu > 0))
+
+    def test_validation(self):
+        self.assertValidation(
+            ({'widths': [0.0]}, {'widths': 'wide'}, {'widths': [1.0], 'method': 'vesic'},
+             {'widths': [1.0], 'footing': 'rectangular'}, {'widths': [1.0], 'inclinations': [90]},
+             {'widths': [1.0], 'groundwater': 'perched'},
+             {'widths': {'start': 1, 'stop': 2, 'count': 1001}, 'depths': {'start': 0, 'stop': 2, 'count': 1001}}),
+            {'widths': [1.0]})
+
+
+@override_settings(GEOTECH_MODEL_CACHES=['default'])
+class StressProfileTest(AnalysisEndpointMixin, TestCase):
+    username = 'stresses'
+    url = '/geotech/stress_profile/{self.model.id}/'
+    model_fields = {'name': 'Stresses', 'npv': 2.0, 'npv_max': 0.5}
+    layers = [{'name': 'Clay', 'depth': 3.0, 'unit_weight': 18.0},
+              {'name': 'Sand', 'depth': 7.0, 'unit_weight': 20.0}]
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_profile_matches_vertical_stresses(self):
+        profile = StressProfile.from_model(self.model)
+        depths = np.linspace(0, 15, 301)
+        bottoms, unit_weights = layer_stack(self.model)
+        for groundwater, water_depth in (('npv', 2.0), ('npv_max', 0.5)):
+            expected = vertical_stresses(depths, bottoms, unit_weights, water_depth)
+            for a, b in zip(profile.stresses(depths, groundwater), expected):
+                np.testing.assert_allclose(a, b)
+        sigma_v0, u0, _ = StressProfile([], [], 1.0, 1.0).stresses([2.0])
+        self.assertEqual((sigma_v0[0], u0[0]), (36.0, 9.81))
+
+    def test_batch_endpoint_caches_until_a_write(self):
+        body = {'depths': [1.0, 5.0, 12.0], 'groundwater': 'npv_max'}
+        first = self.client.post(self.url, body, format='json')
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(np.allclose(first.data['sigma_v0'], [18.0, 94.0, 234.0]))
+        self.assertTrue(np.allclose(first.data['u0'], [4.905, 44.145, 112.815]))
+        with self.assertNumQueries(1):
+            second = self.client.post(self.url, body, format='json')
+        self.assertEqual(first.data, second.data)
+
+        self.client.post(f'/geotech/save_layers/{self.model.id}/', {'layers': [
+            {'name': 'Clay', 'depth': 4.0, 'unit_weight': 16.0},
+        ]}, format='json')
+        self.assertTrue(np.allclose(self.client.post(self.url, body, format='json').data['sigma_v0'],
+                                    [16.0, 80.0, 192.0]))
+        self.client.post(f'/geotech/model_detail/{self.model.id}/', {
+            'name': self.model.name, 'project': self.project.id, 'npv': 2.0, 'npv_max': 1.0,
+        }, format='json')
+        self.assertTrue(np.allclose(self.client.post(self.url, body, format='json').data['u0'],
+                                    [0.0, 39.24, 107.91]))
+
+    def test_depth_cap(self):
+        """A full-resolution profile is served; one point more is refused"""
+        grid = {'start': 0, 'stop': 20, 'count': MAX_PROFILE_DEPTHS}
+        response = self.client.post(self.url, {'depths': grid}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['sigma_v0_eff']), MAX_PROFILE_DEPTHS)
+        self.assertAlmostEqual(response.data['sigma_v0'][-1], 54.0 + 7 * 20.0 + 10 * 20.0)
+        response = self.client.post(self.url, {'depths': {**grid, 'count': MAX_PROFILE_DEPTHS + 1}}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_validation(self):
+        self.assertValidation(
+            ({}, {'depths': [-1.0]}, {'depths': [1.0], 'groundwater': 'high'},
+             {'depths': {'start': 0, 'stop': 1, 'count': 10 ** 9}}),
+            {'depths': [1.0]})
+
+
+class ConsolidationTest(AnalysisEndpointMixin, TestCase):
+    username = 'settlements'
+    url = '/geotech/consolidation/{self.model.id}/'
+    model_fields = {'name': 'Embankment'}
+    layers = [{'name': 'Clay', 'depth': 10.0, 'compressibility': 0.0005, 'permeability': 1e-9}]
+
+    def test_matches_terzaghi(self):
+        """Uniform clay, double drainage: U = 50% at Tv = 0.197 and 90% at Tv = 0.848"""
+        z, capacity, conductance, drained = discretize(np.array([10.0]), np.array([0.0005]), np.array([1e-9]), 201)
+        cv = 1e-9 / (0.0005 * 9.81) * 86400
+        for tv, degree in ((0.197, 0.5), (0.848, 0.9)):
+            times = time_grid(tv * 5.0 ** 2 / cv, 400)
+            settlement, _ = solve_consolidation(capacity, conductance, drained, times,
+                                                load_at(times, [[[0, 100.0]]]))
+            self.assertAlmostEqual(settlement[-1, 0] / 0.5, degree, delta=0.01)
+
+    def test_matches_reference_solver(self):
+        """The batched modal steps reproduce a tridiagonal solve per step, on layered soil"""
+        bottoms = np.array([3.0, 5.0, 11.0])
+        for drainage in ('double', 'top'):
+            column = discretize(bottoms, np.array([0.001, 0.0, 0.0003]), np.array([1e-9, np.nan, 5e-9]), 40,
+                                drainage=drainage)
+            times = time_grid(2000.0, 60, [15.0])
+            loads = load_at(times, [[[0, 0], [15, 60]], [[0, 40]], [[0, 0], [5, 0], [6, 80], [200, 80]]])
+            settlement, _ = solve_consolidation(*column[1:], times, loads)
+            np.testing.assert_allclose(settlement, reference_consolidation(*column[1:], times, loads), rtol=1e-7)
+
+    def test_endpoint_batches_load_cases(self):
+        Layer.objects.create(model=self.model, name='Sand', depth=2.0, compressibility=0.00005,
+                             permeability=None, position=1)
+        response = self.client.post(self.url, {
+            'load_cases': [{'name': 'Fill', 'history': [[0, 0], [30, 100]]}, {'history': [[0, 50]]}],
+            'duration': 36500, 'steps': 300, 'nodes': 121, 'drainage': 'top', 'profile_times': [0, 30],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        fill, instant = response.data['load_cases']
+        self.assertEqual((fill['name'], instant['name']), ('Fill', 'Case 2'))
+        self.assertAlmostEqual(fill['final_settlement'], 0.0005 * 10 * 100 + 0.00005 * 2 * 100)
+        self.assertAlmostEqual(fill['settlement'][-1], fill['final_settlement'], places=3)
+        self.assertTrue(np.all(np.diff(fill['settlement']) >= -1e-12))
+        self.assertIn(30.0, response.data['times'])
+        # Undrained at first: the excess pore pressure is the whole load, except at the drained surface
+        self.assertEqual(instant['excess_pore_pressure'][0][0], 0.0)
+        self.assertTrue(np.allclose(instant['excess_pore_pressure'][0][1:], 50.0))
+
+        double = self.client.post(self.url, {'load_cases': [{'history': [[0, 50]]}], 'duration': 365,
+                                             'steps': 50}, format='json').data['load_cases'][0]
+        top = self.client.post(self.url, {'load_cases': [{'history': [[0, 50]]}], 'duration': 365,
+                                          'steps': 50, 'drainage': 'top'}, format='json').data['load_cases'][0]
+        self.assertGreater(double['settlement'][-1], top['settlement'][-1])
+
+    def test_validation(self):
+        case = [{'history': [[0, 100]]}]
+        self.assertValidation(
+            ({}, {'load_cases': []}, {'load_cases': [{'history': [[10, 5], [5, 10]]}]},
+             {'load_cases': [{'history': 'fast'}]}, {'load_cases': case, 'drainage': 'bottom'},
+             {'load_cases': case, 'nodes': 2}, {'load_cases': case, 'steps': 10 ** 6},
+             {'load_cases': case, 'duration': 0}, {'load_cases': case, 'profile_times': [10 ** 6]},
+             {'load_cases': [{'history': [[t, t] for t in range(101)]}]},
+             {'load_cases': [{'history': [[t + i / 100, 10] for t in range(100)]} for i in range(60)]}),
+            {'load_cases': case})
+
+
+class SlopeStabilityTest(AnalysisEndpointMixin, TestCase):
+    username = 'slopes'
+    url = '/geotech/slope_stability/{self.model.id}/'
+    model_fields = {'name': 'Cutting', 'npv': 20.0, 'npv_max': 1.0}
+    layers = [{'name': 'Clayey sand', 'depth': 30.0, 'unit_weight': 19.0, 'cohesion': 10.0, 'friction_angle': 25.0}]
+
+    def section(self, cohesion, friction_angle, angle, height=5.0, water_depth=100.0):
+        soil = {'unit_weight': np.array([18.0]), 'cohesion': np.array([cohesion]),
+                'friction_angle': np.array([friction_angle])}
+        return SlopeSection(height, angle, np.array([50.0]), soil, water_depth)
+
+    def test_reference_solutions(self):
+        """Dry sand tends to the infinite slope, tan(phi) / tan(beta); phi = 0 clay matches Taylor's chart"""
+        result = slope_search(self.section(0.0, 30.0, 20.0))
+        self.assertAlmostEqual(result['factor_of_safety'], np.tan(np.radians(30)) / np.tan(np.radians(20)),
+                               delta=0.01)
+        # Taylor: stability number c / (F gamma H) = 0.191 for a 60 degree slope
+        result = slope_search(self.section(20.0, 0.0, 60.0))
+        self.assertAlmostEqual(result['factor_of_safety'], 20.0 / (0.191 * 18.0 * 5.0), delta=0.03)
+        self.assertGreater(result['circles_per_second'], 0)
+
+    def test_pool_matches_in_process(self):
+        section = self.section(10.0, 25.0, 35.0, water_depth=2.0)
+        circles = circle_grid((-2.0, 8.0), (6.0, 14.0), (-3.0, 2.0), (15, 15, 12))
+        serial = section.factors_of_safety(circles)
+        pooled = evaluate_circles(section, circles, workers=2)
+        np.testing.assert_array_equal(serial[0], pooled[0])
+        self.assertTrue(np.isfinite(serial[0]).sum() > len(circles) / 2)
+
+    def test_pools_are_shared_and_never_replaced(self):
+        """Concurrent requests get one pool per worker count; another count does not retire it"""
+        with ThreadPoolExecutor(max_workers=8) as threads:
+            pools = list(threads.map(lambda _: process_pool(2), range(32)))
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
+        process_pool(3)
+        self.assertIs(process_pool(2), pools[0])
+        self.assertEqual(configured_workers(None), min(DEFAULT_SLOPE_WORKERS, available_workers()))
+        self.assertEqual(configured_workers(10 ** 6), available_workers())
+
+    def test_endpoint_and_groundwater(self):
+        body = {'height': 10.0, 'angle': 30.0, 'grid': [10, 10, 6], 'refinements': 2}
+        dry = self.client.post(self.url, body, format='json')
+        self.assertEqual(dry.status_code, 200)
+        self.assertEqual(dry.data['circles'], 3 * 600)
+        circle = dry.data['circle']
+        self.assertLess(circle['entry'], circle['exit'])
+        self.assertEqual(len(dry.data['slices']['x']), 40)
+        wet = self.client.post(self.url, {**body, 'groundwater': 'npv_max'}, format='json')
+        self.assertLess(wet.data['factor_of_safety'], dry.data['factor_of_safety'])
+
+    def test_validation(self):
+        self.assertValidation(
+            ({}, {'height': 10.0}, {'height': -1, 'angle': 30}, {'height': 10, 'angle': 95},
+             {'height': 10, 'angle': 30, 'grid': [1000, 1000, 10]}, {'height': 10, 'angle': 30, 'grid': [5]},
+             {'height': 10, 'angle': 30, 'groundwater': 'perched'}, {'height': 10, 'angle': 30, 'box': {}}),
+            {'height': 10, 'angle': 30})
+
+
+class LiquefactionTest(AnalysisEndpointMixin, TestCase):
+    username = 'quakes'
+    url = '/geotech/projects/{self.project.id}/liquefaction/'
+
+    def create_models(self):
+        self.models = []
+        for name, npv in (('North', 1.0), ('South', 4.0)):
+            model = GeotechnicalModel.objects.create(project=self.project, user=self.user, name=name,
+                                                     npv=npv, npv_max=0.5)
+            Layer.objects.create(model=model, name='Sand', depth=20.0, unit_weight=18.0, position=0)
+            cpt = CptTest.objects.create(model=model, name=f'CPT-{name}')
+            write_samples(cpt, parse_samples(synthetic_samples(600, step=0.025)))
+            self.models.append(model)
+
+    def sounding(self, qc, fs, water_depth=1.0, count=300, step=0.05):
+        depth = np.arange(1, count + 1) * step
+        sigma_v0, u0, _ = vertical_stresses(depth, np.array([50.0]), np.array([18.0]), water_depth)
+        return interpret(depth, np.full(count, qc), np.full(count, fs), np.zeros(count), sigma_v0, u0)
+
+    def test_volumetric_strain_curves(self):
+        """Zhang et al. (2002): 102 qc1Ncs^-0.82 at FS 0.5 and below, nothing from FS 2"""
+        strain = volumetric_strain(np.array([[0.4, 0.5, 1.0, 2.0, 3.0]]), np.full(5, 100.0))
+        np.testing.assert_allclose(strain[0, :3], [102 * 100 ** -0.82, 102 * 100 ** -0.82, 64 * 100 ** -0.93])
+        self.assertEqual(strain[0, 3:].tolist(), [0.0, 0.0])
+
+    def test_triggering_and_indexes(self):
+        """Loose sand liquefies below the water table only; clay never does; indexes grow with pga"""
+        sand, clay = self.sounding(4.0, 20.0), self.sounding(1.0, 60.0)
+        pga, magnitude = scenario_matrix([0.1, 0.2, 0.4], [7.5])
+        for method in ('robertson', 'boulanger_idriss'):
+            with self.subTest(method=method):
+                fs, _ = factors_of_safety(sand, 1.0, pga, magnitude, method)
+                self.assertTrue(np.all(fs[:, sand['depth'] < 1.0] == 2.0))
+                self.assertTrue(np.any(fs[-1] < 1.0))
+                sand_result, clay_result = assess_soundings([sand, clay], [1.0, 1.0], pga, magnitude, method)
+                self.assertTrue(np.all(np.diff(sand_result['lpi']) > 0))
+                self.assertTrue(np.all(np.diff(sand_result['lsn']) > 0))
+                self.assertTrue(np.all(np.diff(sand_result['min_fs']) <= 0))
+                self.assertEqual(clay_result['lpi'].tolist(), [0.0, 0.0, 0.0])
+                self.assertEqual(clay_result['lsn'].tolist(), [0.0, 0.0, 0.0])
+        # A larger magnitude at the same pga is more damaging
+        pga, magnitude = scenario_matrix([0.3], [6.0, 7.5])
+        self.assertLess(*assess_soundings([sand], [1.0], pga, magnitude)[0]['lpi'])
+
+    def test_project_endpoint(self):
+        body = {'pga': {'start': 0.1, 'stop': 0.4, 'count': 4}, 'magnitude': [6.5, 7.5]}
+        response = self.client.post(self.url, body, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['scenarios']), 8)
+        self.assertEqual([row['model_id'] for row in response.data['cpt_tests']], [m.id for m in self.models])
+        north, south = response.data['cpt_tests']
+        self.assertEqual((north['water_depth'], north['samples']), (1.0, 600))
+        self.assertEqual(len(north['lpi']), 8)
+        self.assertNotIn('factor_of_safety', north)
+        # The deeper water table of the south model leaves less to liquefy
+        self.assertTrue(all(s <= n for n, s in zip(north['lpi'], south['lpi'])))
+        self.assertEqual(response.data['scenarios'][-1]['max_lpi'], max(north['lpi'][-1], south['lpi'][-1]))
+
+        # Cached interpretations: a fixed number of queries whatever the number of soundings
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.post(self.url, body, format='json')
+        self.assertEqual(again.data['cpt_tests'], response.data['cpt_tests'])
+        self.assertLessEqual(len(queries), 4)
+
+        profiles = self.client.post(self.url, {'pga': [0.3], 'groundwater': 'npv_max', 'profiles': True,
+                                               'method': 'boulanger_idriss'}, format='json')
+        row = profiles.data['cpt_tests'][0]
+        self.assertEqual(row['water_depth'], 0.5)
+        self.assertEqual(len(row['factor_of_safety']), 1)
+        self.assertEqual(len(row['factor_of_safety'][0]), len(row['depth']))
+
+    def test_queries_do_not_grow_with_soundings(self):
+        """Cold and warm requests cost the same queries for 2 or 8 soundings, rows and packed alike"""
+        def queries(groundwater):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(self.url, {'pga': [0.2], 'groundwater': groundwater}, format='json')
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        def counts():
+            DerivedSeries.objects.all().delete()
+            return [queries('npv'), queries('npv'), queries('npv_max'), queries('npv_max')]
+
+        few = counts()
+        for model in self.models:
+            for i, storage in enumerate([CptTest.STORAGE_ROWS, CptTest.STORAGE_PACKED] * 2):
+                cpt = CptTest.objects.create(model=model, name=f'Extra-{i}', storage=storage)
+                write_samples(cpt, parse_samples(synthetic_samples(200, step=0.05)))
+        many = counts()
+        # Cold requests gain only the one query that reads packed channels
+        self.assertEqual(many, [few[0] + 1, few[1], few[2] + 1, few[3]])
+        self.assertEqual(many[1], 4)
+        self.assertEqual(DerivedSeries.objects.count(), 2 * 10)
+
+    def test_validation(self):
+        self.assertValidation(
+            ({}, {'pga': []}, {'pga': [0]}, {'pga': [3.0]}, {'pga': [0.2], 'magnitude': [10]},
+             {'pga': [0.2], 'method': 'seed'}, {'pga': [0.2], 'groundwater': 'perched'},
+             {'pga': [0.2], 'area_ratio': 0}, {'pga': {'start': 0.1, 'stop': 0.5, 'count': 500}},
+             {'pga': {'start': 0.1, 'stop': 0.5, 'count': 100}, 'magnitude': [6, 6.5, 7, 7.5, 8]}),
+            {'pga': [0.2]})
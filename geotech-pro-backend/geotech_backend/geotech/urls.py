@@ -2,19 +2,34 @@
 from django.urls import path
 from .views import (
     GetLayersView, ModelDetailView, LoginView, RegisterView, CsrfView,
-    SaveLayersView, SaveCptView, ProjectView, StatsView
+    SaveLayersView, SaveCptView, ProjectView, StatsView, CptImportView,
+    CptExportView, LayersExportView, ModelExportView, CptInterpretationView,
+    CptSamplesView, MetricsView, BearingCapacityView, StressProfileView, ConsolidationView,
+    SlopeStabilityView, LiquefactionView
 )
 
 urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('register/', RegisterView.as_view(), name='register'),
     path('csrf/', CsrfView.as_view(), name='csrf'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('projects/', ProjectView.as_view(), name='project_list'),
     path('projects/<int:project_id>/', ProjectView.as_view(), name='project_detail'),
     path('projects/<int:project_id>/stats/', StatsView.as_view(), name='project_stats'),
+    path('projects/<int:project_id>/liquefaction/', LiquefactionView.as_view(), name='liquefaction'),
     path('stats/', StatsView.as_view(), name='stats'),
     path('get_layers/<int:model_id>/', GetLayersView.as_view(), name='get_layers'),
     path('model_detail/<int:model_id>/', ModelDetailView.as_view(), name='model_detail'),
     path('save_layers/<int:model_id>/', SaveLayersView.as_view(), name='save_layers'),
     path('save_cpt/<int:model_id>/', SaveCptView.as_view(), name='save_cpt'),
+    path('projects/<int:project_id>/cpt-tests/<int:test_id>/import/', CptImportView.as_view(), name='cpt_import'),
+    path('projects/<int:project_id>/cpt-tests/<int:test_id>/samples/', CptSamplesView.as_view(), name='cpt_samples'),
+    path('projects/<int:project_id>/cpt-tests/<int:test_id>/export/', CptExportView.as_view(), name='cpt_export'),
+    path('export_layers/<int:model_id>/', LayersExportView.as_view(), name='export_layers'),
+    path('export_model/<int:model_id>/', ModelExportView.as_view(), name='export_model'),
+    path('cpt_interpretation/<int:model_id>/', CptInterpretationView.as_view(), name='cpt_interpretation'),
+    path('bearing_capacity/<int:model_id>/', BearingCapacityView.as_view(), name='bearing_capacity'),
+    path('stress_profile/<int:model_id>/', StressProfileView.as_view(), name='stress_profile'),
+    path('consolidation/<int:model_id>/', ConsolidationView.as_view(), name='consolidation'),
+    path('slope_stability/<int:model_id>/', SlopeStabilityView.as_view(), name='slope_stability'),
 ]
\ No newline at end of file
@@ -8,18 +8,58 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from .models import GeotechnicalModel, CptTest, CptData, Layer, Project
 from .serializers import GeotechnicalModelSerializer, ProjectSerializer
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from django.http import JsonResponse
+from .importers import CptImportError, iter_upload_samples, import_samples
+from .exporters import EXPORTERS
+from .interpretation import DEFAULT_AREA_RATIO, SBT_ZONE_NAMES, to_json_columns
+from .derived import interpret_cached_batch, interpret_model_cached
+from .stats import project_stats, user_stats
+from .pagination import KeysetPagination
+from .instrumentation import metrics_text, timing
+from .compression import accepts_gzip
+from .caching import (bump_model_version, cached_payload, cached_stress_profile, model_etag, model_version,
+                      shared_version_cache, store_payload)
+from .ingest import parse_samples
+from .storage import (NUMPY_DTYPES, SampleRangeError, append_samples, replace_depth_range, max_depth,
+                      read_depth_window, stored_dtype)
+from .decimation import DEFAULT_MAX_POINTS, MIN_MAX_POINTS
+from .bearing import (DEFAULT_FACTOR_OF_SAFETY, FOOTINGS, MAX_SWEEP_CASES, METHODS as BEARING_METHODS,
+                      model_bearing_capacity, parse_grid)
+from .consolidation import (DEFAULT_DURATION, DEFAULT_NODES, DEFAULT_STEPS, DRAINAGE as CONSOLIDATION_DRAINAGE,
+                            MAX_NODES, MAX_STEPS, model_consolidation, parse_load_cases)
+from .slope import (DEFAULT_GRID as DEFAULT_SLOPE_GRID, DEFAULT_REFINEMENTS, DEFAULT_SLICES, MAX_CIRCLES,
+                    configured_workers, model_section, search as slope_search)
+from .liquefaction import MAX_SCENARIOS, METHODS as LIQUEFACTION_METHODS, assess_soundings, scenario_matrix
+from .stress import layer_stacks
+from rest_framework.exceptions import ValidationError
+from .renderers import CsvExportRenderer, JsonLinesExportRenderer, BinaryExportRenderer, MODEL_RENDERERS
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.parsers import MultiPartParser, FormParser
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db.models import Count
-from django.db import connection
+from django.db import transaction
+from django.conf import settings
+import gzip
+import math
+import numpy as np
 import traceback
 import logging
 
 logger = logging.getLogger('geotech')
 
+# Model payloads are compressed once and cached, so favour size over speed
+GZIP_LEVEL = 6
+# Far more points than a stress plot can show; keeps a JSON response around 1 MB
+MAX_PROFILE_DEPTHS = 20_000
+
+class MetricsView(APIView):
+    """Per-view latency histograms and query totals in the Prometheus text format."""
+    permission_classes = [IsAdminUser]
+    def get(self, request):
+        return HttpResponse(metrics_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 class CsrfView(APIView):
     permission_classes = [AllowAny]
     def get(self, request):
@@ -68,10 +108,9 @@ class ProjectView(APIView):
         try:
             if project_id:
                 # Get single project
-                project = Project.objects.filter(
-                    id=project_id,
-                    user=request.user
-                ).select_related('user').first()
+                project = Project.objects.for_user(request.user).with_counts().filter(
+                    id=project_id
+                ).first()
                 
                 if not project:
                     return Response(
@@ -80,16 +119,11 @@ class ProjectView(APIView):
                     )
                 
                 # Get related data
-                objects = project.objects.all()
+                objects = project.project_objects.all()
                 models = project.geotechnical_models.all()
                 
                 return Response({
-                    'id': project.id,
-                    'name': project.name,
-                    'description': project.description,
-                    'status': project.status,
-                    'created_at': project.created_at,
-                    'updated_at': project.updated_at,
+                    **ProjectSerializer(project).data,
                     'objects': [{
                         'id': obj.id,
                         'name': obj.name,
@@ -104,20 +138,10 @@ class ProjectView(APIView):
                     } for model in models]
                 })
             else:
-                # Get all projects
-                projects = Project.objects.filter(
-                    user=request.user
-                ).select_related('user').order_by('-updated_at')
-                
-                return Response([{
-                    'id': project.id,
-                    'name': project.name,
-                    'description': project.description,
-                    'status': project.status,
-                    'created_at': project.created_at,
-                    'updated_at': project.updated_at
-                } for project in projects])
+                return self.list_projects(request)
                 
+        except ValidationError as e:
+            return Response({'error': 'Validation error', 'details': e.detail}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error fetching projects: {str(e)}")
             return Response(
@@ -125,6 +149,40 @@ class ProjectView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def list_projects(self, request):
+        """
+        The user's projects, newest first. ``status`` filters exactly, ``name``
+        by prefix, and ``fields=id,name,...`` selects the output fields;
+        only the columns and counts those need are fetched. Passing
+        ``limit`` or ``cursor`` switches to keyset pages of
+        ``{'next', 'next_cursor', 'results'}``; otherwise the whole list is
+        returned as before.
+        """
+        fields = ProjectSerializer.Meta.fields
+        if 'fields' in request.query_params:
+            fields = [name for name in request.query_params['fields'].split(',') if name]
+            unknown = set(fields) - set(ProjectSerializer.Meta.fields)
+            if unknown:
+                raise ValidationError({'fields': f'Unknown fields: {", ".join(sorted(unknown))}'})
+
+        projects = Project.objects.for_user(request.user)
+        if 'status' in request.query_params:
+            projects = projects.filter(status=request.query_params['status'])
+        if request.query_params.get('name'):
+            projects = projects.filter(name__istartswith=request.query_params['name'])
+        columns = {'id', 'updated_at'} | {name for name in fields if name not in ProjectSerializer.COUNT_FIELDS}
+        projects = projects.only(*columns)
+        counts = [name for name in fields if name in ProjectSerializer.COUNT_FIELDS]
+        if counts:
+            projects = projects.with_counts(*counts)
+
+        if not {'limit', 'cursor'} & set(request.query_params):
+            projects = projects.order_by('-updated_at', '-id')
+            return Response(ProjectSerializer(projects, many=True, fields=fields).data)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(projects, request, view=self)
+        return paginator.get_paginated_response(ProjectSerializer(page, many=True, fields=fields).data)
+
     def post(self, request):
         try:
             serializer = ProjectSerializer(data=request.data, context={'request': request})
@@ -137,7 +195,7 @@ class ProjectView(APIView):
 
     def put(self, request, project_id):
         try:
-            project = Project.objects.get(id=project_id, user=request.user)
+            project = Project.objects.for_user(request.user).with_counts().get(id=project_id)
             serializer = ProjectSerializer(project, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
@@ -163,77 +221,82 @@ class StatsView(APIView):
     def get(self, request, project_id=None):
         try:
             if project_id:
-                # Get stats for specific project
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT 
-                            COUNT(DISTINCT ct.id) as total_cpt_tests,
-                            COUNT(DISTINCT l.id) as total_soil_layers
-                        FROM geotech_project p
-                        LEFT JOIN geotech_geotechnicalmodel gm ON gm.project_id = p.id
-                        LEFT JOIN geotech_cpttest ct ON ct.model_id = gm.id
-                        LEFT JOIN geotech_layer l ON l.model_id = gm.id
-                        WHERE p.id = %s AND p.user_id = %s
-                    """, [project_id, request.user.id])
-                    
-                    row = cursor.fetchone()
-                    if not row:
-                        return Response({'error': 'Project not found'}, status=status.HTTP_404_NOT_FOUND)
-                    
-                    stats = {
-                        'totalCptTests': row[0] or 0,
-                        'totalSoilLayers': row[1] or 0,
-                    }
-                    return Response(stats)
-            else:
-                # Get overall stats
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT 
-                            COUNT(DISTINCT p.id) as total_projects,
-                            COUNT(DISTINCT ct.id) as total_cpt_tests,
-                            COUNT(DISTINCT l.id) as total_soil_layers,
-                            COUNT(DISTINCT CASE 
-                                WHEN gm.created_at >= datetime('now', '-1 day')
-                                THEN gm.id 
-                            END) as recent_activity
-                        FROM geotech_project p
-                        LEFT JOIN geotech_geotechnicalmodel gm ON gm.project_id = p.id
-                        LEFT JOIN geotech_cpttest ct ON ct.model_id = gm.id
-                        LEFT JOIN geotech_layer l ON l.model_id = gm.id
-                        WHERE p.user_id = %s
-                    """, [request.user.id])
-                    
-                    row = cursor.fetchone()
-                    stats = {
-                        'totalProjects': row[0] or 0,
-                        'totalCptTests': row[1] or 0,
-                        'totalSoilLayers': row[2] or 0,
-                        'recentActivity': row[3] or 0,
-                    }
-                    return Response(stats)
+                stats = project_stats(request.user, project_id)
+                if stats is None:
+                    return Response({'error': 'Project not found'}, status=status.HTTP_404_NOT_FOUND)
+                return Response(stats)
+            return Response(user_stats(request.user))
         except Exception as e:
             logger.error(f"Error fetching stats: {str(e)}")
             logger.error(traceback.format_exc())
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class GetLayersView(APIView):
+    """
+    The full model payload, rendered once per model version and format and
+    served from the cache after that. The format is negotiated from
+    ``?format=json|columnar|gtpb|msgpack`` (msgpack when installed) or the
+    Accept header, and the body is gzipped when the client accepts it.
+    Responses carry an ETag; a conditional GET matching the current version
+    gets 304 after one version query, or none when a shared cache tier
+    holds the version.
+    """
     permission_classes = [IsAuthenticated]
+    renderer_classes = MODEL_RENDERERS
+
     def get(self, request, model_id):
-        try:
-            model = GeotechnicalModel.objects.get(id=model_id, user=request.user)
-            if not model.project:
-                return Response(
-                    {'error': 'Model must be associated with a project'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            serializer = GeotechnicalModelSerializer(model)
-            return Response(serializer.data)
-        except GeotechnicalModel.DoesNotExist:
+        renderer = request.accepted_renderer
+        compress = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        variant = f'{renderer.format}.gz' if compress else renderer.format
+
+        if_none_match = request.headers.get('If-None-Match')
+        current = model_version(model_id) if if_none_match else None
+        if current is not None and current.user_id == request.user.id:
+            etag = model_etag(model_id, current.version, variant)
+            if etag in parse_etags(if_none_match) or if_none_match.strip() == '*':
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+        # Unless it was just read from the database above
+        if current is None or shared_version_cache():
+            current = model_version(model_id, cached=False)
+        if current is None or current.user_id != request.user.id:
             return Response(
                 {'error': 'Model not found or not authorized'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        if not current.project_id:
+            return Response(
+                {'error': 'Model must be associated with a project'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        version = current.version
+        payload = cached_payload(model_id, version, variant)
+        if payload is None:
+            try:
+                model = GeotechnicalModel.objects.with_read_data().get(id=model_id, user=request.user)
+            except GeotechnicalModel.DoesNotExist:
+                return Response(
+                    {'error': 'Model not found or not authorized'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            # Keyed by the version read together with the data, not the one above
+            version = model.version
+            serializer = GeotechnicalModelSerializer(model, context={'sample_layout': renderer.sample_layout})
+            payload = renderer.render(serializer.data, renderer.media_type)
+            if compress:
+                payload = gzip.compress(payload, compresslevel=GZIP_LEVEL)
+            store_payload(model_id, version, variant, payload)
+
+        response = HttpResponse(payload, content_type=renderer.media_type)
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept, Accept-Encoding'
+        response['ETag'] = model_etag(model_id, version, variant)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 class ModelDetailView(APIView):
     permission_classes = [IsAuthenticated]
@@ -243,7 +306,7 @@ class ModelDetailView(APIView):
             serializer = GeotechnicalModelSerializer(model, data=request.data, context={'request': request})
             if serializer.is_valid():
                 serializer.save()
-                return Response(serializer.data)
+                return Response({**serializer.data, 'changes': serializer.changes})
             return Response({
                 'error': 'Validation error',
                 'details': serializer.errors
@@ -283,7 +346,7 @@ class SaveLayersView(APIView):
             serializer = GeotechnicalModelSerializer(model, data=data, partial=True)
             if serializer.is_valid():
                 serializer.save()
-                return Response(serializer.data)
+                return Response({**serializer.data, 'changes': serializer.changes})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except GeotechnicalModel.DoesNotExist:
             return Response(
@@ -316,7 +379,7 @@ class SaveCptView(APIView):
             serializer = GeotechnicalModelSerializer(model, data=data, partial=True, context={'request': request})
             if serializer.is_valid():
                 serializer.save()
-                return Response(serializer.data)
+                return Response({**serializer.data, 'changes': serializer.changes})
             return Response({
                 'error': 'Validation error',
                 'details': serializer.errors
@@ -330,4 +393,528 @@ class SaveCptView(APIView):
             return Response({
                 'error': str(e),
                 'type': type(e).__name__
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class CptImportView(APIView):
+    """
+    Replace a sounding's samples from an uploaded CSV or XLSX ``file``.
+    Packed soundings keep their dtype unless a ``dtype`` (f4 or f8) is sent.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request, project_id, test_id):
+        try:
+            cpt_test = CptTest.objects.get(
+                id=test_id,
+                model__project_id=project_id,
+                model__user=request.user
+            )
+        except CptTest.DoesNotExist:
+            return Response(
+                {"error": "CPT test not found or not authorized"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {"error": "A 'file' upload is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        dtype = request.data.get('dtype') or None
+        if dtype is not None and dtype not in NUMPY_DTYPES:
+            return Response({'error': 'dtype must be f4 or f8'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload.seek(0)
+            with transaction.atomic():
+                imported = import_samples(cpt_test, iter_upload_samples(upload), dtype=stored_dtype(cpt_test, dtype))
+                bump_model_version(cpt_test.model_id)
+        except CptImportError as e:
+            return Response({'error': str(e), 'line': e.line}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info(f"Imported {imported} samples into CPT test {cpt_test.id} from {upload.name}")
+        return Response({
+            'id': cpt_test.id,
+            'name': cpt_test.name,
+            'storage': cpt_test.storage,
+            'imported': imported,
+        })
+
+class StreamingExportView(APIView):
+    """
+    Base for the export endpoints. The format comes from DRF content
+    negotiation (``?format=csv|jsonl|bin`` or the Accept header, CSV by
+    default) and the body is streamed from a geotech.exporters generator.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [CsvExportRenderer, JsonLinesExportRenderer, BinaryExportRenderer]
+    export_kind = None
+
+    def stream(self, request, obj, filename):
+        renderer = request.accepted_renderer
+        generator = EXPORTERS[self.export_kind][renderer.format](obj)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(generator, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{renderer.format}"'
+        return response
+
+class CptExportView(StreamingExportView):
+    export_kind = 'cpt_test'
+
+    def get(self, request, project_id, test_id):
+        try:
+            cpt_test = CptTest.objects.get(
+                id=test_id,
+                model__project_id=project_id,
+                model__user=request.user
+            )
+        except CptTest.DoesNotExist:
+            return JsonResponse({'error': 'CPT test not found or not authorized'}, status=status.HTTP_404_NOT_FOUND)
+        return self.stream(request, cpt_test, f'cpt-test-{cpt_test.id}')
+
+class LayersExportView(StreamingExportView):
+    export_kind = 'layers'
+
+    def get(self, request, model_id):
+        try:
+            model = GeotechnicalModel.objects.get(id=model_id, user=request.user)
+        except GeotechnicalModel.DoesNotExist:
+            return JsonResponse({'error': 'Model not found or not authorized'}, status=status.HTTP_404_NOT_FOUND)
+        return self.stream(request, model, f'layers-{model.id}')
+
+class ModelExportView(StreamingExportView):
+    export_kind = 'model'
+
+    def get(self, request, model_id):
+        try:
+            model = GeotechnicalModel.objects.get(id=model_id, user=request.user)
+        except GeotechnicalModel.DoesNotExist:
+            return JsonResponse({'error': 'Model not found or not authorized'}, status=status.HTTP_404_NOT_FOUND)
+        return self.stream(request, model, f'model-{model.id}')
+
+class CptInterpretationView(APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request, model_id):
+        try:
+            model = GeotechnicalModel.objects.get(id=model_id, user=request.user)
+        except GeotechnicalModel.DoesNotExist:
+            return Response(
+                {'error': 'Model not found or not authorized'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            area_ratio = float(request.query_params.get('area_ratio', DEFAULT_AREA_RATIO))
+        except ValueError:
+            return Response({'error': 'area_ratio must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < area_ratio <= 1:
+            return Response({'error': 'area_ratio must be in (0, 1]'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cpt_tests = model.cpt_tests.order_by('id')
+        if 'cpt_test' in request.query_params:
+            try:
+                cpt_tests = cpt_tests.filter(id=int(request.query_params['cpt_test']))
+            except ValueError:
+                return Response({'error': 'cpt_test must be an id'}, status=status.HTTP_400_BAD_REQUEST)
+        results = interpret_model_cached(model, cpt_tests, area_ratio)
+        return Response({
+            'model_id': model.id,
+            'npv': model.npv,
+            'area_ratio': area_ratio,
+            'sbt_zones': SBT_ZONE_NAMES,
+            'cpt_tests': [
+                {'id': cpt_test.id, 'name': cpt_test.name, **to_json_columns(result)}
+                for cpt_test, result in results
+            ]
+        })
+
+class CptSamplesView(APIView):
+    """
+    Depth-windowed reads and incremental writes for a sounding. GET returns
+    the samples inside ``depth_from..depth_to`` decimated to ``max_points``,
+    for plots that zoom. POST appends samples below the current bottom; PUT
+    replaces the samples inside ``depth_from..depth_to``. Both writes cost in
+    proportion to the increment, not to the whole sounding.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_cpt_test(self, request, project_id, test_id):
+        return CptTest.objects.filter(
+            id=test_id,
+            model__project_id=project_id,
+            model__user=request.user
+        ).first()
+
+    def get(self, request, project_id, test_id):
+        cpt_test = self.get_cpt_test(request, project_id, test_id)
+        if cpt_test is None:
+            return Response({'error': 'CPT test not found or not authorized'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            depth_from, depth_to = (
+                float(request.query_params[name]) if name in request.query_params else None
+                for name in ('depth_from', 'depth_to')
+            )
+            max_points = int(request.query_params.get('max_points', DEFAULT_MAX_POINTS))
+        except ValueError:
+            return Response({'error': 'depth_from, depth_to and max_points must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if max_points < MIN_MAX_POINTS:
+            return Response({'error': f'max_points must be at least {MIN_MAX_POINTS}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        channels, bin_size, window_count = read_depth_window(cpt_test, depth_from, depth_to, max_points)
+        return Response({
+            'id': cpt_test.id,
+            'depth_from': depth_from,
+            'depth_to': depth_to,
+            'count': window_count,
+            'bin_size': bin_size,
+            **{channel: values.tolist() for channel, values in channels.items()},
+        })
+
+    def post(self, request, project_id, test_id):
+        cpt_test = self.get_cpt_test(request, project_id, test_id)
+        if cpt_test is None:
+            return Response({'error': 'CPT test not found or not authorized'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            samples = parse_samples(request.data.get('data'))
+            with transaction.atomic():
+                appended = append_samples(cpt_test, samples)
+                bump_model_version(cpt_test.model_id)
+        except ValidationError as e:
+            return Response({'error': 'Validation error', 'details': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except SampleRangeError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'id': cpt_test.id,
+            'appended': appended,
+            'max_depth': max(sample[0] for sample in samples) if samples else max_depth(cpt_test),
+        })
+
+    def put(self, request, project_id, test_id):
+        cpt_test = self.get_cpt_test(request, project_id, test_id)
+        if cpt_test is None:
+            return Response({'error': 'CPT test not found or not authorized'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            depth_from = float(request.data['depth_from'])
+            depth_to = float(request.data['depth_to'])
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'depth_from and depth_to are required numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            samples = parse_samples(request.data.get('data', []))
+            with transaction.atomic():
+                deleted, inserted = replace_depth_range(cpt_test, depth_from, depth_to, samples)
+                bump_model_version(cpt_test.model_id)
+        except ValidationError as e:
+            return Response({'error': 'Validation error', 'details': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except SampleRangeError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'id': cpt_test.id, 'deleted': deleted, 'inserted': inserted})
+
+GROUNDWATER_LEVELS = ('npv', 'npv_max')
+
+
+class AnalysisRejected(Exception):
+    """A request an analysis endpoint answers with ``{'error': ...}``."""
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AnalysisView(APIView):
+    """
+    Base for the analysis endpoints (bearing capacity, stresses,
+    consolidation, slopes, liquefaction): the owner lookups and the
+    ``groundwater`` parameter they share. The helpers raise
+    ``AnalysisRejected``, answered as a JSON error.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def handle_exception(self, exc):
+        if isinstance(exc, AnalysisRejected):
+            return Response({'error': str(exc)}, status=exc.status_code)
+        return super().handle_exception(exc)
+
+    def get_model(self, request, model_id):
+        try:
+            return GeotechnicalModel.objects.get(id=model_id, user=request.user)
+        except GeotechnicalModel.DoesNotExist:
+            raise AnalysisRejected('Model not found or not authorized', status.HTTP_404_NOT_FOUND)
+
+    def get_model_version(self, request, model_id):
+        current = model_version(model_id, cached=False)
+        if current is None or current.user_id != request.user.id:
+            raise AnalysisRejected('Model not found or not authorized', status.HTTP_404_NOT_FOUND)
+        return current
+
+    def get_project(self, request, project_id):
+        try:
+            return Project.objects.get(id=project_id, user=request.user)
+        except Project.DoesNotExist:
+            raise AnalysisRejected('Project not found', status.HTTP_404_NOT_FOUND)
+
+    def get_groundwater(self, data):
+        groundwater = data.get('groundwater', 'npv')
+        if groundwater not in GROUNDWATER_LEVELS:
+            raise AnalysisRejected('groundwater must be npv or npv_max')
+        return groundwater
+
+
+class BearingCapacityView(AnalysisView):
+    """
+    Bearing capacity sweep over a model's layer stack: every combination of
+    ``widths`` x ``depths`` x ``inclinations`` (lists, or ``{start, stop,
+    count}`` ranges) in one call. ``qu`` and ``q_allow`` are nested
+    ``[width][depth][inclination]`` lists in kPa.
+    """
+    def post(self, request, model_id):
+        model = self.get_model(request, model_id)
+        data = request.data
+        method = data.get('method', 'meyerhof')
+        footing = data.get('footing', 'strip')
+        if method not in BEARING_METHODS:
+            return Response({'error': f'method must be one of {", ".join(BEARING_METHODS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if footing not in FOOTINGS:
+            return Response({'error': f'footing must be one of {", ".join(FOOTINGS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        groundwater = self.get_groundwater(data)
+        try:
+            widths = parse_grid(data.get('widths'), 'widths', minimum=0, inclusive=False,
+                                max_count=MAX_SWEEP_CASES)
+            depths = parse_grid(data.get('depths', [0.0]), 'depths', minimum=0, max_count=MAX_SWEEP_CASES)
+            inclinations = parse_grid(data.get('inclinations', [0.0]), 'inclinations', minimum=0,
+                                      max_count=MAX_SWEEP_CASES)
+            if np.any(inclinations >= 90):
+                raise ValueError('inclinations must be below 90 degrees.')
+            length = float(data['length']) if footing == 'rectangular' else None
+            factor_of_safety = float(data.get('factor_of_safety', DEFAULT_FACTOR_OF_SAFETY))
+            if factor_of_safety <= 0:
+                raise ValueError('factor_of_safety must be positive.')
+        except KeyError:
+            return Response({'error': 'Rectangular footings need a length'}, status=status.HTTP_400_BAD_REQUEST)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        cases = len(widths) * len(depths) * len(inclinations)
+        if cases > MAX_SWEEP_CASES:
+            return Response({'error': f'At most {MAX_SWEEP_CASES:,} cases per sweep, got {cases:,}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        water_depth = getattr(model, groundwater)
+        try:
+            result = model_bearing_capacity(
+                model, water_depth=water_depth, widths=widths, depths=depths, inclinations=inclinations,
+                footing=footing, length=length, method=method, factor_of_safety=factor_of_safety,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'model_id': model.id,
+            'method': method,
+            'footing': footing,
+            'water_depth': water_depth,
+            'factor_of_safety': factor_of_safety,
+            'cases': cases,
+            'widths': widths.tolist(),
+            'depths': depths.tolist(),
+            'inclinations': inclinations.tolist(),
+            **{field: values.tolist() for field, values in result.items()},
+        })
+
+
+class StressProfileView(AnalysisView):
+    """
+    Total stress, hydrostatic pore pressure and effective stress at a batch
+    of ``depths`` (a list, or a ``{start, stop, count}`` range) in one call,
+    with the water table at ``groundwater`` (``npv`` or ``npv_max``). The
+    model's cumulative stress table is cached per version, so a request
+    costs one version lookup plus the vectorized evaluation.
+    """
+    def post(self, request, model_id):
+        current = self.get_model_version(request, model_id)
+        groundwater = self.get_groundwater(request.data)
+        try:
+            depths = parse_grid(request.data.get('depths'), 'depths', minimum=0, max_count=MAX_PROFILE_DEPTHS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        profile = cached_stress_profile(model_id, current.version)
+        with timing('stresses'):
+            sigma_v0, u0, sigma_v0_eff = profile.stresses(depths, groundwater)
+        return Response({
+            'model_id': model_id,
+            'version': current.version,
+            'groundwater': groundwater,
+            'water_depth': profile.water_depths[groundwater],
+            'depth': depths.tolist(),
+            'sigma_v0': sigma_v0.tolist(),
+            'u0': u0.tolist(),
+            'sigma_v0_eff': sigma_v0_eff.tolist(),
+        })
+
+
+class ConsolidationView(AnalysisView):
+    """
+    Primary consolidation settlement and time-settlement curves of a model
+    under a batch of ``load_cases`` (each a ``history`` of ``[day, kPa]``
+    points), from the layers' compressibility (mv, 1/kPa) and permeability
+    (m/s). ``profile_times`` (days) adds excess pore pressure isochrones.
+    """
+    def post(self, request, model_id):
+        model = self.get_model(request, model_id)
+        data = request.data
+        drainage = data.get('drainage', 'double')
+        if drainage not in CONSOLIDATION_DRAINAGE:
+            return Response({'error': 'drainage must be double or top'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            names, histories = parse_load_cases(data.get('load_cases'))
+            duration = float(data.get('duration', DEFAULT_DURATION))
+            steps = int(data.get('steps', DEFAULT_STEPS))
+            nodes = int(data.get('nodes', DEFAULT_NODES))
+            depth = float(data['depth']) if data.get('depth') is not None else None
+            profile_times = data.get('profile_times') or []
+            if profile_times:
+                profile_times = parse_grid(profile_times, 'profile_times', minimum=0, max_count=20).tolist()
+            if not duration > 0 or (depth is not None and not depth > 0):
+                raise ValueError('duration and depth must be positive.')
+            if not 1 <= steps <= MAX_STEPS or not 3 <= nodes <= MAX_NODES:
+                raise ValueError(f'steps must be 1-{MAX_STEPS} and nodes 3-{MAX_NODES}.')
+            if any(t > duration for t in profile_times):
+                raise ValueError('profile_times must fall within the duration.')
+            result = model_consolidation(model, histories, duration=duration, steps=steps, nodes=nodes,
+                                         drainage=drainage, depth=depth, profile_times=profile_times)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'model_id': model.id,
+            'drainage': drainage,
+            'times': result['times'].tolist(),
+            'depth': result['z'].tolist(),
+            'profile_times': result['profile_times'].tolist(),
+            'load_cases': [
+                {
+                    'name': name,
+                    'final_settlement': float(final),
+                    'settlement': settlement.tolist(),
+                    'excess_pore_pressure': profiles.tolist(),
+                }
+                for name, final, settlement, profiles in zip(
+                    names, result['final_settlement'], result['settlement'], result['profiles'])
+            ],
+        })
+
+
+class SlopeStabilityView(AnalysisView):
+    """
+    Critical slip circle and minimum factor of safety (Bishop simplified)
+    of a slope of ``height`` m at ``angle`` degrees cut in the model's
+    layers. ``grid`` is ``[centres across, centres up, tangent levels]``
+    per stage and ``refinements`` the number of finer stages around the
+    best circle; ``box`` optionally bounds the first stage (``x``, ``y``
+    and ``tangent`` ranges in m). Reports circles/second of the search.
+    """
+    def post(self, request, model_id):
+        model = self.get_model(request, model_id)
+        data = request.data
+        groundwater = self.get_groundwater(data)
+        try:
+            grid = tuple(int(count) for count in data.get('grid', DEFAULT_SLOPE_GRID))
+            if len(grid) != 3 or min(grid) < 1 or math.prod(grid) > MAX_CIRCLES:
+                raise ValueError(f'grid must be three positive counts with at most {MAX_CIRCLES:,} circles.')
+            refinements = int(data.get('refinements', DEFAULT_REFINEMENTS))
+            slices = int(data.get('slices', DEFAULT_SLICES))
+            if not 0 <= refinements <= 10 or not 5 <= slices <= 500:
+                raise ValueError('refinements must be 0-10 and slices 5-500.')
+            box = data.get('box')
+            if box is not None:
+                box = tuple((float(box[name][0]), float(box[name][1])) for name in ('x', 'y', 'tangent'))
+            section = model_section(model, float(data['height']), float(data['angle']),
+                                    water_depth=getattr(model, groundwater))
+        except KeyError as e:
+            return Response({'error': f'Missing {e.args[0]}'}, status=status.HTTP_400_BAD_REQUEST)
+        except (TypeError, ValueError, IndexError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        workers = configured_workers(getattr(settings, 'GEOTECH_SLOPE_WORKERS', None))
+        with timing('slope_search'):
+            result = slope_search(section, grid=grid, refinements=refinements, slices=slices, box=box,
+                                  workers=workers)
+        return Response({'model_id': model.id, 'groundwater': groundwater, **result})
+
+
+class LiquefactionView(AnalysisView):
+    """
+    Liquefaction triggering of every CPT test in a project under the matrix
+    of ``pga`` (g) x ``magnitude`` scenarios, each sounding against its own
+    model's layers and groundwater. Returns LPI, LSN and the minimum factor
+    of safety (top 20 m) per sounding and scenario, with a per-scenario
+    summary; ``profiles`` adds the factor of safety at every sample.
+    """
+    def post(self, request, project_id):
+        project = self.get_project(request, project_id)
+        data = request.data
+        method = data.get('method', 'robertson')
+        if method not in LIQUEFACTION_METHODS:
+            return Response({'error': f'method must be one of {", ".join(LIQUEFACTION_METHODS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        groundwater = self.get_groundwater(data)
+        try:
+            pga = parse_grid(data.get('pga'), 'pga', minimum=0, inclusive=False, max_count=MAX_SCENARIOS)
+            magnitude = parse_grid(data.get('magnitude', [7.5]), 'magnitude', minimum=4.0,
+                                   max_count=MAX_SCENARIOS)
+            if len(pga) * len(magnitude) > MAX_SCENARIOS:
+                raise ValueError(f'At most {MAX_SCENARIOS} scenarios per request.')
+            if np.any(pga > 2.0) or np.any(magnitude > 9.5):
+                raise ValueError('pga must be at most 2 g and magnitude at most 9.5.')
+            area_ratio = float(data.get('area_ratio', DEFAULT_AREA_RATIO))
+            if not 0 < area_ratio <= 1:
+                raise ValueError('area_ratio must be in (0, 1]')
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        cpt_tests = list(CptTest.objects.filter(model__project=project, model__user=request.user)
+                         .select_related('model').order_by('model_id', 'id'))
+        stacks = layer_stacks(Layer.objects.filter(model__project=project, model__user=request.user))
+        empty = (np.empty(0), np.empty(0))
+        entries = [(cpt_test, cpt_test.model, *stacks.get(cpt_test.model_id, empty)) for cpt_test in cpt_tests]
+        with timing('interpretation'):
+            results = interpret_cached_batch(entries, area_ratio, groundwater)
+
+        scenario_pga, scenario_magnitude = scenario_matrix(pga, magnitude)
+        water_depths = [getattr(cpt_test.model, groundwater) for cpt_test in cpt_tests]
+        with timing('liquefaction'):
+            assessments = assess_soundings(results, water_depths, scenario_pga, scenario_magnitude, method)
+
+        profiles = bool(data.get('profiles'))
+        rows = []
+        for cpt_test, water_depth, result, assessment in zip(cpt_tests, water_depths, results, assessments):
+            row = {
+                'id': cpt_test.id,
+                'name': cpt_test.name,
+                'model_id': cpt_test.model_id,
+                'water_depth': water_depth,
+                'samples': len(result['depth']),
+                'lpi': assessment['lpi'].tolist(),
+                'lsn': assessment['lsn'].tolist(),
+                'min_factor_of_safety': assessment['min_fs'].tolist(),
+            }
+            if profiles:
+                row['depth'] = result['depth'].tolist()
+                row['factor_of_safety'] = [[v if math.isfinite(v) else None for v in scenario]
+                                           for scenario in assessment['fs'].tolist()]
+            rows.append(row)
+
+        lpi = np.array([a['lpi'] for a in assessments]).reshape(len(assessments), -1)
+        lsn = np.array([a['lsn'] for a in assessments]).reshape(len(assessments), -1)
+        min_fs = np.array([a['min_fs'] for a in assessments]).reshape(len(assessments), -1)
+        return Response({
+            'project_id': project.id,
+            'method': method,
+            'groundwater': groundwater,
+            'scenarios': [
+                {'pga': p, 'magnitude': m, 'max_lpi': float(lpi[:, i].max(initial=0)),
+                 'max_lsn': float(lsn[:, i].max(initial=0)), 'triggered': int((min_fs[:, i] < 1).sum())}
+                for i, (p, m) in enumerate(zip(scenario_pga.tolist(), scenario_magnitude.tolist()))
+            ],
+            'cpt_tests': rows,
+        })
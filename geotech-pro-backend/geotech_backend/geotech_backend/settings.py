@@ -44,7 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'geotech.instrumentation.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'geotech.compression.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -143,14 +145,67 @@ CSRF_COOKIE_NAME = 'csrftoken'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'geotech.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'geotech.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Caches
+# Serialized model payloads (geotech/caching.py) are looked up in each alias
+# of GEOTECH_MODEL_CACHES in turn. LocMemCache is a per-process LRU bounded
+# by MAX_ENTRIES; add a shared tier after it (e.g. FileBasedCache with a
+# directory LOCATION) to share payloads between worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auth_tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'geotech-auth-tokens',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'model_payloads': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'geotech-model-payloads',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 200,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+GEOTECH_MODEL_CACHES = ['model_payloads']
+# Token -> user lookups (geotech/authentication.py)
+GEOTECH_AUTH_CACHE = 'auth_tokens'
+# How long a conditional GET may trust a cached model version (seconds).
+# Versions are only cached in shared tiers: with LocMemCache alone every
+# conditional GET reads the version from the database.
+GEOTECH_MODEL_VERSION_TIMEOUT = 30
+
+# Query diagnostics (geotech/diagnostics.py): log queries slower than
+# GEOTECH_SLOW_QUERY_MS with their plan, and query shapes repeated
+# GEOTECH_REPEATED_QUERY_THRESHOLD times in one request. Off by default;
+# see `manage.py query_report`.
+GEOTECH_QUERY_DIAGNOSTICS = False
+GEOTECH_SLOW_QUERY_MS = 100
+GEOTECH_REPEATED_QUERY_THRESHOLD = 5
+
+# Worker processes for the slope stability search, per web worker process
+# (capped at the available cores); 1 keeps the search in-process. Keep
+# web workers x this within the host's cores.
+GEOTECH_SLOPE_WORKERS = 2
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -175,5 +230,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        # One structured record per request from PerformanceMiddleware
+        'geotech.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }